@@ -2,6 +2,7 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from migrate import migrate
 from models import db
+import query_counter
 from settings import SECRET_KEY, SQLALCHEMY_DATABASE_URI, SQLALCHEMY_TRACK_MODIFICATIONS
 
 from routes.admin_auth import admin_bp
@@ -11,11 +12,14 @@ from routes.api.auth import auth_bp
 from routes.banks import banks_bp
 from routes.orders import orders_bp
 from routes.messages import messages_bp
+from routes.media import media_bp
 from routes.api.banks import banks_api
 from routes.api.orders import latest_order_bp
 from routes.api.settings import settings_bp
 from routes.api.message import message_bp
+from routes.api.reports import reports_bp
 from routes.api.webhook import webhook_bp
+from routes.api.bot import bot_bp
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -34,6 +38,7 @@ app.static_folder = 'static'
 # Initialize database (even if no Admin model is used, for future extensibility)
 db.init_app(app)
 migrate.init_app(app, db)
+query_counter.init_app(app)
 
 app.register_blueprint(admin_bp)
 app.register_blueprint(home_bp)
@@ -43,13 +48,16 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(banks_bp)
 app.register_blueprint(orders_bp)
 app.register_blueprint(messages_bp)
+app.register_blueprint(media_bp)
 
 app.register_blueprint(banks_api)
 app.register_blueprint(latest_order_bp)
 app.register_blueprint(settings_bp)
+app.register_blueprint(reports_bp)
 
 app.register_blueprint(message_bp)
 app.register_blueprint(webhook_bp)
+app.register_blueprint(bot_bp)
 
 # Run the application
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+"""
+Script to move old chat messages into cold storage.
+
+Moves messages older than MESSAGE_ARCHIVE_AFTER_DAYS that the admin has seen
+(and, for admin replies, that the bot has delivered) from ``messages`` into
+``messages_archive``. Runs in small batches, one transaction each, so it is
+safe to run on a live database, e.g. from a nightly cron job.
+
+Usage:
+    python archive_messages.py
+    python archive_messages.py --days 30 --batch-size 500
+"""
+import argparse
+
+from app import app
+import message_archive
+from settings import MESSAGE_ARCHIVE_AFTER_DAYS, MESSAGE_ARCHIVE_BATCH_SIZE
+
+
+def run_archive(days, batch_size, max_batches=None):
+    """Archive old messages and report how many were moved."""
+    with app.app_context():
+        print(f"Archiving messages older than {days} days (batches of {batch_size})...")
+        count = message_archive.archive_old_messages(days, batch_size, max_batches)
+        print(f"✓ Archived {count} messages")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move old chat messages into messages_archive')
+    parser.add_argument('--days', type=int, default=MESSAGE_ARCHIVE_AFTER_DAYS, help='minimum message age in days')
+    parser.add_argument('--batch-size', type=int, default=MESSAGE_ARCHIVE_BATCH_SIZE, help='messages moved per transaction')
+    parser.add_argument('--max-batches', type=int, default=None, help='stop after this many batches')
+    args = parser.parse_args()
+    run_archive(args.days, args.batch_size, args.max_batches)
@@ -0,0 +1,23 @@
+"""
+Script to rebuild the order volume rollups behind /api/reports/volume.
+
+Recomputes every hourly and daily bucket from the approved orders. Run it
+once after upgrading, and after bulk imports or manual edits to orders.
+
+Usage:
+    python backfill_order_rollups.py
+"""
+from app import app
+import order_rollups
+
+
+def run_backfill():
+    """Rebuild all rollup rows."""
+    with app.app_context():
+        print("Rebuilding order volume rollups...")
+        count = order_rollups.rebuild()
+        print(f"✓ Rolled up {count} approved orders")
+
+
+if __name__ == '__main__':
+    run_backfill()
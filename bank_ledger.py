@@ -0,0 +1,120 @@
+"""
+Bank account balances and their ledger.
+
+``amount`` on thai_bank_accounts / myanmar_bank_accounts only changes
+through ``apply()``, which runs, in one savepoint:
+
+    UPDATE <bank> SET amount = COALESCE(amount, 0) + :delta WHERE id = :id
+    INSERT INTO bank_transactions (order_id, bank_type, delta, balance_after, ...)
+
+The increment happens in SQL, so concurrent changes never overwrite each
+other, and every balance change leaves a row saying why. bank_transactions
+is unique on (order_id, bank_type): a retried order update finds its entry
+and leaves the balance alone.
+"""
+from sqlalchemy import update, select, func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, BankTransaction, ThaiBankAccount, MyanmarBankAccount
+
+BANK_MODELS = {
+    'thai': ThaiBankAccount,
+    'myanmar': MyanmarBankAccount,
+}
+
+
+class BankNotFound(Exception):
+    """The bank account to change does not exist."""
+
+
+def _expire(model, bank_id):
+    bank = db.session.identity_map.get(db.session.identity_key(model, bank_id))
+    if bank is not None:
+        db.session.expire(bank, ['amount'])
+
+
+def _existing(order_id, bank_type):
+    return BankTransaction.query.filter_by(order_id=order_id, bank_type=bank_type).first()
+
+
+def apply(bank_type, bank_id, delta, order_id=None, note=None):
+    """
+    Add ``delta`` to a bank account's balance and record the change.
+
+    Args:
+        bank_type: 'thai' or 'myanmar'
+        bank_id: Bank account id
+        delta: Amount to add (negative to subtract)
+        order_id: Order code the change belongs to; each order changes each
+            side at most once. None for manual adjustments.
+        note: Free text kept with the entry
+
+    Returns:
+        (BankTransaction, created). ``created`` is False when ``order_id``
+        already changed this side; its original entry is returned.
+
+    Raises:
+        BankNotFound: No account with ``bank_id``
+
+    Callers bump ``read_cache.BANKS`` once, right before committing.
+    """
+    model = BANK_MODELS[bank_type]
+    if order_id is not None:
+        existing = _existing(order_id, bank_type)
+        if existing:
+            return existing, False
+
+    try:
+        with db.session.begin_nested():
+            changed = db.session.execute(
+                update(model)
+                .where(model.id == bank_id)
+                .values(amount=func.coalesce(model.amount, 0) + delta)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not changed:
+                raise BankNotFound(f"{bank_type} bank {bank_id} not found")
+            # Still inside the write, so this is the balance our increment produced
+            balance = db.session.execute(select(model.amount).where(model.id == bank_id)).scalar()
+            entry = BankTransaction(
+                order_id=order_id,
+                bank_type=bank_type,
+                bank_account_id=bank_id,
+                delta=delta,
+                balance_after=balance,
+                note=note,
+            )
+            db.session.add(entry)
+            db.session.flush()
+    except IntegrityError:
+        # A concurrent request for the same order won; our increment was rolled back
+        return _existing(order_id, bank_type), False
+    finally:
+        _expire(model, bank_id)
+    return entry, True
+
+
+def history(bank_type, bank_id, limit=50):
+    """Newest ledger entries of one account."""
+    return (
+        BankTransaction.query
+        .filter_by(bank_type=bank_type, bank_account_id=bank_id)
+        .order_by(BankTransaction.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def drift(bank_type, bank_id):
+    """
+    Difference between an account's balance and the sum of its ledger.
+
+    0 when every change went through ``apply()`` (and the account was
+    created with its opening balance recorded as an entry).
+    """
+    model = BANK_MODELS[bank_type]
+    balance = db.session.execute(select(func.coalesce(model.amount, 0)).where(model.id == bank_id)).scalar()
+    total = db.session.query(func.coalesce(func.sum(BankTransaction.delta), 0)).filter(
+        BankTransaction.bank_type == bank_type, BankTransaction.bank_account_id == bank_id
+    ).scalar()
+    return balance - total
@@ -6,9 +6,13 @@ Handles webhook delivery with retry logic and logging.
 import os
 import requests
 import logging
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
+from settings import BOT_WEBHOOK_BATCH_WORKERS
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,7 +46,8 @@ class BotWebhookClient:
         self,
         payload: Dict[str, Any],
         max_retries: int = 3,
-        timeout: int = 10
+        timeout: int = 10,
+        log_to: Optional[List[Dict[str, Any]]] = None
     ) -> bool:
         """
         Send webhook notification to bot with retry logic.
@@ -52,6 +57,7 @@ class BotWebhookClient:
             payload: Webhook payload dictionary
             max_retries: Maximum number of retry attempts
             timeout: Request timeout in seconds
+            log_to: Collect log entries in this list instead of writing them
             
         Returns:
             True if webhook was delivered successfully, False otherwise
@@ -65,7 +71,8 @@ class BotWebhookClient:
                 payload=payload,
                 status_code=None,
                 response="BOT_WEBHOOK_URL not configured",
-                success=False
+                success=False,
+                log_to=log_to
             )
             return False
         
@@ -106,7 +113,8 @@ class BotWebhookClient:
                         payload=payload,
                         status_code=response.status_code,
                         response=response.text[:500],  # Limit response length
-                        success=True
+                        success=True,
+                        log_to=log_to
                     )
                     return True
                 else:
@@ -124,7 +132,8 @@ class BotWebhookClient:
                         payload=payload,
                         status_code=response.status_code,
                         response=response.text[:500],
-                        success=False
+                        success=False,
+                        log_to=log_to
                     )
             
             except requests.exceptions.Timeout:
@@ -141,7 +150,8 @@ class BotWebhookClient:
                         payload=payload,
                         status_code=None,
                         response=f"Timeout after {max_retries} attempts",
-                        success=False
+                        success=False,
+                        log_to=log_to
                     )
             
             except requests.exceptions.ConnectionError as e:
@@ -158,7 +168,8 @@ class BotWebhookClient:
                         payload=payload,
                         status_code=None,
                         response=f"Connection error: {str(e)[:500]}",
-                        success=False
+                        success=False,
+                        log_to=log_to
                     )
             
             except Exception as e:
@@ -175,7 +186,8 @@ class BotWebhookClient:
                     payload=payload,
                     status_code=None,
                     response=f"Unexpected error: {str(e)[:500]}",
-                    success=False
+                    success=False,
+                    log_to=log_to
                 )
                 break  # Don't retry on unexpected errors
         
@@ -194,7 +206,8 @@ class BotWebhookClient:
         payload: Dict[str, Any],
         status_code: Optional[int],
         response: str,
-        success: bool
+        success: bool,
+        log_to: Optional[List[Dict[str, Any]]] = None
     ):
         """
         Log webhook delivery attempt to database.
@@ -205,18 +218,25 @@ class BotWebhookClient:
             status_code: HTTP status code (if available)
             response: Response text or error message
             success: Whether delivery was successful
+            log_to: Append the entry here instead of writing it (batch sends)
         """
+        import json
+
+        entry = {
+            "event_type": event_type,
+            "payload": json.dumps(payload),
+            "status_code": status_code,
+            "response": response,
+            "success": success
+        }
+        if log_to is not None:
+            log_to.append(entry)
+            return
+
         try:
-            import json
             from models import db, WebhookLog
             
-            log_entry = WebhookLog(
-                event_type=event_type,
-                payload=json.dumps(payload),
-                status_code=status_code,
-                response=response,
-                success=success
-            )
+            log_entry = WebhookLog(**entry)
             
             db.session.add(log_entry)
             db.session.commit()
@@ -224,6 +244,52 @@ class BotWebhookClient:
             # Don't fail webhook delivery if logging fails
             logger.error(f"Failed to log webhook attempt: {e}", exc_info=True)
     
+    @staticmethod
+    def order_status_changed_payload(
+        order_id: str,
+        status: str,
+        telegram_id: str,
+        chat_id: int,
+        amount: Optional[float] = None,
+        order_type: Optional[str] = None,
+        admin_receipt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Payload for the order_status_changed event (see notify_order_status_changed)."""
+        return {
+            "event": "order_status_changed",
+            "order_id": order_id,
+            "status": status,
+            "telegram_id": telegram_id,
+            "chat_id": chat_id,
+            "amount": amount,
+            "order_type": order_type,
+            "admin_receipt": admin_receipt
+        }
+    
+    @staticmethod
+    def order_verified_payload(
+        order_id: str,
+        telegram_id: str,
+        chat_id: int,
+        amount: float,
+        order_type: str,
+        price: float,
+        user_bank: Optional[str] = None,
+        receipt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Payload for the order_verified event (see notify_order_verified)."""
+        return {
+            "event": "order_verified",
+            "order_id": order_id,
+            "telegram_id": telegram_id,
+            "chat_id": chat_id,
+            "amount": amount,
+            "order_type": order_type,
+            "price": price,
+            "user_bank": user_bank,
+            "receipt": receipt
+        }
+    
     def notify_order_status_changed(
         self,
         order_id: str,
@@ -249,16 +315,9 @@ class BotWebhookClient:
         Returns:
             True if notification was sent successfully, False otherwise
         """
-        payload = {
-            "event": "order_status_changed",
-            "order_id": order_id,
-            "status": status,
-            "telegram_id": telegram_id,
-            "chat_id": chat_id,
-            "amount": amount,
-            "order_type": order_type,
-            "admin_receipt": admin_receipt
-        }
+        payload = self.order_status_changed_payload(
+            order_id, status, telegram_id, chat_id, amount, order_type, admin_receipt
+        )
         
         logger.info(
             f"Notifying bot of order status change: {order_id} -> {status}",
@@ -298,17 +357,9 @@ class BotWebhookClient:
         Returns:
             True if notification was sent successfully, False otherwise
         """
-        payload = {
-            "event": "order_verified",
-            "order_id": order_id,
-            "telegram_id": telegram_id,
-            "chat_id": chat_id,
-            "amount": amount,
-            "order_type": order_type,
-            "price": price,
-            "user_bank": user_bank,
-            "receipt": receipt
-        }
+        payload = self.order_verified_payload(
+            order_id, telegram_id, chat_id, amount, order_type, price, user_bank, receipt
+        )
         
         logger.info(
             f"Notifying bot of order verification: {order_id}",
@@ -360,6 +411,63 @@ class BotWebhookClient:
         )
         
         return self._send_webhook(payload)
+    
+    def send_batch(self, payloads: List[Dict[str, Any]], max_workers: int = BOT_WEBHOOK_BATCH_WORKERS) -> int:
+        """
+        Deliver several webhooks concurrently.
+        
+        Each payload is sent with the usual retries, up to ``max_workers`` at
+        a time, so a batch takes about as long as its slowest delivery. All
+        attempts are then logged to webhook_logs in one commit.
+        
+        Args:
+            payloads: Webhook payload dictionaries
+            max_workers: Maximum concurrent deliveries
+            
+        Returns:
+            Number of payloads delivered successfully
+        """
+        if not payloads:
+            return 0
+        
+        log_entries: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(payloads)))) as executor:
+            results = list(executor.map(lambda payload: self._send_webhook(payload, log_to=log_entries), payloads))
+        
+        delivered = sum(1 for ok in results if ok)
+        logger.info(f"Webhook batch delivered {delivered}/{len(payloads)}")
+        
+        try:
+            from models import db, WebhookLog
+            
+            db.session.bulk_insert_mappings(WebhookLog, log_entries)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to log webhook batch: {e}", exc_info=True)
+        
+        return delivered
+    
+    def send_batch_in_background(self, app, payloads: List[Dict[str, Any]]) -> Optional[threading.Thread]:
+        """
+        Run ``send_batch`` on a daemon thread so the request can return.
+        
+        Args:
+            app: Flask app; the thread pushes its context to log the attempts
+            payloads: Webhook payload dictionaries
+            
+        Returns:
+            The started thread, or None if there was nothing to send
+        """
+        if not payloads:
+            return None
+        
+        def run():
+            with app.app_context():
+                self.send_batch(payloads)
+        
+        thread = threading.Thread(target=run, name='webhook-batch', daemon=True)
+        thread.start()
+        return thread
 
 
 # Global webhook client instance
@@ -0,0 +1,96 @@
+"""
+In-process change notifications for admin chat streams.
+
+Write paths call ``publish(telegram_id)`` after committing a new message or an
+order status change. Server-Sent Event streams in routes/messages.py block on
+``wait`` and wake immediately when their conversation changes in the same
+worker. Changes committed by another gunicorn worker are picked up on the next
+timeout, so the stream always re-checks the database before pushing.
+"""
+import threading
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ChatEventBroker:
+    """
+    Per-conversation change counters guarded by a single condition variable.
+
+    Counters only ever increase; a waiter remembers the counter it last saw and
+    returns as soon as it differs or the timeout expires.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+
+    def version(self, telegram_id: str) -> int:
+        """Return the current change counter for a conversation."""
+        with self._condition:
+            return self._versions.get(str(telegram_id), 0)
+
+    def publish(self, telegram_id: Optional[str]):
+        """
+        Signal that a conversation changed.
+
+        Args:
+            telegram_id: Telegram ID of the conversation that changed
+        """
+        if not telegram_id:
+            return
+        key = str(telegram_id)
+        with self._condition:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, telegram_id: str, seen_version: int, timeout: float) -> int:
+        """
+        Block until the conversation changes or the timeout expires.
+
+        Args:
+            telegram_id: Telegram ID of the conversation to watch
+            seen_version: Counter value the caller last observed
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The counter value after waking up
+        """
+        key = str(telegram_id)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._versions.get(key, 0) != seen_version,
+                timeout=timeout
+            )
+            return self._versions.get(key, 0)
+
+
+# Global broker instance
+_broker: Optional[ChatEventBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_chat_event_broker() -> ChatEventBroker:
+    """
+    Get the global chat event broker.
+    Creates the instance on first call.
+
+    Returns:
+        ChatEventBroker instance
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = ChatEventBroker()
+    return _broker
+
+
+def publish(telegram_id: Optional[str]):
+    """Shortcut for ``get_chat_event_broker().publish(telegram_id)``."""
+    try:
+        get_chat_event_broker().publish(telegram_id)
+    except Exception as e:
+        # Notifications are best effort; streams fall back to their timeout
+        logger.error(f"Failed to publish chat event for {telegram_id}: {e}", exc_info=True)
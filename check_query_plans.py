@@ -0,0 +1,237 @@
+"""
+Query-plan check for the queries issued by routes/.
+
+Runs EXPLAIN for every registered query against the configured database
+(SQLite or PostgreSQL) and exits non-zero if any of them does a full table
+scan on a table that can grow without bound. Small configuration tables
+(settings, bank catalogs) are allowed to be scanned.
+
+Add an entry to QUERIES whenever a route gains a new query.
+
+Usage:
+    python check_query_plans.py              # check the configured DATABASE_URL
+    python check_query_plans.py --create-all # create missing tables first (scratch DBs)
+    python check_query_plans.py --verbose    # print every plan
+"""
+import argparse
+import json
+import re
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app import app
+import order_counters
+from models import (
+    db, Message, ArchivedMessage, TelegramID, Order, OrderSequence, OrderVolumeRollup, User, ConversationSummary,
+    MyanmarBankAccount, ThaiBankAccount, ExchangeRate, MaintenanceMode, AuthFeature,
+)
+
+# Tables that hold a handful of admin-managed rows; scanning them is expected
+SMALL_TABLES = {
+    'maintenance_mode', 'auth_feature', 'exchange_rates',
+    'thai_bank_accounts', 'myanmar_bank_accounts',
+    'bot_webhook_settings', 'otp',
+}
+
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+# Subqueries SQLAlchemy wraps compound selects in; scanning them reads the
+# subquery's result, not a table
+_ANONYMOUS = re.compile(r'^anon_\d+$')
+
+
+def _queries():
+    """
+    Representative queries mirroring routes/, as (name, SQLAlchemy query).
+
+    Parameter values are placeholders; only the plan shape matters.
+    """
+    telegram_id = '123456789'
+    telegram_pk = 1
+    now = datetime.now()
+
+    return [
+        # routes/messages.py
+        ('messages: chat list summaries',
+         ConversationSummary.query
+         .filter(ConversationSummary.last_message_id.isnot(None))
+         .order_by(ConversationSummary.last_message_id.desc())),
+        ('messages: conversation by telegram_id',
+         TelegramID.query.filter_by(telegram_id=telegram_id).limit(1)),
+        ('messages: latest message id watermark',
+         db.session.query(func.max(Message.id)).filter(Message.telegram_id == telegram_id)),
+        ('messages: newest page',
+         Message.query.filter(Message.telegram_id == telegram_id)
+         .order_by(Message.id.desc()).limit(50)),
+        ('messages: after_id delta',
+         Message.query.filter(Message.telegram_id == telegram_id, Message.id > 100)
+         .order_by(Message.id.asc()).limit(50)),
+        ('messages: before_id page',
+         Message.query.filter(Message.telegram_id == telegram_id, Message.id < 100)
+         .order_by(Message.id.desc()).limit(50)),
+        ('messages: archived page before cursor',
+         ArchivedMessage.query.filter(ArchivedMessage.telegram_id == telegram_id, ArchivedMessage.id < 100)
+         .order_by(ArchivedMessage.id.desc()).limit(50)),
+        ('messages: full history',
+         Message.query.filter_by(telegram_id=telegram_id).order_by(Message.id.asc())),
+        ('messages: latest order for conversation',
+         Order.query.join(TelegramID, TelegramID.latest_order_id == Order.id)
+         .filter(TelegramID.id == telegram_pk).limit(1)),
+
+        # routes/api/message.py
+        ('api/message: conversation by chat_id',
+         TelegramID.query.filter_by(chat_id=telegram_id).limit(1)),
+        ('api/message: unseen admin replies',
+         Message.query.filter_by(telegram_id=telegram_id, from_backend=True, seen_by_user=False)),
+
+        # routes/orders.py
+        ('orders: queue page by type',
+         Order.query.filter_by(order_type='buy').order_by(Order.created_at.desc()).limit(10).offset(0)),
+        ('orders: queue page by type and status',
+         Order.query.filter_by(order_type='buy', status='pending')
+         .order_by(Order.created_at.desc()).limit(10).offset(0)),
+        ('orders: counts by type and status (order_counters)',
+         order_counters.counts_query()),
+        ('orders: api list newest first',
+         Order.query.order_by(Order.created_at.desc()).limit(20).offset(0)),
+        ('orders: api list by status',
+         Order.query.filter_by(status='pending').order_by(Order.created_at.desc()).limit(20).offset(0)),
+        ('orders: order by primary key',
+         Order.query.filter(Order.id == 1)),
+
+        # routes/api/orders.py
+        ('api/orders: order sequence for today (generate_order_id)',
+         OrderSequence.query.filter_by(day=now.date())),
+        ('api/orders: order by order_id',
+         Order.query.filter_by(order_id='010125A0001B').limit(1)),
+        ('api/orders: latest order for user',
+         Order.query.filter_by(user_id=1).order_by(Order.created_at.desc()).limit(1)),
+        ('api/orders: myanmar bank by name',
+         MyanmarBankAccount.query.filter_by(bank_name='KBZ').limit(1)),
+
+        # routes/api/reports.py
+        ('api/reports: volume rollups in range',
+         OrderVolumeRollup.query.filter(
+             OrderVolumeRollup.granularity == 'day',
+             OrderVolumeRollup.bucket_start >= now - timedelta(days=30),
+             OrderVolumeRollup.bucket_start < now,
+         )),
+
+        # message_archive.py
+        ('archive: age cutoff id',
+         db.session.query(func.max(Message.id)).filter(Message.created_at < now - timedelta(days=90))),
+        ('archive: next batch',
+         Message.query.with_entities(Message.id)
+         .filter(Message.id > 0, Message.id <= 1000, Message.seen_by_admin.is_(True))
+         .order_by(Message.id.asc()).limit(1000)),
+
+        # routes/home.py, routes/api/settings.py, routes/api/banks.py
+        ('home: user and order counts (order_counters)',
+         order_counters.counts_query(include_users=True)),
+        ('settings: latest exchange rate',
+         ExchangeRate.query.order_by(ExchangeRate.updated_at.desc()).limit(1)),
+        ('settings: maintenance flag', MaintenanceMode.query.limit(1)),
+        ('settings: auth flag', AuthFeature.query.limit(1)),
+        ('banks: active thai banks', ThaiBankAccount.query.filter_by(on=True)),
+        ('banks: active myanmar banks', MyanmarBankAccount.query.filter_by(on=True)),
+
+        # routes/users.py
+        ('users: user by primary key', User.query.filter(User.id == 1)),
+    ]
+
+
+def _compile(query, dialect):
+    compiled = query.statement.compile(dialect=dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return str(compiled), params
+
+
+def _sqlite_plan(conn, sql, params):
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    details = [row[-1] for row in rows]
+    scanned = []
+    for detail in details:
+        match = _SQLITE_FULL_SCAN.match(detail.strip())
+        if match and not _ANONYMOUS.match(match.group(1)):
+            scanned.append(match.group(1))
+    return details, scanned
+
+
+def _postgres_plan(conn, sql, params):
+    # Small development databases make seq scans look cheapest; forbid them
+    # so the plan shows whether an index path exists at all.
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    raw = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", params).scalar()
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+
+    details, scanned = [], []
+
+    def walk(node, depth=0):
+        relation = node.get('Relation Name')
+        details.append('  ' * depth + node['Node Type'] + (f" on {relation}" if relation else ''))
+        if node['Node Type'] == 'Seq Scan' and relation:
+            scanned.append(relation)
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'])
+    return details, scanned
+
+
+def check(verbose=False):
+    """
+    EXPLAIN every registered query.
+
+    Returns:
+        List of (query name, scanned tables) for offending queries
+    """
+    dialect = db.engine.dialect
+    if dialect.name == 'sqlite':
+        explain = _sqlite_plan
+    elif dialect.name == 'postgresql':
+        explain = _postgres_plan
+    else:
+        raise SystemExit(f"Unsupported database dialect: {dialect.name}")
+
+    failures = []
+    with db.engine.connect() as conn:
+        for name, query in _queries():
+            sql, params = _compile(query, dialect)
+            with conn.begin():
+                details, scanned = explain(conn, sql, params)
+            offending = [t for t in scanned if t not in SMALL_TABLES]
+            status = "✗ FULL SCAN" if offending else "✓"
+            print(f"{status} {name}" + (f" ({', '.join(offending)})" if offending else ''))
+            if verbose or offending:
+                for line in details:
+                    print(f"      {line}")
+            if offending:
+                failures.append((name, offending))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--create-all', action='store_true', help='create missing tables before checking')
+    parser.add_argument('--verbose', action='store_true', help='print the plan of every query')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.create_all:
+            db.create_all()
+        print(f"Checking query plans on {db.engine.dialect.name}...")
+        failures = check(verbose=args.verbose)
+
+    if failures:
+        print(f"\n❌ {len(failures)} queries do full table scans")
+        sys.exit(1)
+    print("\n✅ No full table scans")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Maintenance of the denormalized ``conversation_summary`` table.
+
+Every message or order write calls one of the ``record_*`` helpers before
+committing, so the summary row changes in the same transaction as the data it
+describes. The admin chat list then reads one row per conversation instead of
+joining the full message history.
+"""
+import logging
+from sqlalchemy import update, or_, case
+from sqlalchemy.exc import IntegrityError
+
+from models import db, now_mmt, ConversationSummary, Message, Order, TelegramID
+import message_archive
+
+logger = logging.getLogger(__name__)
+
+# Characters of the last message kept for the chat list
+PREVIEW_LENGTH = 255
+
+
+def _preview(message):
+    return (message.content or '')[:PREVIEW_LENGTH]
+
+
+def _counts_as_unread(message):
+    """Messages written by admins never count towards the unread badge."""
+    return not message.from_backend and not message.seen_by_admin
+
+
+def _ensure_row(telegram_id):
+    """Create the summary row for a conversation if it does not exist yet."""
+    if db.session.query(ConversationSummary.telegram_id).filter_by(telegram_id=telegram_id).first():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(ConversationSummary(telegram_id=telegram_id, unread_by_admin=0))
+    except IntegrityError:
+        # Another request created it concurrently
+        pass
+
+
+def record_message(message):
+    """
+    Fold a newly added message into its conversation's summary row.
+
+    Must be called after ``db.session.add(message)`` and before the commit.
+    """
+    db.session.flush()  # Assign message.id
+    _ensure_row(message.telegram_id)
+    db.session.execute(
+        update(ConversationSummary)
+        .where(ConversationSummary.telegram_id == message.telegram_id)
+        .where(or_(
+            ConversationSummary.last_message_id.is_(None),
+            ConversationSummary.last_message_id < message.id
+        ))
+        .values(
+            last_message_id=message.id,
+            last_message_preview=_preview(message),
+            updated_at=now_mmt()
+        )
+    )
+    if _counts_as_unread(message):
+        db.session.execute(
+            update(ConversationSummary)
+            .where(ConversationSummary.telegram_id == message.telegram_id)
+            .values(
+                unread_by_admin=ConversationSummary.unread_by_admin + 1,
+                updated_at=now_mmt()
+            )
+        )
+
+
+def record_order(order):
+    """
+    Fold a new order, or a status change, into its conversation's summary row.
+
+    Only the newest order of a conversation is tracked; changes to older
+    orders leave the row alone. Must be called before the commit.
+    """
+    db.session.flush()  # Assign order.id
+    telegram = order.telegram or (TelegramID.query.get(order.telegram_id) if order.telegram_id else None)
+    if not telegram or not telegram.telegram_id:
+        return
+    _ensure_row(telegram.telegram_id)
+    db.session.execute(
+        update(ConversationSummary)
+        .where(ConversationSummary.telegram_id == telegram.telegram_id)
+        .where(or_(
+            ConversationSummary.last_order_id.is_(None),
+            ConversationSummary.last_order_id <= order.id
+        ))
+        .values(
+            last_order_id=order.id,
+            last_order_status=order.status,
+            updated_at=now_mmt()
+        )
+    )
+
+
+def mark_read(telegram_id, count):
+    """
+    Subtract messages the admin has just seen from the unread counter.
+
+    Args:
+        telegram_id: Conversation whose messages were marked seen
+        count: Number of customer messages that flipped to seen_by_admin
+    """
+    if not count:
+        return
+    db.session.execute(
+        update(ConversationSummary)
+        .where(ConversationSummary.telegram_id == telegram_id)
+        .values(unread_by_admin=case(
+            (ConversationSummary.unread_by_admin > count, ConversationSummary.unread_by_admin - count),
+            else_=0
+        ))
+    )
+
+
+def refresh(telegram_id):
+    """
+    Recompute one conversation's summary row from the source tables.
+
+    Used after deletes, where incremental maintenance cannot tell what the
+    new "last" row is.
+    """
+    telegram = TelegramID.query.filter_by(telegram_id=telegram_id).first()
+    summary = ConversationSummary.query.get(telegram_id)
+    if not telegram:
+        if summary:
+            db.session.delete(summary)
+        return
+
+    last_message = (
+        Message.query
+        .filter_by(telegram_id=telegram_id)
+        .order_by(Message.id.desc())
+        .first()
+    )
+    if last_message is None:
+        # Everything may have been moved to cold storage
+        archived = message_archive.fetch_before(telegram_id, None, 1)
+        last_message = archived[0] if archived else None
+    unread = Message.query.filter_by(
+        telegram_id=telegram_id, from_backend=False, seen_by_admin=False
+    ).count()
+    last_order = (
+        Order.query
+        .filter_by(telegram_id=telegram.id)
+        .order_by(Order.id.desc())
+        .first()
+    )
+
+    if summary is None:
+        summary = ConversationSummary(telegram_id=telegram_id)
+        db.session.add(summary)
+    summary.last_message_id = last_message.id if last_message else None
+    summary.last_message_preview = _preview(last_message) if last_message else None
+    summary.unread_by_admin = unread
+    summary.last_order_id = last_order.id if last_order else None
+    summary.last_order_status = last_order.status if last_order else None
+    summary.updated_at = now_mmt()
+
+
+def rebuild(batch_size=500):
+    """
+    Rebuild the whole summary table from messages and orders.
+
+    Runs in batches of conversations and commits after each batch.
+
+    Returns:
+        Number of conversations summarized
+    """
+    ConversationSummary.query.delete()
+    db.session.commit()
+
+    telegram_ids = [
+        row[0] for row in
+        db.session.query(TelegramID.telegram_id)
+        .filter(TelegramID.telegram_id.isnot(None))
+        .order_by(TelegramID.id)
+        .all()
+    ]
+    for start in range(0, len(telegram_ids), batch_size):
+        for telegram_id in telegram_ids[start:start + batch_size]:
+            refresh(telegram_id)
+        db.session.commit()
+        logger.info(f"Rebuilt conversation summaries {start + 1}-{min(start + batch_size, len(telegram_ids))}")
+    return len(telegram_ids)
+
+
+def needs_rebuild():
+    """True when messages exist but the summary table is still empty."""
+    has_messages = db.session.query(Message.id).first() is not None
+    has_summaries = db.session.query(ConversationSummary.telegram_id).first() is not None
+    return has_messages and not has_summaries
@@ -0,0 +1,138 @@
+"""
+Script to move existing uploads into the content-addressed upload store.
+
+Walks every upload path stored on orders (receipt, confirm_receipt, qr) and
+chat messages (image, hot and archived), moves each file into
+static/uploads/blobs/ under its sha256, deletes byte-identical copies and
+rewrites the stored paths. Reference counts are then recomputed from the
+database, and blobs nothing points at are deleted.
+
+Safe to re-run: paths already in the store are left as they are. Run it
+after `flask db upgrade` has created the upload_blobs table, ideally while
+the bot is stopped.
+
+Usage:
+    python dedupe_uploads.py
+    python dedupe_uploads.py --dry-run
+"""
+import argparse
+import os
+from collections import Counter
+
+from app import app
+from models import db, Order, Message, ArchivedMessage, UploadBlob
+import upload_store
+
+# (model, column names holding comma-separated upload paths)
+UPLOAD_COLUMNS = [
+    (Order, ['receipt', 'confirm_receipt', 'qr']),
+    (Message, ['image']),
+    (ArchivedMessage, ['image']),
+]
+
+BATCH_SIZE = 500
+
+
+def _iter_rows(model, columns):
+    """Rows with at least one upload column set, in primary key batches."""
+    last_id = 0
+    filters = db.or_(*[getattr(model, column).isnot(None) for column in columns])
+    while True:
+        rows = (
+            model.query.filter(model.id > last_id, filters)
+            .order_by(model.id.asc())
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _rewrite(value, moved, stats, dry_run):
+    """
+    Move each file of a comma-separated path list into the store.
+
+    Returns:
+        (new value, whether anything moved)
+    """
+    parts = []
+    changed = False
+    for part in value.split(','):
+        path = part.strip()
+        plain = path.lstrip('/')
+        if plain and not upload_store.is_blob_path(plain) and plain not in moved:
+            if os.path.isfile(plain):
+                moved[plain] = plain if dry_run else upload_store.adopt(plain)
+                stats['files'] += 1
+            else:
+                stats['missing'] += 1
+        if plain in moved:
+            # Keep each column's leading-slash convention
+            parts.append(('/' if path.startswith('/') else '') + moved[plain])
+            changed = True
+        else:
+            parts.append(part)
+    return ','.join(parts), changed
+
+
+def _recount():
+    """Recompute every blob's ref_count from the paths stored in the database."""
+    counts = Counter()
+    for model, columns in UPLOAD_COLUMNS:
+        for rows in _iter_rows(model, columns):
+            for row in rows:
+                for column in columns:
+                    for part in (getattr(row, column) or '').split(','):
+                        plain = part.strip().lstrip('/')
+                        if upload_store.is_blob_path(plain):
+                            counts[plain] += 1
+            db.session.expunge_all()
+    for blob in UploadBlob.query.all():
+        blob.ref_count = counts.get(blob.path, 0)
+    db.session.commit()
+
+
+def run_dedupe(dry_run=False):
+    """Move legacy uploads into the store and rebuild reference counts."""
+    with app.app_context():
+        stats = Counter()
+        moved = {}
+        for model, columns in UPLOAD_COLUMNS:
+            print(f"Scanning {model.__tablename__} ({', '.join(columns)})...")
+            for rows in _iter_rows(model, columns):
+                for row in rows:
+                    for column in columns:
+                        value = getattr(row, column)
+                        if not value:
+                            continue
+                        new_value, changed = _rewrite(value, moved, stats, dry_run)
+                        if changed:
+                            stats['rows'] += 1
+                            if not dry_run:
+                                setattr(row, column, new_value)
+                if dry_run:
+                    db.session.rollback()
+                else:
+                    db.session.commit()
+
+        if dry_run:
+            print(f"✓ Dry run: {stats['files']} files in {stats['rows']} columns would move into the store")
+            print(f"  - {stats['missing']} referenced files are missing on disk")
+            return
+
+        _recount()
+        removed = upload_store.collect_garbage()
+        blobs = UploadBlob.query.count()
+        print(f"✓ Moved {stats['files']} files into the store ({blobs} distinct blobs)")
+        print(f"  - Rewrote {stats['rows']} columns")
+        print(f"  - Deleted {removed} unreferenced blobs")
+        print(f"  - {stats['missing']} referenced files are missing on disk")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move existing uploads into the deduplicated upload store')
+    parser.add_argument('--dry-run', action='store_true', help='report what would move without changing anything')
+    args = parser.parse_args()
+    run_dedupe(dry_run=args.dry_run)
@@ -1,7 +1,11 @@
-from models import db, Message, TelegramID
+from models import db, Message, ArchivedMessage, TelegramID, ConversationSummary
 from app import app
+import search
 
 with app.app_context():
+    ConversationSummary.query.delete()
     Message.query.delete()
+    ArchivedMessage.query.delete()
+    search.clear(search.KIND_MESSAGE)
     TelegramID.query.delete()
     db.session.commit()
\ No newline at end of file
@@ -5,4 +5,5 @@ echo "Initializing database..."
 python init_db.py
 
 echo "Starting application..."
-exec gunicorn --bind 0.0.0.0:5000 --workers 2 --timeout 120 app:app
+# gthread workers keep admin chat event streams from tying up a whole worker
+exec gunicorn --bind 0.0.0.0:5000 --workers 2 --worker-class gthread --threads 16 --timeout 120 app:app
@@ -0,0 +1,185 @@
+"""
+Idempotency-Key support for the bot's submit endpoints.
+
+When the bot times out and retries a POST, it sends the same
+``Idempotency-Key`` header again. A view decorated with ``@idempotent``
+records the first request's key in ``idempotency_keys`` before running, and
+its response afterwards. A retry with the same key gets the stored response
+back (with ``Idempotent-Replayed: true``) without storing uploads or
+inserting rows a second time.
+
+- Retry while the first request is still running: 409 with Retry-After.
+- Same key with different form fields: 422.
+- Requests without the header behave as before.
+
+Keys expire after IDEMPOTENCY_KEY_TTL_SECONDS and expired rows are purged
+opportunistically. Claims and responses are written on their own
+connection, before and after the view, so a claim is visible to concurrent
+retries straight away and never waits on the view's transaction.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+
+from flask import request, make_response, jsonify
+from sqlalchemy import select, insert, update, delete, or_, and_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, now_mmt, IdempotencyKey
+from settings import IDEMPOTENCY_KEY_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# A claim without a response after this long belongs to a crashed worker
+ABANDONED_AFTER_SECONDS = 120
+
+# Minimum time between purges of expired keys, per process
+PURGE_INTERVAL_SECONDS = 300
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def _now():
+    return now_mmt().replace(tzinfo=None)
+
+
+def fingerprint():
+    """Hash of the request's method, path, fields and file names."""
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    for name, value in sorted(request.form.items(multi=True)):
+        digest.update(f"{name}={value}\n".encode())
+    for name, file in sorted(request.files.items(multi=True), key=lambda item: (item[0], item[1].filename or '')):
+        digest.update(f"{name}@{file.filename}\n".encode())
+    if request.is_json:
+        digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def purge_expired():
+    """
+    Delete expired keys.
+
+    Returns:
+        Number of keys deleted
+    """
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as conn:
+        return conn.execute(delete(table).where(table.c.expires_at < _now())).rowcount
+
+
+def _maybe_purge():
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        _last_purge = time.monotonic()
+    try:
+        purge_expired()
+    except Exception as e:
+        logger.warning(f"Failed to purge expired idempotency keys: {e}")
+
+
+def _where(scope, key):
+    table = IdempotencyKey.__table__
+    return and_(table.c.scope == scope, table.c.key == key)
+
+
+def _claim(scope, key, request_fingerprint):
+    """
+    Record a key as in progress.
+
+    Returns:
+        None if this request claimed the key, else the existing row
+    """
+    table = IdempotencyKey.__table__
+    now = _now()
+    with db.engine.begin() as conn:
+        # Free the key if it expired or its first request never finished
+        conn.execute(delete(table).where(_where(scope, key), or_(
+            table.c.expires_at < now,
+            and_(table.c.status_code.is_(None),
+                 table.c.created_at < now - timedelta(seconds=ABANDONED_AFTER_SECONDS)),
+        )))
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(table).values(
+                scope=scope, key=key, fingerprint=request_fingerprint, created_at=now,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_KEY_TTL_SECONDS),
+            ))
+        return None
+    except IntegrityError:
+        with db.engine.connect() as conn:
+            return conn.execute(select(table).where(_where(scope, key))).mappings().first()
+
+
+def _store(scope, key, response):
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as conn:
+        conn.execute(update(table).where(_where(scope, key)).values(
+            status_code=response.status_code,
+            response_body=response.get_data(as_text=True),
+            mimetype=response.mimetype,
+        ))
+
+
+def _release(scope, key):
+    """Forget an unfinished claim so the client can retry."""
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as conn:
+        conn.execute(delete(table).where(_where(scope, key), table.c.status_code.is_(None)))
+
+
+def _replay(existing, request_fingerprint):
+    if existing['fingerprint'] != request_fingerprint:
+        return jsonify({'error': f'{HEADER} was already used with a different request'}), 422
+    if existing['status_code'] is None:
+        response = jsonify({'error': 'A request with this Idempotency-Key is still being processed'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    response = make_response(existing['response_body'], existing['status_code'])
+    response.mimetype = existing['mimetype'] or 'application/json'
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Decorator replaying the stored response for a repeated Idempotency-Key.
+
+    Keys are scoped to the endpoint. Responses with a 5xx status are not
+    stored, so those requests can be retried with the same key.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.headers.get(HEADER) or '').strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        _maybe_purge()
+        scope = request.endpoint
+        request_fingerprint = fingerprint()
+        existing = _claim(scope, key, request_fingerprint)
+        if existing is not None:
+            return _replay(existing, request_fingerprint)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _release(scope, key)
+            raise
+        if response.status_code >= 500:
+            _release(scope, key)
+        else:
+            _store(scope, key, response)
+        return response
+    return wrapper
@@ -3,6 +3,10 @@
 from app import app, db
 from models import MaintenanceMode, AuthFeature, ExchangeRate, BotWebhookSettings
 from settings import BOT_WEBHOOK_URL, BOT_WEBHOOK_SECRET
+import conversation_summary
+import latest_orders
+import order_rollups
+import search
 
 def init_database():
     """Create all database tables and initialize default records."""
@@ -41,6 +45,27 @@ def init_database():
         
         # Commit all changes
         db.session.commit()
+
+        # Populate the chat list summary on databases that predate it
+        if conversation_summary.needs_rebuild():
+            count = conversation_summary.rebuild()
+            print(f"✓ Conversation summaries rebuilt ({count})")
+
+        # Full-text search table (FTS5 on SQLite, tsvector/GIN on PostgreSQL)
+        search.ensure_schema()
+        if search.needs_rebuild():
+            count = search.rebuild()
+            print(f"✓ Search index rebuilt ({count} documents)")
+
+        # Latest-order pointers on databases that predate them
+        if latest_orders.needs_rebuild():
+            count = latest_orders.rebuild()
+            print(f"✓ Latest order pointers rebuilt ({count} customers)")
+
+        # Volume report rollups on databases that predate them
+        if order_rollups.needs_rebuild():
+            count = order_rollups.rebuild()
+            print(f"✓ Order volume rollups rebuilt ({count} approved orders)")
         print("✓ Database initialization complete")
 
 if __name__ == "__main__":
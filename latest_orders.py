@@ -0,0 +1,136 @@
+"""
+``telegram_ids.latest_order_id``: each customer's newest order.
+
+Callers read one order row through the pointer instead of loading every
+order a customer ever placed and sorting them in Python. Order inserts call
+``record_order`` and deletes call ``refresh`` before committing, so the
+pointer changes in the same transaction as the orders it points at.
+"Newest" means the highest ``orders.id``, as in conversation_summary.
+"""
+from sqlalchemy import update, select, func, or_
+
+from models import db, Order, TelegramID
+
+
+def _newest_order_id(telegram_pk_column):
+    return (
+        select(func.max(Order.id))
+        .where(Order.telegram_id == telegram_pk_column)
+        .scalar_subquery()
+    )
+
+
+def record_order(order):
+    """
+    Point the order's customer at it if it is their newest order.
+
+    Must be called after the order is flushed and before the commit.
+    """
+    if not order.telegram_id:
+        return
+    db.session.execute(
+        update(TelegramID)
+        .where(TelegramID.id == order.telegram_id)
+        .where(or_(TelegramID.latest_order_id.is_(None), TelegramID.latest_order_id < order.id))
+        .values(latest_order_id=order.id)
+        .execution_options(synchronize_session=False)
+    )
+    telegram = db.session.identity_map.get(db.session.identity_key(TelegramID, order.telegram_id))
+    if telegram is not None:
+        db.session.expire(telegram, ['latest_order_id', 'latest_order'])
+
+
+def refresh(telegram_pk):
+    """Recompute one customer's pointer, e.g. after deleting an order (call after the flush)."""
+    if not telegram_pk:
+        return
+    db.session.execute(
+        update(TelegramID)
+        .where(TelegramID.id == telegram_pk)
+        .values(latest_order_id=_newest_order_id(TelegramID.id))
+        .execution_options(synchronize_session=False)
+    )
+    telegram = db.session.identity_map.get(db.session.identity_key(TelegramID, telegram_pk))
+    if telegram is not None:
+        db.session.expire(telegram, ['latest_order_id', 'latest_order'])
+
+
+def needs_rebuild():
+    """True if some customer with orders has no pointer yet (databases that predate it)."""
+    return db.session.query(
+        TelegramID.query
+        .filter(TelegramID.latest_order_id.is_(None))
+        .filter(TelegramID.orders.any())
+        .exists()
+    ).scalar()
+
+
+def rebuild():
+    """Recompute every pointer with one UPDATE and commit. Returns the number of customers."""
+    result = db.session.execute(
+        update(TelegramID)
+        .values(latest_order_id=_newest_order_id(TelegramID.id))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def get(telegram, options=()):
+    """
+    Newest order of one customer, or None.
+
+    Reads the row by primary key, straight from the session if it is
+    already loaded.
+    """
+    if telegram is None or not telegram.latest_order_id:
+        return None
+    return Order.query.options(*options).get(telegram.latest_order_id)
+
+
+def pending_by_chat_id(chat_id, options=()):
+    """
+    Look up a chat and its newest order if that order is pending, in one query.
+
+    Returns:
+        (found, order): ``found`` is False for unknown chats; ``order`` is
+        None unless the newest order is pending
+    """
+    row = (
+        db.session.query(TelegramID.id, Order)
+        .outerjoin(Order, (Order.id == TelegramID.latest_order_id) & (Order.status == 'pending'))
+        .options(*options)
+        .filter(TelegramID.chat_id == chat_id)
+        .first()
+    )
+    if row is None:
+        return False, None
+    return True, row[1]
+
+
+def by_telegram_pk(telegram_pk):
+    """Newest order of the customer with this telegram_ids.id, in one query (no TelegramID needed)."""
+    return (
+        Order.query
+        .join(TelegramID, TelegramID.latest_order_id == Order.id)
+        .filter(TelegramID.id == telegram_pk)
+        .first()
+    )
+
+
+def for_telegrams(telegrams, options=()):
+    """
+    Newest orders of several customers in one query.
+
+    Args:
+        telegrams: TelegramID rows
+        options: Extra query options, e.g. load_only
+
+    Returns:
+        Dict of TelegramID.id -> Order for customers that have orders
+    """
+    pointers = {t.id: t.latest_order_id for t in telegrams if t.id and t.latest_order_id}
+    if not pointers:
+        return {}
+    orders = {o.id: o for o in Order.query.options(*options).filter(Order.id.in_(set(pointers.values())))}
+    return {pk: orders[order_id] for pk, order_id in pointers.items() if order_id in orders}
@@ -0,0 +1,119 @@
+"""
+Hot/cold tiering for chat messages.
+
+``archive_old_messages`` moves messages older than MESSAGE_ARCHIVE_AFTER_DAYS
+from ``messages`` into the compact ``messages_archive`` table in small
+batches, committing after each one so the live table never sees long locks.
+Archived rows keep their ids, so ``fetch_before`` can continue a
+``before_id`` scroll-back page once the hot table runs out.
+"""
+import logging
+from datetime import timedelta
+
+from sqlalchemy import select, insert, delete, or_, func
+
+from models import db, now_mmt, Message, ArchivedMessage
+from settings import MESSAGE_ARCHIVE_AFTER_DAYS, MESSAGE_ARCHIVE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Columns copied from messages into messages_archive
+ARCHIVED_COLUMNS = [
+    'id', 'content', 'chosen_option', 'image', 'from_bot',
+    'from_backend', 'buttons', 'telegram_id', 'created_at',
+]
+
+
+def _archivable():
+    """
+    Messages that are safe to move: the admin has seen them and, for admin
+    replies, the bot has delivered them.
+    """
+    return [
+        Message.seen_by_admin.is_(True),
+        or_(Message.from_backend.isnot(True), Message.seen_by_user.is_(True)),
+    ]
+
+
+def _cutoff_id(older_than_days):
+    """
+    Highest message id created before the age cutoff.
+
+    Ids are monotonic, so everything at or below it is at least that old,
+    including legacy rows written before messages.created_at existed.
+    """
+    cutoff = now_mmt() - timedelta(days=older_than_days)
+    return db.session.query(func.max(Message.id)).filter(Message.created_at < cutoff).scalar()
+
+
+def archive_old_messages(older_than_days=None, batch_size=None, max_batches=None):
+    """
+    Move old, fully handled messages into the archive table.
+
+    Args:
+        older_than_days: Minimum message age (defaults to MESSAGE_ARCHIVE_AFTER_DAYS)
+        batch_size: Rows moved per transaction (defaults to MESSAGE_ARCHIVE_BATCH_SIZE)
+        max_batches: Stop after this many batches (None for no limit)
+
+    Returns:
+        Number of messages archived
+    """
+    older_than_days = MESSAGE_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or MESSAGE_ARCHIVE_BATCH_SIZE
+
+    cutoff_id = _cutoff_id(older_than_days)
+    if cutoff_id is None:
+        return 0
+
+    archived = 0
+    batches = 0
+    last_id = 0
+    source = Message.__table__
+    columns = [source.c[name] for name in ARCHIVED_COLUMNS]
+    while max_batches is None or batches < max_batches:
+        ids = [
+            row[0] for row in
+            db.session.query(Message.id)
+            .filter(Message.id > last_id, Message.id <= cutoff_id, *_archivable())
+            .order_by(Message.id.asc())
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            break
+
+        db.session.execute(
+            insert(ArchivedMessage.__table__).from_select(
+                ARCHIVED_COLUMNS,
+                select(columns).where(source.c.id.in_(ids))
+            )
+        )
+        db.session.execute(delete(source).where(source.c.id.in_(ids)))
+        db.session.commit()
+
+        archived += len(ids)
+        batches += 1
+        last_id = ids[-1]
+        logger.info(f"Archived {len(ids)} messages (up to id {last_id})")
+
+    return archived
+
+
+def fetch_before(telegram_id, before_id, limit):
+    """
+    Newest archived messages of a conversation older than ``before_id``.
+
+    Args:
+        telegram_id: Conversation to page
+        before_id: Exclusive upper bound (None for the newest archived rows)
+        limit: Maximum number of rows
+
+    Returns:
+        List of ArchivedMessage, newest first
+    """
+    if limit <= 0:
+        return []
+    query = ArchivedMessage.query.filter(ArchivedMessage.telegram_id == telegram_id)
+    if before_id is not None:
+        query = query.filter(ArchivedMessage.id < before_id)
+    return query.order_by(ArchivedMessage.id.desc()).limit(limit).all()
@@ -0,0 +1,103 @@
+"""
+Atomic claiming of admin replies that the bot has not delivered yet.
+
+``claim_unseen`` flips ``seen_by_user`` and returns the claimed rows in one
+statement, so two concurrent pollers can never deliver the same message:
+
+- PostgreSQL: ``UPDATE ... RETURNING`` over a ``FOR UPDATE SKIP LOCKED``
+  subquery; a concurrent claimer skips rows another one holds.
+- SQLite 3.35+: ``UPDATE ... RETURNING``; SQLite serializes writers.
+- Anything else: a conditional per-row UPDATE, keeping only the rows whose
+  update actually matched.
+"""
+import sqlite3
+
+from sqlalchemy import text
+
+from models import db, Message
+
+# Columns returned to the bot, as in /api/message/poll
+CLAIM_COLUMNS = ['id', 'content', 'chosen_option', 'image', 'from_bot', 'from_backend', 'buttons']
+
+_RETURNING = ', '.join(CLAIM_COLUMNS)
+
+_POSTGRES_CLAIM = text(f"""
+    UPDATE messages SET seen_by_user = true
+    WHERE id IN (
+        SELECT id FROM messages
+        WHERE telegram_id = :telegram_id AND from_backend = true AND seen_by_user = false
+        ORDER BY id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING {_RETURNING}
+""")
+
+_SQLITE_CLAIM = text(f"""
+    UPDATE messages SET seen_by_user = 1
+    WHERE id IN (
+        SELECT id FROM messages
+        WHERE telegram_id = :telegram_id AND from_backend = 1 AND seen_by_user = 0
+        ORDER BY id
+        LIMIT :limit
+    )
+    RETURNING {_RETURNING}
+""")
+
+
+def _claim_returning(statement, telegram_id, limit):
+    rows = [
+        dict(row._mapping)
+        for row in db.session.execute(statement, {'telegram_id': telegram_id, 'limit': limit})
+    ]
+    for row in rows:
+        # Raw SQLite results carry booleans as 0/1
+        row['from_bot'] = bool(row['from_bot'])
+        row['from_backend'] = bool(row['from_backend'])
+    # RETURNING order is unspecified
+    return sorted(rows, key=lambda row: row['id'])
+
+
+def _claim_row_by_row(telegram_id, limit):
+    candidates = (
+        db.session.query(Message.id)
+        .filter_by(telegram_id=telegram_id, from_backend=True, seen_by_user=False)
+        .order_by(Message.id)
+        .limit(limit)
+        .all()
+    )
+    claimed_ids = []
+    for (message_id,) in candidates:
+        updated = (
+            Message.query
+            .filter(Message.id == message_id, Message.seen_by_user.is_(False))
+            .update({Message.seen_by_user: True}, synchronize_session=False)
+        )
+        if updated:
+            claimed_ids.append(message_id)
+    if not claimed_ids:
+        return []
+    rows = (
+        db.session.query(*[getattr(Message, column) for column in CLAIM_COLUMNS])
+        .filter(Message.id.in_(claimed_ids))
+        .order_by(Message.id)
+        .all()
+    )
+    return [dict(zip(CLAIM_COLUMNS, row)) for row in rows]
+
+
+def claim_unseen(telegram_id, limit=100):
+    """
+    Mark up to ``limit`` undelivered admin replies as seen and return them.
+
+    The caller commits.
+
+    Returns:
+        List of message dicts (CLAIM_COLUMNS), oldest first
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return _claim_returning(_POSTGRES_CLAIM, telegram_id, limit)
+    if dialect == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35):
+        return _claim_returning(_SQLITE_CLAIM, telegram_id, limit)
+    return _claim_row_by_row(telegram_id, limit)
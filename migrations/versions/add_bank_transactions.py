@@ -0,0 +1,51 @@
+"""Add bank_transactions ledger
+
+Revision ID: add_bank_transactions
+Revises: add_telegram_latest_order
+Create Date: 2026-10-16 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_bank_transactions'
+down_revision = 'add_telegram_latest_order'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bank_transactions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.String(length=50), nullable=True),
+        sa.Column('bank_type', sa.String(length=10), nullable=False),
+        sa.Column('bank_account_id', sa.Integer(), nullable=False),
+        sa.Column('delta', sa.Float(), nullable=False),
+        sa.Column('balance_after', sa.Float(), nullable=False),
+        sa.Column('note', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('order_id', 'bank_type', name='uq_bank_transactions_order_bank')
+    )
+    op.create_index('ix_bank_transactions_account', 'bank_transactions', ['bank_type', 'bank_account_id', 'id'], unique=False)
+
+    # Existing balances become each account's opening entry, so the ledger
+    # sums to the balance from the start. ``amount`` itself is added by
+    # migrations/add_amount_to_banks.py, so it may not exist yet
+    inspector = sa.inspect(op.get_bind())
+    for bank_type, table in (('thai', 'thai_bank_accounts'), ('myanmar', 'myanmar_bank_accounts')):
+        if 'amount' not in {column['name'] for column in inspector.get_columns(table)}:
+            continue
+        op.execute(f"""
+            INSERT INTO bank_transactions (order_id, bank_type, bank_account_id, delta, balance_after, note, created_at)
+            SELECT NULL, '{bank_type}', id, amount, amount, 'Opening balance', CURRENT_TIMESTAMP
+            FROM {table}
+            WHERE amount IS NOT NULL AND amount != 0
+        """)
+
+
+def downgrade():
+    op.drop_index('ix_bank_transactions_account', table_name='bank_transactions')
+    op.drop_table('bank_transactions')
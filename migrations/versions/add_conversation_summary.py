@@ -0,0 +1,81 @@
+"""Add denormalized conversation summary table
+
+Revision ID: add_conversation_summary
+Revises: add_webhook_models
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_conversation_summary'
+down_revision = 'add_webhook_models'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'conversation_summary',
+        sa.Column('telegram_id', sa.String(length=255), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_preview', sa.String(length=255), nullable=True),
+        sa.Column('unread_by_admin', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_order_id', sa.Integer(), nullable=True),
+        sa.Column('last_order_status', sa.String(length=50), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['telegram_id'], ['telegram_ids.telegram_id'], ),
+        sa.ForeignKeyConstraint(['last_order_id'], ['orders.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('telegram_id')
+    )
+    op.create_index(
+        'ix_conversation_summary_last_message_id',
+        'conversation_summary',
+        ['last_message_id'],
+        unique=False
+    )
+
+    # Backfill one row per conversation that has messages or orders
+    op.execute("""
+        INSERT INTO conversation_summary (telegram_id, unread_by_admin, updated_at)
+        SELECT t.telegram_id, 0, CURRENT_TIMESTAMP
+        FROM telegram_ids t
+        WHERE t.telegram_id IS NOT NULL
+          AND (EXISTS (SELECT 1 FROM messages m WHERE m.telegram_id = t.telegram_id)
+               OR EXISTS (SELECT 1 FROM orders o WHERE o.telegram_id = t.id))
+    """)
+    op.execute("""
+        UPDATE conversation_summary SET
+            last_message_id = (
+                SELECT MAX(m.id) FROM messages m
+                WHERE m.telegram_id = conversation_summary.telegram_id
+            ),
+            unread_by_admin = (
+                SELECT COUNT(*) FROM messages m
+                WHERE m.telegram_id = conversation_summary.telegram_id
+                  AND m.from_backend = false AND m.seen_by_admin = false
+            ),
+            last_order_id = (
+                SELECT MAX(o.id) FROM orders o
+                JOIN telegram_ids t ON t.id = o.telegram_id
+                WHERE t.telegram_id = conversation_summary.telegram_id
+            )
+    """)
+    op.execute("""
+        UPDATE conversation_summary SET
+            last_message_preview = (
+                SELECT SUBSTR(m.content, 1, 255) FROM messages m
+                WHERE m.id = conversation_summary.last_message_id
+            ),
+            last_order_status = (
+                SELECT o.status FROM orders o
+                WHERE o.id = conversation_summary.last_order_id
+            )
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_conversation_summary_last_message_id', table_name='conversation_summary')
+    op.drop_table('conversation_summary')
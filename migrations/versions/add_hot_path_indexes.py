@@ -0,0 +1,39 @@
+"""Add secondary indexes for hot query paths
+
+Revision ID: add_hot_path_indexes
+Revises: add_conversation_summary
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes'
+down_revision = 'add_conversation_summary'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns) - keep in sync with __table_args__ in models.py
+INDEXES = [
+    ('ix_messages_telegram_id_id', 'messages', ['telegram_id', 'id']),
+    ('ix_messages_unseen_by_user', 'messages', ['telegram_id', 'from_backend', 'seen_by_user']),
+    ('ix_telegram_ids_chat_id', 'telegram_ids', ['chat_id']),
+    ('ix_orders_telegram_id_created_at', 'orders', ['telegram_id', 'created_at']),
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at']),
+    ('ix_orders_type_created_at', 'orders', ['order_type', 'created_at']),
+    ('ix_orders_type_status_created_at', 'orders', ['order_type', 'status', 'created_at']),
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at']),
+    ('ix_orders_created_at', 'orders', ['created_at']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,44 @@
+"""Add messages.created_at and the messages_archive cold table
+
+Revision ID: add_message_archive
+Revises: add_order_updated_at
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_message_archive'
+down_revision = 'add_order_updated_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_messages_created_at', 'messages', ['created_at'], unique=False)
+
+    op.create_table('messages_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('content', sa.String(length=1024), nullable=False),
+        sa.Column('chosen_option', sa.String(length=1024), nullable=True),
+        sa.Column('image', sa.Text(), nullable=True),
+        sa.Column('from_bot', sa.Boolean(), nullable=True),
+        sa.Column('from_backend', sa.Boolean(), nullable=True),
+        sa.Column('buttons', sa.String(length=1024), nullable=True),
+        sa.Column('telegram_id', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_messages_archive_telegram_id_id', 'messages_archive', ['telegram_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_messages_archive_telegram_id_id', table_name='messages_archive')
+    op.drop_table('messages_archive')
+    op.drop_index('ix_messages_created_at', table_name='messages')
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.drop_column('created_at')
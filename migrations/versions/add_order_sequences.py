@@ -0,0 +1,35 @@
+"""Add per-day order number sequence table
+
+Revision ID: add_order_sequences
+Revises: add_search_index
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_sequences'
+down_revision = 'add_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_sequences',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('last_value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day')
+    )
+    # Continue numbering after the orders already created on each day
+    op.execute("""
+        INSERT INTO order_sequences (day, last_value)
+        SELECT DATE(created_at), COUNT(*) FROM orders
+        WHERE created_at IS NOT NULL
+        GROUP BY DATE(created_at)
+    """)
+
+
+def downgrade():
+    op.drop_table('order_sequences')
@@ -0,0 +1,29 @@
+"""Add updated_at change watermark to orders
+
+Revision ID: add_order_updated_at
+Revises: add_hot_path_indexes
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_updated_at'
+down_revision = 'add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE orders SET updated_at = created_at")
+    op.create_index('ix_orders_updated_at', 'orders', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_orders_updated_at', table_name='orders')
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,40 @@
+"""Add order_volume_rollups table for the volume report
+
+Existing approved orders are rolled up by backfill_order_rollups.py (or
+init_db.py on a database without rollups).
+
+Revision ID: add_order_volume_rollups
+Revises: add_upload_blobs
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_volume_rollups'
+down_revision = 'add_upload_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_volume_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=8), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('order_type', sa.String(length=10), nullable=False),
+        sa.Column('thai_bank_account_id', sa.Integer(), nullable=False),
+        sa.Column('myanmar_bank_account_id', sa.Integer(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.Column('total_value', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('granularity', 'bucket_start', 'order_type', 'thai_bank_account_id',
+                            'myanmar_bank_account_id', name='uq_order_volume_rollups_bucket')
+    )
+
+
+def downgrade():
+    op.drop_table('order_volume_rollups')
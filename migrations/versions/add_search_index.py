@@ -0,0 +1,67 @@
+"""Add the full-text search index for messages and orders
+
+FTS5 virtual table on SQLite, tsvector column with a GIN index on PostgreSQL.
+
+Revision ID: add_search_index
+Revises: add_message_archive
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_index'
+down_revision = 'add_message_archive'
+branch_labels = None
+depends_on = None
+
+MESSAGE_BODY = "TRIM(COALESCE(content, '') || ' ' || COALESCE(chosen_option, ''))"
+ORDER_BODY = "TRIM(COALESCE(o.order_id, '') || ' ' || COALESCE(o.user_bank, ''))"
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            CREATE TABLE search_index (
+                id BIGINT PRIMARY KEY,
+                kind VARCHAR(16) NOT NULL,
+                ref_id INTEGER NOT NULL,
+                telegram_id VARCHAR(255),
+                body TEXT NOT NULL,
+                document TSVECTOR NOT NULL
+            )
+        """)
+        for table in ('messages', 'messages_archive'):
+            op.execute(f"""
+                INSERT INTO search_index (id, kind, ref_id, telegram_id, body, document)
+                SELECT id * 2, 'message', id, telegram_id, b, to_tsvector('simple', b)
+                FROM (SELECT id, telegram_id, {MESSAGE_BODY} AS b FROM {table}) s
+            """)
+        op.execute(f"""
+            INSERT INTO search_index (id, kind, ref_id, telegram_id, body, document)
+            SELECT o.id * 2 + 1, 'order', o.id, t.telegram_id, {ORDER_BODY}, to_tsvector('simple', {ORDER_BODY})
+            FROM orders o LEFT JOIN telegram_ids t ON t.id = o.telegram_id
+        """)
+        op.execute("CREATE INDEX ix_search_index_document ON search_index USING GIN (document)")
+    else:
+        op.execute("""
+            CREATE VIRTUAL TABLE search_index USING fts5(
+                body, kind UNINDEXED, ref_id UNINDEXED, telegram_id UNINDEXED,
+                tokenize = 'unicode61', prefix = '2 3'
+            )
+        """)
+        for table in ('messages', 'messages_archive'):
+            op.execute(f"""
+                INSERT INTO search_index (rowid, kind, ref_id, telegram_id, body)
+                SELECT id * 2, 'message', id, telegram_id, {MESSAGE_BODY} FROM {table}
+            """)
+        op.execute(f"""
+            INSERT INTO search_index (rowid, kind, ref_id, telegram_id, body)
+            SELECT o.id * 2 + 1, 'order', o.id, t.telegram_id, {ORDER_BODY}
+            FROM orders o LEFT JOIN telegram_ids t ON t.id = o.telegram_id
+        """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS search_index")
@@ -0,0 +1,34 @@
+"""Add latest_order_id pointer to telegram_ids
+
+Revision ID: add_telegram_latest_order
+Revises: add_idempotency_keys
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_telegram_latest_order'
+down_revision = 'add_idempotency_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('telegram_ids') as batch_op:
+        batch_op.add_column(sa.Column('latest_order_id', sa.Integer(), nullable=True))
+
+    # Backfill from existing orders (same rule as latest_orders.rebuild)
+    op.execute("""
+        UPDATE telegram_ids
+        SET latest_order_id = (
+            SELECT MAX(o.id) FROM orders o WHERE o.telegram_id = telegram_ids.id
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('telegram_ids') as batch_op:
+        batch_op.drop_column('latest_order_id')
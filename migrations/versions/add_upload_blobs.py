@@ -0,0 +1,34 @@
+"""Add upload_blobs table for the content-addressed upload store
+
+Existing files are moved into the store by dedupe_uploads.py.
+
+Revision ID: add_upload_blobs
+Revises: add_order_sequences
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_upload_blobs'
+down_revision = 'add_order_sequences'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upload_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256'),
+        sa.UniqueConstraint('path')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_blobs')
@@ -38,27 +38,93 @@ class Message(db.Model):
     seen_by_admin = db.Column(db.Boolean, default=False)
     buttons = db.Column(db.String(1024), nullable=True)  # Store buttons as JSON string
     telegram_id = db.Column(db.String(255), db.ForeignKey('telegram_ids.telegram_id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=now_mmt, nullable=True, index=True)  # Archival age
+
+    __table_args__ = (
+        # Conversation history and after_id/before_id keyset paging
+        db.Index('ix_messages_telegram_id_id', 'telegram_id', 'id'),
+        # Bot polling for unseen admin replies
+        db.Index('ix_messages_unseen_by_user', 'telegram_id', 'from_backend', 'seen_by_user'),
+    )
+
+
+class ArchivedMessage(db.Model):
+    """Cold storage for old chat messages moved out of ``messages``.
+
+    Rows keep their original ids, so keyset paging continues seamlessly from
+    the hot table into the archive. Only fully handled messages are archived,
+    which is why the seen flags are not stored.
+    """
+    __tablename__ = 'messages_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    content = db.Column(db.String(1024), nullable=False)
+    chosen_option = db.Column(db.String(1024), nullable=True)
+    image = db.Column(db.Text, nullable=True)
+    from_bot = db.Column(db.Boolean, default=False)
+    from_backend = db.Column(db.Boolean, default=False)
+    buttons = db.Column(db.String(1024), nullable=True)
+    telegram_id = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_messages_archive_telegram_id_id', 'telegram_id', 'id'),
+    )
+
+    # Archived messages were all seen before they were moved
+    seen_by_user = True
+    seen_by_admin = True
 
 class TelegramID(db.Model):
     __tablename__ = 'telegram_ids'
     id = db.Column(db.Integer, primary_key=True)
-    chat_id = db.Column(db.String(255))
+    chat_id = db.Column(db.String(255), index=True)  # Looked up on every bot call
     telegram_id = db.Column(db.String(255), unique=True, nullable=True)
     user = db.relationship("Message", backref="telegram", lazy=True)
     orders = db.relationship("Order", backref="telegram", lazy=True)
+    # Newest order (highest orders.id); maintained by latest_orders.py. No FK:
+    # a second path between the tables would make ``orders`` ambiguous
+    latest_order_id = db.Column(db.Integer, nullable=True)
+    latest_order = db.relationship(
+        "Order",
+        primaryjoin="foreign(TelegramID.latest_order_id) == Order.id",
+        uselist=False,
+        viewonly=True,
+    )
     created_at = db.Column(db.DateTime, default=now_mmt)
     updated_at = db.Column(db.DateTime, default=now_mmt, onupdate=now_mmt)
 
     @property
     def last_order(self):
-        return max(self.orders, key=lambda o: o.created_at) if self.orders else None
+        return self.latest_order
 
     @property
     def last_order_is_pending(self):
-        last = self.last_order
+        last = self.latest_order
         return last is not None and last.status == 'pending'
 
 
+class ConversationSummary(db.Model):
+    """Denormalized per-conversation row backing the admin chat list.
+
+    Maintained in the same transaction as message and order writes by
+    conversation_summary.py; rebuild with rebuild_conversation_summary.py.
+    """
+    __tablename__ = 'conversation_summary'
+
+    telegram_id = db.Column(db.String(255), db.ForeignKey('telegram_ids.telegram_id'), primary_key=True)
+    last_message_id = db.Column(db.Integer, nullable=True, index=True)  # Chat list sort key
+    last_message_preview = db.Column(db.String(255), nullable=True)
+    unread_by_admin = db.Column(db.Integer, nullable=False, default=0)
+    last_order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='SET NULL'), nullable=True)
+    last_order_status = db.Column(db.String(50), nullable=True)
+    updated_at = db.Column(db.DateTime, default=now_mmt, onupdate=now_mmt)
+
+    @property
+    def last_order_is_pending(self):
+        return self.last_order_status == 'pending'
+
+
 class AuthFeature(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     on = db.Column(db.Boolean, default=False)
@@ -134,15 +200,123 @@ class Order(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     thai_bank_account_id = db.Column(db.Integer, db.ForeignKey('thai_bank_accounts.id'), nullable=True)
     myanmar_bank_account_id = db.Column(db.Integer, db.ForeignKey('myanmar_bank_accounts.id'), nullable=True)
-    receipt = db.Column(db.Text, nullable=True)
-    confirm_receipt = db.Column(db.Text, nullable=True)  
+    # Comma-separated upload paths; deferred so list queries skip them
+    receipt = db.deferred(db.Column(db.Text, nullable=True), group='receipts')
+    confirm_receipt = db.deferred(db.Column(db.Text, nullable=True), group='receipts')
     user_bank = db.Column(db.String(1024), nullable=True)  # User's bank account number
     qr = db.Column(db.String(255), nullable=True)
     status = db.Column(db.String(50), default='pending')
+    updated_at = db.Column(db.DateTime, default=now_mmt, onupdate=now_mmt, index=True)  # Change watermark for pollers
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Bumped by order_status.transition
 
     thai_bank_account = db.relationship("ThaiBankAccount", backref="orders")
     myanmar_bank_account = db.relationship("MyanmarBankAccount", backref="orders")
 
+    __table_args__ = (
+        # Latest order per customer
+        db.Index('ix_orders_telegram_id_created_at', 'telegram_id', 'created_at'),
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        # Admin order queues and pending counters
+        db.Index('ix_orders_type_created_at', 'order_type', 'created_at'),
+        db.Index('ix_orders_type_status_created_at', 'order_type', 'status', 'created_at'),
+        db.Index('ix_orders_status_created_at', 'status', 'created_at'),
+        # Newest-first listings and per-day ranges
+        db.Index('ix_orders_created_at', 'created_at'),
+    )
+
+
+class UploadBlob(db.Model):
+    """One stored upload file, shared by every row that references the same bytes."""
+    __tablename__ = 'upload_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False, unique=True)  # e.g. static/uploads/blobs/ab/cd/<sha256>.jpg
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=now_mmt)
+
+
+class OrderSequence(db.Model):
+    """Last order number handed out per day (the #### in DDMMYYA####B)."""
+    __tablename__ = 'order_sequences'
+
+    day = db.Column(db.Date, primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CacheVersion(db.Model):
+    """Change counter per cached data set; admin writes bump it (see read_cache.py)."""
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'settings', 'banks'
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=now_mmt, onupdate=now_mmt)
+
+
+class OrderVolumeRollup(db.Model):
+    """Approved-order totals per hour or day, order type and bank account pair.
+
+    Maintained incrementally by order_rollups.py; a bank account id of 0
+    means the order had none, so the unique key also covers those rows.
+    """
+    __tablename__ = 'order_volume_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(8), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    order_type = db.Column(db.String(10), nullable=False)
+    thai_bank_account_id = db.Column(db.Integer, nullable=False, default=0)
+    myanmar_bank_account_id = db.Column(db.Integer, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    total_value = db.Column(db.Float, nullable=False, default=0)  # Sum of amount * price
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            'granularity', 'bucket_start', 'order_type', 'thai_bank_account_id', 'myanmar_bank_account_id',
+            name='uq_order_volume_rollups_bucket'
+        ),
+    )
+
+
+class IdempotencyKey(db.Model):
+    """A client-supplied Idempotency-Key and the response it produced (see idempotency.py)."""
+    __tablename__ = 'idempotency_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(100), nullable=False)  # Endpoint the key was used on
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # Hash of the request fields
+    status_code = db.Column(db.Integer, nullable=True)  # NULL while the first request is running
+    response_body = db.Column(db.Text, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=now_mmt)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # TTL eviction
+
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', name='uq_idempotency_keys_scope_key'),
+    )
+
+
+class BankTransaction(db.Model):
+    """One change to a bank account balance (see bank_ledger.py)."""
+    __tablename__ = 'bank_transactions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.String(50), nullable=True)  # Order code; NULL for manual adjustments
+    bank_type = db.Column(db.String(10), nullable=False)  # 'thai' or 'myanmar'
+    bank_account_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Float, nullable=False)
+    balance_after = db.Column(db.Float, nullable=False)  # Account amount right after this change
+    note = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=now_mmt)
+
+    __table_args__ = (
+        # An order moves each side's balance at most once
+        db.UniqueConstraint('order_id', 'bank_type', name='uq_bank_transactions_order_bank'),
+        db.Index('ix_bank_transactions_account', 'bank_type', 'bank_account_id', 'id'),
+    )
+
 
 class WebhookLog(db.Model):
     """Model for tracking webhook delivery attempts to the bot engine."""
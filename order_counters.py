@@ -0,0 +1,92 @@
+"""
+Order queue counters for the dashboard and the orders page.
+
+Both pages need the number of orders per type and status (plus the user
+count on the dashboard). ``load()`` fetches all of them in one grouped
+query, answered from the (order_type, status, created_at) index, instead of
+one COUNT per badge and per paginator.
+"""
+from sqlalchemy import String, literal, null, type_coerce
+from flask_sqlalchemy import Pagination
+
+from models import db, Order, User
+
+# Pseudo order type under which the user count is returned
+USERS = 'users'
+
+
+class OrderCounters:
+    """Order counts keyed by (order_type, status)."""
+
+    def __init__(self, rows):
+        self.users = 0
+        self._counts = {}
+        for order_type, status, count in rows:
+            if order_type == USERS and status is None:
+                self.users = count
+            else:
+                self._counts[(order_type, status)] = count
+
+    def count(self, order_type=None, status=None):
+        """
+        Number of orders matching a type and/or status.
+
+        Args:
+            order_type: 'buy', 'sell' or None for every type
+            status: Order status or None for every status
+        """
+        return sum(
+            count for (row_type, row_status), count in self._counts.items()
+            if (order_type is None or row_type == order_type)
+            and (status is None or row_status == status)
+        )
+
+    def pending(self, order_type):
+        """Orders of a type waiting for an admin."""
+        return self.count(order_type, 'pending')
+
+    def as_dict(self):
+        """Nested {order_type: {status: count}} mapping, e.g. for JSON."""
+        result = {}
+        for (order_type, status), count in self._counts.items():
+            result.setdefault(order_type, {})[status] = count
+        return result
+
+
+def counts_query(include_users=False):
+    """The grouped count query, optionally with the user count appended."""
+    # Read order_type as plain text so the 'users' row survives the union
+    order_type = type_coerce(Order.order_type, String)
+    query = (
+        db.session.query(order_type, Order.status, db.func.count(Order.id))
+        .group_by(Order.order_type, Order.status)
+    )
+    if include_users:
+        query = query.union_all(
+            db.session.query(literal(USERS), null(), db.func.count(User.id))
+        )
+    return query
+
+
+def load(include_users=False):
+    """
+    Fetch every order count in one round-trip.
+
+    Args:
+        include_users: Also count users (for the dashboard)
+
+    Returns:
+        OrderCounters
+    """
+    return OrderCounters(counts_query(include_users).all())
+
+
+def paginate(query, page, per_page, total):
+    """
+    Paginate a query whose total is already known from the counters.
+
+    Same result as ``query.paginate(error_out=False)`` without its COUNT query.
+    """
+    page = max(page or 1, 1)
+    items = query.limit(per_page).offset((page - 1) * per_page).all()
+    return Pagination(query, page, per_page, total, items)
@@ -0,0 +1,91 @@
+"""
+``?fields=`` projection for the order JSON endpoints.
+
+Clients name the keys they need, e.g. ``/orders/api/list?fields=order_id``
+for the admin new-order poll. Only the matching columns are selected
+(``load_only``) and serialized. ``receipt`` and ``confirm_receipt`` are
+deferred on the model, so they are read only when asked for.
+"""
+from flask import abort, jsonify, make_response, request
+from sqlalchemy.orm import load_only, joinedload
+
+from models import Order, TelegramID
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def _telegram(order):
+    if not order.telegram:
+        return None
+    return {
+        'id': order.telegram.id,
+        'chat_id': order.telegram.chat_id,
+        'telegram_id': order.telegram.telegram_id,
+    }
+
+
+# Public key -> (Order columns it reads, serializer)
+FIELDS = {
+    'id': (('id',), lambda o: o.id),
+    'order_id': (('order_id',), lambda o: o.order_id),
+    'order_type': (('order_type',), lambda o: o.order_type),
+    'amount': (('amount',), lambda o: o.amount),
+    'price': (('price',), lambda o: o.price),
+    'created_at': (('created_at',), lambda o: _iso(o.created_at)),
+    'status': (('status',), lambda o: o.status),
+    'version': (('version',), lambda o: o.version),
+    'user_id': (('user_id',), lambda o: o.user_id),
+    'thai_bank_account_id': (('thai_bank_account_id',), lambda o: o.thai_bank_account_id),
+    'myanmar_bank_account_id': (('myanmar_bank_account_id',), lambda o: o.myanmar_bank_account_id),
+    'receipt': (('receipt',), lambda o: o.receipt),
+    'confirm_receipt': (('confirm_receipt',), lambda o: o.confirm_receipt),
+    'user_bank': (('user_bank',), lambda o: o.user_bank),
+    'qr': (('qr',), lambda o: o.qr),
+    'telegram': (('telegram_id',), _telegram),
+}
+
+
+def requested(default):
+    """
+    Keys named in ``?fields=``, or ``default`` when the parameter is absent.
+
+    Aborts with a JSON 400 listing the valid keys on unknown names.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown or not names:
+        abort(make_response(jsonify({
+            'error': f"Unknown fields: {', '.join(unknown) or '(none given)'}",
+            'fields': list(FIELDS),
+        }), 400))
+    return names
+
+
+def load_options(fields, extra=()):
+    """
+    Query options loading only what ``fields`` (plus ``extra`` columns) need.
+
+    Args:
+        fields: Keys from ``requested()``
+        extra: Additional Order column names the view reads itself
+    """
+    columns = {'id', *extra}
+    for name in fields:
+        columns.update(FIELDS[name][0])
+    # load_only also undefers receipt/confirm_receipt when they are listed
+    options = [load_only(*[getattr(Order, column) for column in sorted(columns)])]
+    if 'telegram' in fields:
+        options.append(
+            joinedload(Order.telegram).load_only(TelegramID.id, TelegramID.chat_id, TelegramID.telegram_id)
+        )
+    return options
+
+
+def serialize(order, fields):
+    """Order as a dict holding exactly ``fields``."""
+    return {name: FIELDS[name][1](order) for name in fields}
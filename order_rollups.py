@@ -0,0 +1,164 @@
+"""
+Hourly and daily volume rollups of approved orders.
+
+Each approved order adds its count, amount and amount * price to one
+``order_volume_rollups`` row per granularity, keyed by the hour/day the
+order was created in, its type and its bank accounts. Status writers take
+a ``contribution`` before changing an order and pass it to
+``record_change`` afterwards, before committing, so the rollups move in the
+same transaction as the order:
+
+    before = order_rollups.contribution(order)
+    order.status = 'approved'
+    order_rollups.record_change(before, order)
+
+Reports then read a bounded number of rollup rows instead of aggregating
+the orders table.
+"""
+import logging
+from collections import namedtuple
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Order, OrderVolumeRollup
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('hour', 'day')
+
+# Only approved orders count towards volume
+COUNTED_STATUS = 'approved'
+
+Contribution = namedtuple(
+    'Contribution', 'created_at order_type thai_bank_account_id myanmar_bank_account_id amount price'
+)
+
+
+def bucket_start(moment, granularity):
+    """Start of the hour or day ``moment`` falls in, as a naive Myanmar-time datetime."""
+    moment = moment.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def contribution(order):
+    """
+    What an order currently adds to the rollups.
+
+    Returns:
+        Contribution, or None if the order is not counted
+    """
+    if order is None or order.status != COUNTED_STATUS or order.created_at is None:
+        return None
+    return Contribution(
+        order.created_at, order.order_type,
+        order.thai_bank_account_id or 0, order.myanmar_bank_account_id or 0,
+        order.amount or 0.0, order.price or 0.0,
+    )
+
+
+def _key(item, granularity):
+    return {
+        'granularity': granularity,
+        'bucket_start': bucket_start(item.created_at, granularity),
+        'order_type': item.order_type,
+        'thai_bank_account_id': item.thai_bank_account_id,
+        'myanmar_bank_account_id': item.myanmar_bank_account_id,
+    }
+
+
+def _increment(key, count, amount, value):
+    return db.session.execute(
+        update(OrderVolumeRollup)
+        .where(*[getattr(OrderVolumeRollup, column) == v for column, v in key.items()])
+        .values(
+            order_count=OrderVolumeRollup.order_count + count,
+            total_amount=OrderVolumeRollup.total_amount + amount,
+            total_value=OrderVolumeRollup.total_value + value,
+        )
+    ).rowcount
+
+
+def _apply(item, sign):
+    count, amount, value = sign, sign * item.amount, sign * item.amount * item.price
+    for granularity in GRANULARITIES:
+        key = _key(item, granularity)
+        if _increment(key, count, amount, value) or sign < 0:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(OrderVolumeRollup(
+                    **key, order_count=count, total_amount=amount, total_value=value
+                ))
+        except IntegrityError:
+            # Another request created the bucket concurrently
+            _increment(key, count, amount, value)
+
+
+def record_change(before, order):
+    """
+    Move an order's contribution after a status, amount or price change.
+
+    Args:
+        before: ``contribution(order)`` taken before the change
+        order: The changed order (None if it was deleted)
+    """
+    after = contribution(order)
+    if before == after:
+        return
+    if before:
+        _apply(before, -1)
+    if after:
+        _apply(after, 1)
+
+
+def record_delete(order):
+    """Remove a deleted order's contribution. Call before deleting it."""
+    record_change(contribution(order), None)
+
+
+def rebuild(batch_size=1000):
+    """
+    Recompute every rollup row from the orders table.
+
+    Returns:
+        Number of approved orders rolled up
+    """
+    totals = {}
+    orders = (
+        db.session.query(
+            Order.created_at, Order.order_type, Order.thai_bank_account_id,
+            Order.myanmar_bank_account_id, Order.amount, Order.price,
+        )
+        .filter(Order.status == COUNTED_STATUS, Order.created_at.isnot(None))
+        .yield_per(batch_size)
+    )
+    counted = 0
+    for row in orders:
+        item = Contribution(
+            row.created_at, row.order_type, row.thai_bank_account_id or 0,
+            row.myanmar_bank_account_id or 0, row.amount or 0.0, row.price or 0.0,
+        )
+        for granularity in GRANULARITIES:
+            key = tuple(_key(item, granularity).items())
+            count, amount, value = totals.get(key, (0, 0.0, 0.0))
+            totals[key] = (count + 1, amount + item.amount, value + item.amount * item.price)
+        counted += 1
+
+    OrderVolumeRollup.query.delete()
+    db.session.bulk_insert_mappings(OrderVolumeRollup, [
+        dict(key, order_count=count, total_amount=amount, total_value=value)
+        for key, (count, amount, value) in totals.items()
+    ])
+    db.session.commit()
+    logger.info(f"Rolled up {counted} approved orders into {len(totals)} buckets")
+    return counted
+
+
+def needs_rebuild():
+    """True when approved orders exist but no rollups have been written yet."""
+    has_orders = db.session.query(Order.id).filter(Order.status == COUNTED_STATUS).first() is not None
+    has_rollups = db.session.query(OrderVolumeRollup.id).first() is not None
+    return has_orders and not has_rollups
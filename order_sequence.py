@@ -0,0 +1,63 @@
+"""
+Per-day order number sequence backing ``generate_order_id``.
+
+``next_value(day)`` increments the day's row in ``order_sequences`` and
+returns the new value in constant time, whatever the day's order volume:
+
+- PostgreSQL and SQLite 3.35+: one ``INSERT ... ON CONFLICT DO UPDATE ...
+  RETURNING`` statement.
+- Anything else: ``SELECT ... FOR UPDATE`` on the day's row, then UPDATE.
+
+The increment runs in its own short transaction on a separate connection,
+so the sequence row is never locked for the rest of the order request.
+A number whose order is later rolled back is simply skipped.
+"""
+import sqlite3
+
+from sqlalchemy import text, bindparam, select, insert, update, Date
+from sqlalchemy.exc import IntegrityError
+
+from models import db, OrderSequence
+
+_UPSERT = text("""
+    INSERT INTO order_sequences (day, last_value) VALUES (:day, 1)
+    ON CONFLICT (day) DO UPDATE SET last_value = order_sequences.last_value + 1
+    RETURNING last_value
+""").bindparams(bindparam('day', type_=Date))
+
+
+def _supports_upsert_returning(dialect):
+    if dialect.name == 'postgresql':
+        return True
+    return dialect.name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35)
+
+
+def _next_locked(conn, day):
+    table = OrderSequence.__table__
+    for _ in range(2):
+        current = conn.execute(
+            select(table.c.last_value).where(table.c.day == day).with_for_update()
+        ).scalar()
+        if current is not None:
+            conn.execute(update(table).where(table.c.day == day).values(last_value=current + 1))
+            return current + 1
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(table).values(day=day, last_value=1))
+            return 1
+        except IntegrityError:
+            continue  # Another request created the row first; lock it instead
+    raise RuntimeError(f"Could not allocate an order number for {day}")
+
+
+def next_value(day):
+    """
+    Allocate the next order number for ``day`` (a date).
+
+    Returns:
+        int: 1 for the day's first order, then 2, 3, ...
+    """
+    with db.engine.begin() as conn:
+        if _supports_upsert_returning(conn.dialect):
+            return conn.execute(_UPSERT, {'day': day}).scalar()
+        return _next_locked(conn, day)
@@ -0,0 +1,112 @@
+"""
+Order status state machine with optimistic concurrency.
+
+Every status change goes through ``transition()``, which only allows the
+moves declared in TRANSITIONS and writes them with a compare-and-swap on
+``orders.version``:
+
+    UPDATE orders SET status = :new, version = version + 1
+    WHERE id = :id AND version = :expected
+
+If another writer changed the order since it was read, no row matches and
+``StatusConflict`` is raised; routes turn it into a 409. Rollups and the
+conversation summary are updated in the same transaction, so callers only
+commit.
+"""
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, now_mmt, Order
+import conversation_summary
+import order_rollups
+
+STATUSES = ('pending', 'verified', 'approved', 'declined', 'complain')
+
+# Allowed moves: status -> statuses it may change to
+TRANSITIONS = {
+    'pending': {'verified', 'declined', 'complain'},
+    'verified': {'approved', 'declined', 'complain'},
+    'complain': {'pending', 'verified', 'approved', 'declined'},
+    'approved': {'complain'},
+    'declined': {'pending', 'complain'},
+}
+
+
+class StatusConflict(Exception):
+    """The order changed under the caller, or the move is not allowed."""
+
+    def __init__(self, order, new_status, reason):
+        super().__init__(reason)
+        self.order = order
+        self.new_status = new_status
+        self.reason = reason
+
+    def to_dict(self):
+        return {
+            'error': self.reason,
+            'order_id': self.order.order_id,
+            'status': self.order.status,
+            'version': self.order.version,
+            'requested_status': self.new_status,
+            'allowed': sorted(next_statuses(self.order.status)),
+        }
+
+
+def next_statuses(status):
+    """Statuses an order in ``status`` may move to."""
+    return TRANSITIONS.get(status, set())
+
+
+def can_transition(old_status, new_status):
+    return new_status in next_statuses(old_status)
+
+
+def transition(order, new_status, expected_version=None):
+    """
+    Move an order to ``new_status`` if nobody changed it in the meantime.
+
+    Setting the current status again is a no-op. Must be called before the
+    commit, and before anything else in the request writes to the order.
+
+    Args:
+        order: Order loaded in this session
+        new_status: Target status
+        expected_version: Version the client saw (e.g. from a form); defaults
+            to the version loaded with ``order``
+
+    Returns:
+        True if the status changed, False for a no-op
+
+    Raises:
+        StatusConflict: The version no longer matches, or the move is not
+            in TRANSITIONS
+    """
+    if expected_version is None:
+        expected_version = order.version
+    if expected_version != order.version:
+        raise StatusConflict(order, new_status, 'Order was changed by someone else; reload and try again')
+    if new_status == order.status:
+        return False
+    if not can_transition(order.status, new_status):
+        raise StatusConflict(order, new_status, f"Cannot change order status from {order.status} to {new_status}")
+
+    before = order_rollups.contribution(order)
+    swapped = db.session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.version == expected_version)
+        .values(status=new_status, version=Order.version + 1, updated_at=now_mmt())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not swapped:
+        # Someone else won the race: show the caller the current state
+        db.session.refresh(order)
+        raise StatusConflict(order, new_status, 'Order was changed by someone else; reload and try again')
+
+    # Mirror the row without marking the attributes dirty
+    set_committed_value(order, 'status', new_status)
+    set_committed_value(order, 'version', expected_version + 1)
+    db.session.expire(order, ['updated_at'])
+
+    order_rollups.record_change(before, order)
+    conversation_summary.record_order(order)
+    return True
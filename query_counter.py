@@ -0,0 +1,58 @@
+"""
+Per-request SQL statement counter.
+
+Every statement executed while a request is being handled increments a
+counter on ``flask.g``. With QUERY_COUNT_HEADER on, responses carry it as
+``X-Query-Count`` so tests (and the browser's network tab) can assert that a
+page costs a constant number of queries; requests above
+QUERY_COUNT_WARN_THRESHOLD are logged either way.
+
+Statements run outside a request (background workers, scripts) are not
+counted. Streaming responses only report the queries made before the first
+chunk.
+"""
+import logging
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from settings import QUERY_COUNT_HEADER, QUERY_COUNT_WARN_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Query-Count'
+
+_listening = False
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g._query_count = g.get('_query_count', 0) + 1
+
+
+def count():
+    """Statements executed so far in the current request (0 outside one)."""
+    if not has_request_context():
+        return 0
+    return g.get('_query_count', 0)
+
+
+def init_app(app):
+    """Start counting and register the response hook on ``app``."""
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _on_execute)
+        _listening = True
+    app.config.setdefault('QUERY_COUNT_HEADER', QUERY_COUNT_HEADER)
+    app.config.setdefault('QUERY_COUNT_WARN_THRESHOLD', QUERY_COUNT_WARN_THRESHOLD)
+
+    @app.after_request
+    def report_query_count(response):
+        queries = count()
+        threshold = app.config['QUERY_COUNT_WARN_THRESHOLD']
+        if threshold and queries > threshold:
+            logger.warning(f"{request.method} {request.path} ran {queries} SQL queries")
+        if app.config['QUERY_COUNT_HEADER']:
+            response.headers[HEADER] = str(queries)
+        return response
@@ -0,0 +1,218 @@
+"""
+In-process cache for data the bot reads on every step.
+
+Settings, exchange rates and the bank catalogs change a few times a day but
+are read on nearly every bot call. ``get(namespace, key, loader)`` keeps
+loader results per worker process. Each namespace has a row in
+``cache_versions``; write paths call ``bump(namespace)`` before committing,
+and a worker that sees a newer version than its entries were loaded with
+drops the whole namespace. Workers re-read the version at most every
+READ_CACHE_CHECK_SECONDS, so other workers notice a change within one
+check. READ_CACHE_TTL_SECONDS bounds an entry's age regardless.
+
+Loaders must return plain data (dicts, lists, numbers), never ORM objects:
+entries outlive the session that loaded them.
+"""
+import threading
+import time
+
+from sqlalchemy import event, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import (
+    db, now_mmt, CacheVersion, MaintenanceMode, AuthFeature, ExchangeRate,
+    ThaiBankAccount, MyanmarBankAccount,
+)
+from settings import READ_CACHE_TTL_SECONDS, READ_CACHE_CHECK_SECONDS
+
+SETTINGS = 'settings'  # Maintenance/auth flags and exchange rates
+BANKS = 'banks'  # Bank accounts, including balances
+
+# session.info key: namespaces bumped in the session's open transaction
+_BUMPED = 'read_cache_bumped'
+
+
+class ReadCache:
+    """Per-process entries, grouped by namespace and tagged with its version."""
+
+    def __init__(self, ttl=READ_CACHE_TTL_SECONDS, check_interval=READ_CACHE_CHECK_SECONDS):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = {}  # namespace -> {key: (value, expires_at)}
+        self._versions = {}  # namespace -> version the entries belong to
+        self._checked_at = {}  # namespace -> monotonic time of the last version read
+        self._stats = {}  # namespace -> counters
+
+    def _counters(self, namespace):
+        return self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'version_checks': 0, 'invalidations': 0})
+
+    def _current_version(self, namespace):
+        """Stored version, re-read from the database at most every check_interval."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at.get(namespace, float('-inf')) < self.check_interval:
+                return self._versions.get(namespace)
+        version = db.session.query(CacheVersion.version).filter_by(name=namespace).scalar() or 0
+        with self._lock:
+            self._checked_at[namespace] = now
+            self._counters(namespace)['version_checks'] += 1
+            if self._versions.get(namespace) != version:
+                if self._entries.pop(namespace, None):
+                    self._counters(namespace)['invalidations'] += 1
+                self._versions[namespace] = version
+        return version
+
+    def get(self, namespace, key, loader):
+        """
+        Cached ``loader()`` result for ``key`` in ``namespace``.
+
+        Args:
+            namespace: Data set the entry belongs to (SETTINGS, BANKS)
+            key: Entry name within the namespace
+            loader: Called without arguments on a miss
+        """
+        self._current_version(namespace)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(namespace, {}).get(key)
+            if entry and entry[1] > now:
+                self._counters(namespace)['hits'] += 1
+                return entry[0]
+            self._counters(namespace)['misses'] += 1
+        value = loader()
+        with self._lock:
+            self._entries.setdefault(namespace, {})[key] = (value, now + self.ttl)
+        return value
+
+    def forget(self, namespace):
+        """Drop this worker's entries for a namespace and re-check its version next time."""
+        with self._lock:
+            if self._entries.pop(namespace, None):
+                self._counters(namespace)['invalidations'] += 1
+            self._checked_at.pop(namespace, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                namespace: {
+                    **counters,
+                    'version': self._versions.get(namespace),
+                    'entries': len(self._entries.get(namespace, {})),
+                }
+                for namespace, counters in self._stats.items()
+            }
+
+
+_cache = ReadCache()
+
+
+def get_read_cache():
+    return _cache
+
+
+def get(namespace, key, loader):
+    """Shortcut for ``get_read_cache().get(...)``."""
+    return _cache.get(namespace, key, loader)
+
+
+def bump(namespace):
+    """
+    Mark a namespace as changed for every worker.
+
+    Call once per transaction, after the rows it covers are written and
+    right before the commit: the version row is locked until then and is
+    shared by every writer of the namespace. Once the commit succeeds this
+    worker re-checks the version on its next read; others within
+    READ_CACHE_CHECK_SECONDS.
+    """
+    table = CacheVersion.__table__
+    changed = db.session.execute(
+        update(table).where(table.c.name == namespace).values(version=table.c.version + 1, updated_at=now_mmt())
+    ).rowcount
+    if not changed:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(name=namespace, version=1, updated_at=now_mmt()))
+        except IntegrityError:
+            # Created concurrently; count our change on top of it
+            db.session.execute(
+                update(table).where(table.c.name == namespace).values(version=table.c.version + 1)
+            )
+    # Forgetting now would let another thread reload the pre-write rows
+    # before the commit; see _forget_committed
+    db.session.info.setdefault(_BUMPED, set()).add(namespace)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_committed(session):
+    """
+    Drop this worker's entries for namespaces the committed transaction bumped.
+
+    A bump that was rolled back stays listed until the session's next
+    commit, which then costs one needless reload.
+    """
+    for namespace in session.info.pop(_BUMPED, ()):
+        _cache.forget(namespace)
+
+
+def forget(namespace):
+    """Drop this worker's entries for ``namespace``."""
+    _cache.forget(namespace)
+
+
+def stats():
+    """Hit/miss/invalidation counters of this worker, per namespace."""
+    return _cache.stats()
+
+
+# --- Cached reads shared by the bot API endpoints ---
+
+def _load_settings():
+    maintenance = MaintenanceMode.query.first()
+    auth_feature = AuthFeature.query.first()
+    exchange_rate = ExchangeRate.query.order_by(ExchangeRate.updated_at.desc()).first()
+    return {
+        'maintenance_mode': maintenance.on if maintenance else False,
+        'auth_feature': auth_feature.on if auth_feature else False,
+        'buy': exchange_rate.buy if exchange_rate else None,
+        'sell': exchange_rate.sell if exchange_rate else None,
+    }
+
+
+def settings():
+    """Maintenance/auth flags and the current buy/sell rates."""
+    return get(SETTINGS, 'settings', _load_settings)
+
+
+def _bank_dict(bank):
+    return {
+        "id": bank.id,
+        "bank_name": bank.bank_name,
+        "account_number": bank.account_number,
+        "account_name": bank.account_name,
+        "qr_image": bank.qr_image,
+        "amount": bank.amount or 0.0,
+        "display_name": bank.display_name,
+        "on": bank.on
+    }
+
+
+def active_banks(bank_type):
+    """Switched-on accounts of one side ('thai' or 'myanmar')."""
+    model = {'thai': ThaiBankAccount, 'myanmar': MyanmarBankAccount}[bank_type]
+    return get(BANKS, f'active:{bank_type}', lambda: [_bank_dict(bank) for bank in model.query.filter_by(on=True).all()])
+
+
+def _load_balances():
+    balances = {}
+    for model in (ThaiBankAccount, MyanmarBankAccount):
+        for bank_name, amount in db.session.query(model.bank_name, model.amount):
+            balances[bank_name] = amount or 0.0
+    return balances
+
+
+def balances():
+    """Bank name -> current balance, over all accounts."""
+    return get(BANKS, 'balances', _load_balances)
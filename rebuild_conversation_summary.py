@@ -0,0 +1,24 @@
+"""
+Script to rebuild the conversation_summary table.
+
+Recomputes the last message, unread count and last order of every
+conversation from the messages and orders tables. Safe to run at any time;
+use it after bulk imports or manual database edits.
+
+Usage:
+    python rebuild_conversation_summary.py
+"""
+from app import app
+import conversation_summary
+
+
+def run_rebuild():
+    """Rebuild all conversation summary rows."""
+    with app.app_context():
+        print("Rebuilding conversation summaries...")
+        count = conversation_summary.rebuild()
+        print(f"✓ Rebuilt {count} conversation summaries")
+
+
+if __name__ == '__main__':
+    run_rebuild()
@@ -0,0 +1,24 @@
+"""
+Script to rebuild the full-text search index.
+
+Re-indexes every chat message (including archived ones) and every order's
+order id and user bank. Creates the search table first if it is missing.
+Use it after bulk imports or manual database edits.
+
+Usage:
+    python rebuild_search_index.py
+"""
+from app import app
+import search
+
+
+def run_rebuild():
+    """Rebuild all search documents."""
+    with app.app_context():
+        print("Rebuilding search index...")
+        count = search.rebuild()
+        print(f"✓ Indexed {count} documents")
+
+
+if __name__ == '__main__':
+    run_rebuild()
@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
-from models import db, ThaiBankAccount, MyanmarBankAccount
+from models import db
+import bank_ledger
+import read_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,41 +10,11 @@ banks_api = Blueprint('banks_api', __name__, url_prefix='/api/banks')
 
 @banks_api.route('/thai', methods=['GET'])
 def get_thai_banks():
-    banks = ThaiBankAccount.query.filter_by(on=True).all()
-    result = [
-        {
-            "id": bank.id,
-            "bank_name": bank.bank_name,
-            "account_number": bank.account_number,
-            "account_name": bank.account_name,
-            "qr_image": bank.qr_image,
-            "amount": bank.amount or 0.0,
-            "display_name": bank.display_name,
-            "on": bank.on
-            # "user_id": bank.user_id
-        }
-        for bank in banks
-    ]
-    return jsonify(result), 200
+    return jsonify(read_cache.active_banks('thai')), 200
 
 @banks_api.route('/myanmar', methods=['GET'])
 def get_myanmar_banks():
-    banks = MyanmarBankAccount.query.filter_by(on=True).all()
-    result = [
-        {
-            "id": bank.id,
-            "bank_name": bank.bank_name,
-            "account_number": bank.account_number,
-            "account_name": bank.account_name,
-            "qr_image": bank.qr_image,
-            "amount": bank.amount or 0.0,
-            "display_name": bank.display_name,
-            "on": bank.on
-            # "user_id": bank.user_id
-        }
-        for bank in banks
-    ]
-    return jsonify(result), 200
+    return jsonify(read_cache.active_banks('myanmar')), 200
 
 @banks_api.route('/balances', methods=['GET'])
 def get_bank_balances():
@@ -52,19 +24,7 @@ def get_bank_balances():
     Returns:
         Dict mapping bank names to current balances
     """
-    balances = {}
-    
-    # Get all Thai banks
-    thai_banks = ThaiBankAccount.query.all()
-    for bank in thai_banks:
-        balances[bank.bank_name] = bank.amount or 0.0
-    
-    # Get all Myanmar banks
-    myanmar_banks = MyanmarBankAccount.query.all()
-    for bank in myanmar_banks:
-        balances[bank.bank_name] = bank.amount or 0.0
-    
-    return jsonify(balances), 200
+    return jsonify(read_cache.balances()), 200
 
 @banks_api.route('/update-balance', methods=['POST'])
 def update_bank_balance():
@@ -81,6 +41,10 @@ def update_bank_balance():
         "myanmar_amount_change": -125000.0
     }
     
+    Each side is applied as an atomic increment and recorded in
+    bank_transactions. Repeating a request for the same order_id does not
+    change a balance twice; the original entries are returned instead.
+    
     Returns:
         Success message with updated balances
     """
@@ -104,46 +68,49 @@ def update_bank_balance():
         )
         
         updated_banks = []
+        replayed = False
+        changed = False
         
-        # Update Thai bank balance
-        if thai_bank_id and thai_amount_change != 0:
-            thai_bank = ThaiBankAccount.query.get(thai_bank_id)
-            if thai_bank:
-                old_balance = thai_bank.amount or 0.0
-                thai_bank.amount = old_balance + thai_amount_change
-                updated_banks.append({
-                    "bank_name": thai_bank.bank_name,
-                    "old_balance": old_balance,
-                    "change": thai_amount_change,
-                    "new_balance": thai_bank.amount
-                })
-                logger.info(
-                    f"Thai bank {thai_bank.bank_name}: "
-                    f"{old_balance:.2f} + {thai_amount_change:+.2f} = {thai_bank.amount:.2f}"
+        # Atomic increments, recorded once per order and side in bank_transactions
+        sides = [
+            ('thai', thai_bank_id, thai_amount_change),
+            ('myanmar', myanmar_bank_id, myanmar_amount_change),
+        ]
+        for bank_type, bank_id, amount_change in sides:
+            if not bank_id or amount_change == 0:
+                continue
+            label = bank_type.capitalize()
+            try:
+                entry, created = bank_ledger.apply(
+                    bank_type, int(bank_id), float(amount_change), order_id=order_id,
+                    note=f"{order_type} order" if order_type else None
                 )
-            else:
-                logger.warning(f"Thai bank ID {thai_bank_id} not found")
+            except bank_ledger.BankNotFound:
+                logger.warning(f"{label} bank ID {bank_id} not found")
+                continue
+            changed = changed or created
+            if not created:
+                replayed = True
+                logger.info(f"{label} bank already updated for order {order_id}, skipping")
+            bank = bank_ledger.BANK_MODELS[bank_type].query.get(entry.bank_account_id)
+            old_balance = entry.balance_after - entry.delta
+            updated_banks.append({
+                "bank_name": bank.bank_name if bank else None,
+                "old_balance": old_balance,
+                "change": entry.delta,
+                "new_balance": entry.balance_after,
+                "transaction_id": entry.id,
+                "replayed": not created
+            })
+            logger.info(
+                f"{label} bank {bank.bank_name if bank else bank_id}: "
+                f"{old_balance:.2f} + {entry.delta:+.2f} = {entry.balance_after:.2f}"
+            )
         
-        # Update Myanmar bank balance
-        if myanmar_bank_id and myanmar_amount_change != 0:
-            myanmar_bank = MyanmarBankAccount.query.get(myanmar_bank_id)
-            if myanmar_bank:
-                old_balance = myanmar_bank.amount or 0.0
-                myanmar_bank.amount = old_balance + myanmar_amount_change
-                updated_banks.append({
-                    "bank_name": myanmar_bank.bank_name,
-                    "old_balance": old_balance,
-                    "change": myanmar_amount_change,
-                    "new_balance": myanmar_bank.amount
-                })
-                logger.info(
-                    f"Myanmar bank {myanmar_bank.bank_name}: "
-                    f"{old_balance:.2f} + {myanmar_amount_change:+.2f} = {myanmar_bank.amount:.2f}"
-                )
-            else:
-                logger.warning(f"Myanmar bank ID {myanmar_bank_id} not found")
-        
-        # Commit changes
+        # Last write before the commit: the cache_versions row lock is held
+        # briefly and always taken after the bank rows
+        if changed:
+            read_cache.bump(read_cache.BANKS)
         db.session.commit()
         
         logger.info(f"✅ Bank balances updated successfully for order {order_id}")
@@ -152,10 +119,32 @@ def update_bank_balance():
             "message": "Bank balances updated successfully",
             "order_id": order_id,
             "order_type": order_type,
-            "updated_banks": updated_banks
+            "updated_banks": updated_banks,
+            "replayed": replayed
         }), 200
     
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error updating bank balances: {e}", exc_info=True)
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@banks_api.route('/<string:bank_type>/<int:bank_id>/transactions', methods=['GET'])
+def get_bank_transactions(bank_type, bank_id):
+    """
+    Newest ledger entries of a bank account (``?limit=``, default 50, max 500).
+    """
+    if bank_type not in bank_ledger.BANK_MODELS:
+        return jsonify({"error": "bank_type must be thai or myanmar"}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    entries = bank_ledger.history(bank_type, bank_id, limit)
+    return jsonify([
+        {
+            "id": entry.id,
+            "order_id": entry.order_id,
+            "delta": entry.delta,
+            "balance_after": entry.balance_after,
+            "note": entry.note,
+            "created_at": entry.created_at.isoformat() if entry.created_at else None
+        }
+        for entry in entries
+    ]), 200
@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify, request
+from routes.api.orders import ORDER_FIELDS
+import latest_orders
+import order_fields
+import read_cache
+
+bot_bp = Blueprint('bot_bp', __name__, url_prefix='/api/bot')
+
+@bot_bp.route('/context', methods=['GET'])
+def get_conversation_context():
+    """
+    Everything the bot needs for one conversation step, in one call.
+
+    Combines /api/settings/, /api/banks/thai, /api/banks/myanmar and
+    /api/orders/latest-pending. Settings and banks come from the read cache;
+    the pending order costs one query. ``?fields=`` selects order keys as
+    on the order endpoints.
+
+    Returns:
+        {
+            "settings": {"maintenance_mode", "auth_feature", "buy", "sell"},
+            "banks": {"thai": [...], "myanmar": [...]},
+            "known_chat": true,
+            "has_pending": false,
+            "order": null
+        }
+    """
+    chat_id = request.args.get('chat_id')
+    if not chat_id:
+        return jsonify({'error': 'chat_id is required'}), 400
+
+    fields = order_fields.requested(ORDER_FIELDS)
+    known_chat, pending_order = latest_orders.pending_by_chat_id(chat_id, order_fields.load_options(fields))
+
+    return jsonify({
+        'settings': read_cache.settings(),
+        'banks': {
+            'thai': read_cache.active_banks('thai'),
+            'myanmar': read_cache.active_banks('myanmar'),
+        },
+        'known_chat': known_chat,
+        'has_pending': pending_order is not None,
+        'order': order_fields.serialize(pending_order, fields) if pending_order else None,
+    })
@@ -1,14 +1,115 @@
 from flask import Blueprint, request, jsonify
 from models import db, Message, TelegramID, User, Order
 from routes.api.auth import TOKEN_STORE
-import os
-import uuid
-from werkzeug.utils import secure_filename
+import json
 from bot_webhook_client import get_webhook_client
+from chat_events import get_chat_event_broker, publish as publish_chat_event
+import conversation_summary
+from idempotency import idempotent
+import latest_orders
+import search
+import thumbnails
+import upload_store
+import message_claims
+import order_status
+from order_status import StatusConflict
+from settings import CHAT_STREAM_POLL_SECONDS, MESSAGE_CLAIM_MAX_WAIT_SECONDS
+import time
 
 message_bp = Blueprint('message_bp', __name__, url_prefix='/api/message')
 
+# Upper bound on messages accepted by one /submit-batch request
+MAX_BATCH_SIZE = 200
+
+
+def _as_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or 'false').lower() == 'true'
+
+
+def _save_images(files):
+    """Store uploaded images (deduplicated), queue their thumbnails and return their paths."""
+    paths = [upload_store.store(file).path for file in files]
+    thumbnails.enqueue(paths)
+    return paths
+
+
+def _latest_order(telegram_obj):
+    return latest_orders.get(telegram_obj)
+
+
+def _add_message(telegram_obj, content, chosen_option, image_urls, from_bot, from_backend, buttons,
+                 latest_order=None):
+    """
+    Stage one message plus its summary/search bookkeeping (no commit).
+
+    ``latest_order`` is a callable returning the conversation's latest order;
+    it is only called for a "confirmed" receipt message, which approves that
+    order.
+
+    Raises:
+        StatusConflict: The order cannot be approved; nothing is staged
+            for this message
+    """
+    image_url_str = ",".join(image_urls) if image_urls else None
+    order = None
+    if (from_bot or from_backend) and image_url_str and content and content.strip() == 'confirmed':
+        order = latest_order() if latest_order else _latest_order(telegram_obj)
+        if order:
+            # Before anything else is staged, so a conflict leaves no trace
+            order_status.transition(order, 'approved')
+
+    message = Message(
+        content=content,
+        chosen_option=chosen_option,
+        image=image_url_str,
+        telegram_id=telegram_obj.telegram_id,
+        from_bot=from_bot,
+        from_backend=from_backend,
+        buttons=buttons if buttons else None,
+        seen_by_admin=False
+    )
+    db.session.add(message)
+    conversation_summary.record_message(message)
+    search.index_message(message)
+
+    # The approved order shares the receipt message's stored images
+    if order:
+        upload_store.release(order.confirm_receipt)
+        upload_store.retain(image_url_str)
+        order.confirm_receipt = ",".join(['/' + url for url in image_url_str.split(',')])
+        db.session.add(order)
+    return message
+
+
+def _reject(conflict, uploads, **extra):
+    """Roll back, give back the request's stored images and answer 409."""
+    body = {**conflict.to_dict(), **extra}
+    db.session.rollback()
+    upload_store.discard(uploads)
+    return jsonify(body), 409
+
+
+def _notify_admin_replied(telegram_obj, chat_id, message, latest_order):
+    """Send the admin-reply webhook; never fails the request."""
+    try:
+        if latest_order:
+            webhook_client = get_webhook_client()
+            webhook_client.notify_admin_replied(
+                order_id=latest_order.order_id,
+                telegram_id=telegram_obj.telegram_id,
+                chat_id=int(chat_id),
+                message_content=message.content,
+                message_id=message.id
+            )
+    except Exception as e:
+        # Log error but don't fail the message submission
+        print(f"Error sending admin reply webhook notification: {e}")
+
+
 @message_bp.route('/submit', methods=['POST'])
+@idempotent
 def submit_message():
     telegram_id = request.form.get('telegram_id')
     chat_id = request.form.get('chat_id')
@@ -17,21 +118,15 @@ def submit_message():
     from_bot = request.form.get('from_bot', 'false').lower() == 'true'
     from_backend = request.form.get('from_backend', 'false').lower() == 'true'
     buttons = request.form.get('buttons', None)
-    image_urls = []
+
+    if not telegram_id:
+        return jsonify({"error": "telegram_id is required"}), 400
 
     # Handle multiple image file uploads
     # Handle all uploaded files, regardless of field name
+    image_urls = []
     for file_key in request.files:
-        files = request.files.getlist(file_key)
-        for file in files:
-            filename = secure_filename(file.filename)
-            image_path = os.path.join('static/uploads/images', str(uuid.uuid4()) + '_' + filename)
-            os.makedirs(os.path.dirname(image_path), exist_ok=True)
-            file.save(image_path)
-            image_urls.append(image_path)
-
-    if not telegram_id:
-        return jsonify({"error": "telegram_id is required"}), 400
+        image_urls += _save_images(request.files.getlist(file_key))
 
     # Ensure TelegramID exists or create it
     telegram_obj = TelegramID.query.filter_by(chat_id=chat_id).first()
@@ -41,54 +136,117 @@ def submit_message():
         db.session.commit()
 
     # Create the message
-    image_url_str = ",".join(image_urls) if image_urls else None
-    message = Message(
-        content=content,
-        chosen_option=chosen_option,
-        image=image_url_str,
-        telegram_id=telegram_obj.telegram_id,
-        from_bot=from_bot,
-        from_backend=from_backend,
-        buttons=buttons if buttons else None,
-        seen_by_admin=False
-    )
-    db.session.add(message)
-
-    # If the message is from bot or backend and has images, update pending order's confirm_receipt
-    if (from_bot or from_backend) and image_url_str:
-        latest_order = Order.query.filter_by(
-            telegram_id=telegram_obj.id,
-        ).order_by(Order.created_at.desc()).first()
-        if latest_order and content and content.strip() == 'confirmed':
-            latest_order.confirm_receipt = ",".join(['/' + url for url in image_url_str.split(',')])
-            latest_order.status = 'approved'
-            db.session.add(latest_order)
+    try:
+        message = _add_message(telegram_obj, content, chosen_option, image_urls, from_bot, from_backend, buttons)
+    except StatusConflict as e:
+        return _reject(e, image_urls)
 
     db.session.commit()
+    publish_chat_event(telegram_obj.telegram_id)
     
     # Send webhook notification if message is from backend (admin reply)
     if from_backend:
-        try:
-            latest_order = Order.query.filter_by(
-                telegram_id=telegram_obj.id,
-            ).order_by(Order.created_at.desc()).first()
-            
-            if latest_order:
-                webhook_client = get_webhook_client()
-                webhook_client.notify_admin_replied(
-                    order_id=latest_order.order_id,
-                    telegram_id=telegram_obj.telegram_id,
-                    chat_id=int(chat_id),
-                    message_content=content,
-                    message_id=message.id
-                )
-        except Exception as e:
-            # Log error but don't fail the message submission
-            print(f"Error sending admin reply webhook notification: {e}")
+        _notify_admin_replied(telegram_obj, chat_id, message, _latest_order(telegram_obj))
 
     return jsonify({"message": "Message submitted successfully"}), 201
 
 
+@message_bp.route('/submit-batch', methods=['POST'])
+@idempotent
+def submit_message_batch():
+    """
+    Submit many messages, for one or more chats, in one transaction.
+
+    Accepts either a JSON body ``{"messages": [...]}`` or a multipart form
+    whose ``messages`` field holds that JSON list. Each item takes the same
+    fields as /submit (telegram_id, chat_id, content, chosen_option,
+    from_bot, from_backend, buttons). Attachments for item ``i`` are sent as
+    multipart files under the field name ``images_<i>``.
+
+    Each chat's TelegramID is looked up once for the whole batch.
+
+    Returns:
+        201 with ``ids``, the new message ids in request order
+    """
+    if request.is_json:
+        items = (request.get_json(silent=True) or {}).get('messages')
+    else:
+        try:
+            items = json.loads(request.form.get('messages', ''))
+        except ValueError:
+            items = None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "messages must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} messages per batch"}), 400
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('telegram_id') or not item.get('chat_id'):
+            return jsonify({"error": f"messages[{index}]: telegram_id and chat_id are required"}), 400
+
+    # Store attachments before writing anything else (see upload_store.store)
+    uploads = [_save_images(request.files.getlist(f'images_{index}')) for index in range(len(items))]
+
+    # One lookup for every chat in the batch, creating the missing ones
+    chat_ids = {str(item['chat_id']) for item in items}
+    telegrams = {
+        t.chat_id: t for t in TelegramID.query.filter(TelegramID.chat_id.in_(chat_ids)).all()
+    }
+    for item in items:
+        chat_id = str(item['chat_id'])
+        if chat_id not in telegrams:
+            telegrams[chat_id] = TelegramID(chat_id=chat_id, telegram_id=str(item['telegram_id']))
+            db.session.add(telegrams[chat_id])
+
+    # Newest order of every chat in the batch, fetched in one query on first use
+    latest_by_telegram = None
+
+    def latest_order_for(telegram_obj):
+        nonlocal latest_by_telegram
+        if latest_by_telegram is None:
+            latest_by_telegram = latest_orders.for_telegrams(telegrams.values())
+        return latest_by_telegram.get(telegram_obj.id)
+
+    messages = []
+    try:
+        for index, item in enumerate(items):
+            telegram_obj = telegrams[str(item['chat_id'])]
+            messages.append(_add_message(
+                telegram_obj,
+                item.get('content'),
+                item.get('chosen_option'),
+                uploads[index],
+                _as_bool(item.get('from_bot')),
+                _as_bool(item.get('from_backend')),
+                item.get('buttons'),
+                latest_order=lambda t=telegram_obj: latest_order_for(t)
+            ))
+        # Read ids before the commit expires every object
+        ids = [m.id for m in messages]
+        telegram_ids = {m.telegram_id for m in messages}
+        db.session.commit()
+    except StatusConflict as e:
+        # All or nothing: one unapprovable receipt rejects the batch
+        return _reject(e, [path for paths in uploads for path in paths], index=len(messages))
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error submitting message batch: {e}")
+        return jsonify({"error": "Failed to submit messages"}), 500
+
+    for telegram_id in telegram_ids:
+        publish_chat_event(telegram_id)
+
+    # Admin replies still notify the bot one by one, after the commit
+    for item, message in zip(items, messages):
+        if _as_bool(item.get('from_backend')):
+            telegram_obj = telegrams[str(item['chat_id'])]
+            _notify_admin_replied(telegram_obj, item['chat_id'], message, latest_order_for(telegram_obj))
+
+    return jsonify({
+        "message": "Messages submitted successfully",
+        "ids": ids
+    }), 201
+
+
 @message_bp.route('/poll', methods=['GET'])
 def poll_unseen_from_backend_messages():
     """
@@ -103,6 +261,8 @@ def poll_unseen_from_backend_messages():
     - Deprecation Date: TBD based on migration completion
     
     New bots should use webhook notifications via /api/webhook/notify-bot endpoint.
+    Bots that still poll should use /api/message/claim, which never returns
+    a message twice.
     """
     import logging
     logger = logging.getLogger(__name__)
@@ -150,4 +310,48 @@ def poll_unseen_from_backend_messages():
         "messages": messages_list,
         "_deprecated": True,
         "_deprecation_message": "This endpoint is deprecated. Please migrate to webhook-based notifications."
-    }), 200
\ No newline at end of file
+    }), 200
+
+@message_bp.route('/claim', methods=['POST'])
+def claim_unseen_from_backend_messages():
+    """
+    Claim admin replies that the bot has not delivered yet.
+
+    Replacement for /poll while polling is still in use: messages are marked
+    seen and returned by one atomic statement, so concurrent polls never get
+    the same message twice. Parameters (query string or form):
+
+    - chat_id: Conversation to claim for (required)
+    - limit: Maximum messages returned (default 100)
+    - timeout: Seconds to wait for a reply when none is pending (default 0,
+      capped at MESSAGE_CLAIM_MAX_WAIT_SECONDS)
+    """
+    chat_id = request.values.get('chat_id')
+    if not chat_id:
+        return jsonify({"error": "chat_id is required"}), 400
+    limit = max(1, min(request.values.get('limit', 100, type=int), 500))
+    timeout = max(0.0, min(request.values.get('timeout', 0, type=float), MESSAGE_CLAIM_MAX_WAIT_SECONDS))
+
+    telegram_obj = TelegramID.query.filter_by(chat_id=chat_id).first()
+    if not telegram_obj:
+        return jsonify({"messages": []}), 200
+    telegram_id = telegram_obj.telegram_id
+
+    broker = get_chat_event_broker()
+    deadline = time.monotonic() + timeout
+    while True:
+        # Read the counter first so a reply committed during the claim
+        # wakes the following wait() straight away
+        seen_version = broker.version(telegram_id)
+        messages = message_claims.claim_unseen(telegram_id, limit)
+        db.session.commit()
+
+        remaining = deadline - time.monotonic()
+        if messages or remaining <= 0:
+            break
+        # Don't hold a pooled connection while waiting; other workers'
+        # replies are picked up by the periodic re-check
+        db.session.close()
+        broker.wait(telegram_id, seen_version, min(CHAT_STREAM_POLL_SECONDS, remaining))
+
+    return jsonify({"messages": messages}), 200
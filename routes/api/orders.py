@@ -1,15 +1,33 @@
 from flask import Blueprint, jsonify, request
 from models import db, User, Order, MyanmarBankAccount, TelegramID
 from routes.api.auth import TOKEN_STORE
-from werkzeug.utils import secure_filename
-import os
 from datetime import datetime, timedelta
-from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
 from flask_sqlalchemy import SQLAlchemy
-import uuid
+from chat_events import publish as publish_chat_event
+import conversation_summary
+from idempotency import idempotent
+import latest_orders
+import order_fields
+import order_sequence
+import order_status
+from order_status import StatusConflict
+import search
+import thumbnails
+import upload_store
+
+# Attempts at inserting an order before giving up on order_id collisions
+ORDER_ID_ATTEMPTS = 20
 
 latest_order_bp = Blueprint('latest_order', __name__, url_prefix='/api/orders')
 
+# Keys returned when ?fields= is not given
+ORDER_FIELDS = (
+    'id', 'order_id', 'order_type', 'amount', 'price', 'created_at', 'status', 'version',
+    'thai_bank_account_id', 'myanmar_bank_account_id', 'receipt', 'confirm_receipt', 'user_bank', 'qr',
+)
+ORDER_DETAIL_FIELDS = ORDER_FIELDS + ('telegram',)
+
 def generate_order_id(order_type):
     """
     Generates a unique order_id in the format DDMMYYA####B/S.
@@ -28,23 +46,14 @@ def generate_order_id(order_type):
     now = datetime.now()
     date_str = now.strftime("%d%m%y")  # 251225
 
-    # Filter orders created today (between 00:00 and 23:59:59)
-    start_of_day = datetime(now.year, now.month, now.day)
-    end_of_day = start_of_day + timedelta(days=1)
-
-    order_count_today = db.session.query(func.count(Order.id)).filter(
-        and_(
-            Order.created_at >= start_of_day,
-            Order.created_at < end_of_day
-        )
-    ).scalar()
-
-    increment = str(order_count_today + 1).zfill(4)  # e.g., 0001
+    # Constant-time, race-free per-day counter (see order_sequence.py)
+    increment = str(order_sequence.next_value(now.date())).zfill(4)  # e.g., 0001
     suffix = 'B' if order_type.lower() == 'buy' else 'S'
 
     return f"{date_str}A{increment}{suffix}"
 
 @latest_order_bp.route('/submit', methods=['POST'])
+@idempotent
 def submit_order():
     # Add detailed logging for debugging
     print("=" * 80)
@@ -94,9 +103,14 @@ def submit_order():
         print(f"❌ Conversion error: {e}")
         return jsonify({'error': 'Invalid amount or price format'}), 400
 
-    # Handle uploaded receipt files (support multiple receipts)
-    upload_dir = 'static/uploads/receipts'
-    os.makedirs(upload_dir, exist_ok=True)
+    # Resolve the chat before storing files, whose references commit at once
+    telegram_id = TelegramID.query.filter_by(chat_id=data.get('chat_id')).first()
+    
+    if not telegram_id:
+        return jsonify({'error': 'Telegram ID not found for the provided chat_id'}), 404
+
+    # Handle uploaded receipt files (support multiple receipts); identical
+    # files are stored once (see upload_store.py)
     receipt_paths = []
     qr_path = None
 
@@ -107,22 +121,16 @@ def submit_order():
             if not file or not file.filename:
                 continue
             
-            # Generate secure filename
-            ext = os.path.splitext(secure_filename(file.filename))[1]
-            filename = f"{uuid.uuid4().hex}{ext}"
-            
             # Handle receipt files (support multiple)
             if key.startswith('receipt') or 'receipt' in key.lower():
-                path = os.path.join(upload_dir, filename)
-                file.save(path)
-                receipt_paths.append(path)
+                receipt_paths.append(upload_store.store(file).path)
             
             # Handle QR code file
             elif key == 'qr' or 'qr' in key.lower():
-                qr_dir = 'static/uploads/qr'
-                os.makedirs(qr_dir, exist_ok=True)
-                qr_path = os.path.join(qr_dir, filename)
-                file.save(qr_path)
+                if qr_path:
+                    # Committed on its own, so the retry rollback below keeps it
+                    upload_store.discard(qr_path)
+                qr_path = upload_store.store(file).path
 
     # Combine receipt paths as comma-separated string
     receipt_path = ",".join(receipt_paths) if receipt_paths else None
@@ -138,11 +146,6 @@ def submit_order():
         mm_bank_account = MyanmarBankAccount.query.filter_by(bank_name=mm_bank).first()
         if mm_bank_account:
             myanmar_bank_id = mm_bank_account.id
-        
-    telegram_id = TelegramID.query.filter_by(chat_id=data.get('chat_id')).first()
-    
-    if not telegram_id:
-        return jsonify({'error': 'Telegram ID not found for the provided chat_id'}), 404
 
     print(f"📝 Creating Order object with amount={amount}, price={price}")
     print(f"🏦 Bank IDs - Thai: {data.get('thai_bank_account_id')}, Myanmar: {myanmar_bank_id}")
@@ -163,10 +166,30 @@ def submit_order():
     
     print(f"📝 Order object created, amount attribute: {order.amount}")
     
-    order.order_id = generate_order_id(order.order_type)
-
-    db.session.add(order)
+    # Numbers from the sequence are unique, but a day's first numbers can
+    # still clash with orders created before the sequence existed; take the
+    # next number until the insert goes through.
+    for attempt in range(ORDER_ID_ATTEMPTS):
+        order.order_id = generate_order_id(order.order_type)
+        try:
+            db.session.add(order)
+            db.session.flush()
+            break
+        except IntegrityError:
+            # Nothing else has been written yet, so a full rollback is safe
+            db.session.rollback()
+            print(f"⚠️ order_id {order.order_id} already taken, retrying")
+    else:
+        db.session.rollback()
+        upload_store.discard(receipt_paths + ([qr_path] if qr_path else []))
+        return jsonify({'error': 'Could not allocate an order ID, please retry'}), 503
+
+    latest_orders.record_order(order)
+    conversation_summary.record_order(order)
+    search.index_order(order)
     db.session.commit()
+    publish_chat_event(telegram_id.telegram_id)
+    thumbnails.enqueue([order.receipt, order.qr])
     
     print(f"💾 Order saved to database")
     print(f"💾 Order amount after commit: {order.amount}")
@@ -212,26 +235,14 @@ def get_latest_order():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    latest_order = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).first()
+    fields = order_fields.requested(ORDER_FIELDS)
+    latest_order = Order.query.options(*order_fields.load_options(fields)).filter_by(
+        user_id=user.id
+    ).order_by(Order.created_at.desc()).first()
     if not latest_order:
         return jsonify({'error': 'No orders found for this user'}), 404
 
-    order_data = {
-        'id': latest_order.id,
-        'order_id': latest_order.order_id,  # Assuming order_id is a field in Order model
-        'order_type': latest_order.order_type,
-        'amount': latest_order.amount,
-        'price': latest_order.price,
-        'created_at': latest_order.created_at.isoformat(),
-        'status': latest_order.status,
-        'thai_bank_account_id': latest_order.thai_bank_account_id,
-        'myanmar_bank_account_id': latest_order.myanmar_bank_account_id,
-        'receipt': latest_order.receipt,
-        'confirm_receipt': latest_order.confirm_receipt,
-        'user_bank': latest_order.user_bank,
-        'qr': latest_order.qr
-    }
-    return jsonify(order_data)
+    return jsonify(order_fields.serialize(latest_order, fields))
 
 
 @latest_order_bp.route('/latest-pending', methods=['GET'])
@@ -244,67 +255,27 @@ def latest_pending_order_by_chat_id():
     if not telegram:
         return jsonify({'error': 'Telegram ID not found'}), 404
 
-    latest_order = Order.query.filter_by(
-        telegram_id=telegram.id
-    ).order_by(Order.created_at.desc()).first()
+    fields = order_fields.requested(ORDER_FIELDS)
+    latest_order = latest_orders.get(telegram, order_fields.load_options(fields, extra=('status',)))
 
     latest_pending_order = latest_order if latest_order and latest_order.status == 'pending' else None
 
     if not latest_pending_order:
         return jsonify({'has_pending': False, 'order': None})
 
-    order_data = {
-        'id': latest_pending_order.id,
-        'order_id': latest_pending_order.order_id,
-        'order_type': latest_pending_order.order_type,
-        'amount': latest_pending_order.amount,
-        'price': latest_pending_order.price,
-        'created_at': latest_pending_order.created_at.isoformat(),
-        'status': latest_pending_order.status,
-        'thai_bank_account_id': latest_pending_order.thai_bank_account_id,
-        'myanmar_bank_account_id': latest_pending_order.myanmar_bank_account_id,
-        'receipt': latest_pending_order.receipt,
-        'confirm_receipt': latest_pending_order.confirm_receipt,
-        'user_bank': latest_pending_order.user_bank,
-        'qr': latest_pending_order.qr
-    }
-    return jsonify({'has_pending': True, 'order': order_data})
+    return jsonify({'has_pending': True, 'order': order_fields.serialize(latest_pending_order, fields)})
 
 
 @latest_order_bp.route('/<string:order_id>', methods=['GET'])
 def get_order_by_id(order_id):
-    """Get order details by order_id."""
-    order = Order.query.filter_by(order_id=order_id).first()
+    """Get order details by order_id. Supports ?fields= projection."""
+    fields = order_fields.requested(ORDER_DETAIL_FIELDS)
+    order = Order.query.options(*order_fields.load_options(fields)).filter_by(order_id=order_id).first()
     
     if not order:
         return jsonify({'error': 'Order not found'}), 404
     
-    # Get telegram info for chat_id
-    telegram_info = None
-    if order.telegram:
-        telegram_info = {
-            'id': order.telegram.id,
-            'chat_id': order.telegram.chat_id,
-            'telegram_id': order.telegram.telegram_id
-        }
-    
-    order_data = {
-        'id': order.id,
-        'order_id': order.order_id,
-        'order_type': order.order_type,
-        'amount': order.amount,
-        'price': order.price,
-        'created_at': order.created_at.isoformat(),
-        'status': order.status,
-        'thai_bank_account_id': order.thai_bank_account_id,
-        'myanmar_bank_account_id': order.myanmar_bank_account_id,
-        'receipt': order.receipt,
-        'confirm_receipt': order.confirm_receipt,
-        'user_bank': order.user_bank,
-        'qr': order.qr,
-        'telegram': telegram_info
-    }
-    return jsonify(order_data)
+    return jsonify(order_fields.serialize(order, fields))
 
 
 @latest_order_bp.route('/<string:order_id>/confirm-receipt', methods=['POST'])
@@ -324,20 +295,14 @@ def upload_confirm_receipt(order_id):
     if not file or not file.filename:
         return jsonify({'error': 'Invalid file'}), 400
     
-    # Save the file
-    upload_dir = 'static/uploads/confirm_receipts'
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate secure filename
-    ext = os.path.splitext(secure_filename(file.filename))[1]
-    filename = f"{order_id}_{uuid.uuid4().hex}{ext}"
-    filepath = os.path.join(upload_dir, filename)
-    
-    file.save(filepath)
-    
+    # Store the file (deduplicated), then drop the replaced receipt's reference
+    filepath = upload_store.store(file).path
+    upload_store.release(order.confirm_receipt)
+
     # Update order with confirm_receipt path
     order.confirm_receipt = filepath
     db.session.commit()
+    thumbnails.enqueue(filepath)
     
     return jsonify({
         'message': 'Confirmation receipt uploaded successfully',
@@ -348,7 +313,13 @@ def upload_confirm_receipt(order_id):
 
 @latest_order_bp.route('/<string:order_id>/status', methods=['PATCH'])
 def update_order_status(order_id):
-    """Update order status."""
+    """
+    Update order status.
+
+    JSON body: {"status": ..., "version": <int, optional>}. Returns 409 with
+    the order's current status and version if it changed since ``version``
+    or the move is not allowed (see order_status.TRANSITIONS).
+    """
     order = Order.query.filter_by(order_id=order_id).first()
     
     if not order:
@@ -362,18 +333,26 @@ def update_order_status(order_id):
     new_status = data['status']
     
     # Validate status
-    valid_statuses = ['pending', 'verified', 'approved', 'declined', 'complain']
+    valid_statuses = order_status.STATUSES
     if new_status not in valid_statuses:
         return jsonify({'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}), 400
+    version = data.get('version')
+    if version is not None and not isinstance(version, int):
+        return jsonify({'error': 'version must be an integer'}), 400
     
-    # Update status
+    # Compare-and-swap on the order's version
     old_status = order.status
-    order.status = new_status
+    try:
+        order_status.transition(order, new_status, version)
+    except StatusConflict as e:
+        return jsonify(e.to_dict()), 409
     db.session.commit()
+    publish_chat_event(order.telegram.telegram_id if order.telegram else None)
     
     return jsonify({
         'message': 'Order status updated successfully',
         'order_id': order_id,
         'old_status': old_status,
-        'new_status': new_status
+        'new_status': new_status,
+        'version': order.version
     }), 200
\ No newline at end of file
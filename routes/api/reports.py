@@ -0,0 +1,136 @@
+from flask import Blueprint, jsonify, request
+from models import db, now_mmt, OrderVolumeRollup, ThaiBankAccount, MyanmarBankAccount
+from utils import login_required
+from order_rollups import bucket_start
+from datetime import datetime, timedelta
+
+reports_bp = Blueprint('reports_bp', __name__, url_prefix='/api/reports')
+
+# Largest number of buckets one report may span (a month of hours)
+MAX_BUCKETS = 31 * 24
+
+BUCKET_STEP = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+# Range reported when ?from= is omitted
+DEFAULT_SPAN = {
+    'hour': timedelta(days=1),
+    'day': timedelta(days=30),
+}
+
+
+def _parse_day(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _totals(count=0, amount=0.0, value=0.0):
+    return {
+        'count': count,
+        'volume': round(amount, 2),
+        'value': round(value, 2),
+        'avg_price': round(value / amount, 4) if amount else None,
+    }
+
+
+def _bank_names(model, ids):
+    ids = [i for i in ids if i]
+    if not ids:
+        return {}
+    return dict(db.session.query(model.id, model.bank_name).filter(model.id.in_(ids)).all())
+
+
+@reports_bp.route('/volume', methods=['GET'])
+@login_required
+def volume():
+    """
+    Approved order volume per hour or day, read from order_volume_rollups.
+
+    Query params:
+        from, to: Inclusive days (YYYY-MM-DD); ``to`` defaults to today
+        granularity: 'day' (default) or 'hour'
+        order_type: Optional 'buy' or 'sell'
+
+    Returns one entry per bucket (empty buckets included) with buy/sell
+    count, volume (sum of amount), value (sum of amount * price), the
+    amount-weighted average price and the sell-minus-buy price spread, plus
+    totals per bank account pair over the whole range.
+    """
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in BUCKET_STEP:
+        return jsonify({'error': 'granularity must be one of: day, hour'}), 400
+    order_type = request.args.get('order_type')
+    if order_type not in (None, '', 'buy', 'sell'):
+        return jsonify({'error': 'order_type must be buy or sell'}), 400
+
+    try:
+        to_day = _parse_day('to') or bucket_start(now_mmt(), 'day')
+        end = to_day + timedelta(days=1)
+        start = _parse_day('from') or end - DEFAULT_SPAN[granularity]
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD'}), 400
+
+    step = BUCKET_STEP[granularity]
+    if start >= end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    if (end - start) / step > MAX_BUCKETS:
+        return jsonify({'error': f'Range too large: at most {MAX_BUCKETS} {granularity} buckets'}), 400
+
+    # Bounded by the range, not by order history: at most one row per
+    # bucket, order type and bank account pair
+    query = OrderVolumeRollup.query.filter(
+        OrderVolumeRollup.granularity == granularity,
+        OrderVolumeRollup.bucket_start >= start,
+        OrderVolumeRollup.bucket_start < end,
+    )
+    if order_type:
+        query = query.filter(OrderVolumeRollup.order_type == order_type)
+
+    series = {}
+    banks = {}
+    for row in query.all():
+        per_type = series.setdefault(row.bucket_start, {})
+        count, amount, value = per_type.get(row.order_type, (0, 0.0, 0.0))
+        per_type[row.order_type] = (count + row.order_count, amount + row.total_amount, value + row.total_value)
+
+        key = (row.order_type, row.thai_bank_account_id, row.myanmar_bank_account_id)
+        count, amount, value = banks.get(key, (0, 0.0, 0.0))
+        banks[key] = (count + row.order_count, amount + row.total_amount, value + row.total_value)
+
+    buckets = []
+    moment = start
+    while moment < end:
+        per_type = series.get(moment, {})
+        entry = {'start': moment.isoformat()}
+        for kind in ('buy', 'sell'):
+            entry[kind] = _totals(*per_type.get(kind, ()))
+        buy_price, sell_price = entry['buy']['avg_price'], entry['sell']['avg_price']
+        entry['spread'] = round(sell_price - buy_price, 4) if buy_price and sell_price else None
+        buckets.append(entry)
+        moment += step
+
+    thai_names = _bank_names(ThaiBankAccount, [key[1] for key in banks])
+    myanmar_names = _bank_names(MyanmarBankAccount, [key[2] for key in banks])
+    by_bank = [
+        {
+            'order_type': kind,
+            'thai_bank_account_id': thai_id or None,
+            'thai_bank_name': thai_names.get(thai_id),
+            'myanmar_bank_account_id': myanmar_id or None,
+            'myanmar_bank_name': myanmar_names.get(myanmar_id),
+            **_totals(*totals),
+        }
+        for (kind, thai_id, myanmar_id), totals in sorted(banks.items(), key=lambda item: -item[1][1])
+    ]
+
+    return jsonify({
+        'granularity': granularity,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'buckets': buckets,
+        'by_bank': by_bank,
+    })
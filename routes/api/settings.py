@@ -1,16 +1,18 @@
 from flask import Blueprint, jsonify
-from models import db, MaintenanceMode, AuthFeature, ExchangeRate
+from conditional import conditional_get
+from utils import login_required
+import read_cache
 
 settings_bp = Blueprint('settings_bp', __name__, url_prefix='/api/settings')
 
 @settings_bp.route('/', methods=['GET'])
+@conditional_get(read_cache.settings)
 def get_settings_status():
-    maintenance = MaintenanceMode.query.first()
-    auth_feature = AuthFeature.query.first()
-    exchange_rate = ExchangeRate.query.order_by(ExchangeRate.updated_at.desc()).first()
-    return jsonify({
-        'maintenance_mode': maintenance.on if maintenance else False,
-        'auth_feature': auth_feature.on if auth_feature else False,
-        'buy': exchange_rate.buy if exchange_rate else None,
-        'sell': exchange_rate.sell if exchange_rate else None,
-    })
\ No newline at end of file
+    # Served from the per-worker cache; the dashboard bumps it on save
+    return jsonify(read_cache.settings())
+
+@settings_bp.route('/cache-stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    """Read cache hit/miss counters of the worker answering this request."""
+    return jsonify(read_cache.stats())
@@ -1,9 +1,27 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from models import db, ThaiBankAccount, MyanmarBankAccount
 from utils import login_required
+import bank_ledger
+import read_cache
 
 banks_bp = Blueprint('banks', __name__)
 
+
+def _adjust_balance(bank_type, bank):
+    """
+    Apply an edited Amount field as a ledger adjustment.
+
+    The change is the difference to the amount the form was rendered with,
+    so order updates that landed in the meantime are kept.
+    """
+    amount = request.form.get('amount', type=float) or 0.0
+    original = request.form.get('original_amount', type=float)
+    if original is None:
+        original = bank.amount or 0.0
+    delta = amount - original
+    if abs(delta) > 1e-9:
+        bank_ledger.apply(bank_type, bank.id, delta, note='Manual adjustment')
+
 # --- Thai Bank Accounts ---
 
 
@@ -17,6 +35,7 @@ def thai_banks():
             # Checkbox for 'on' status: present in form if checked
             bank_on = request.form.get(f'on_{bank.id}') == 'on'
             bank.on = bank_on
+        read_cache.bump(read_cache.BANKS)
         db.session.commit()
         flash('Bank statuses updated!', 'success')
         return redirect(url_for('banks.thai_banks'))
@@ -35,10 +54,14 @@ def create_thai_bank():
             account_name=request.form['account_name'],
             qr_image=request.form.get('qr_image'),
             staff_account=request.form.get('staff_account'),
-            amount=float(amount) if amount else None,
             display_name=request.form.get('display_name'),
         )
         db.session.add(bank)
+        db.session.flush()
+        if amount:
+            # Opening balance goes through the ledger like any other change
+            bank_ledger.apply('thai', bank.id, float(amount), note='Opening balance')
+        read_cache.bump(read_cache.BANKS)
         db.session.commit()
         flash('Thai bank account created!', 'success')
         return redirect(url_for('banks.thai_banks'))
@@ -54,9 +77,9 @@ def edit_thai_bank(bank_id):
         bank.account_name = request.form['account_name']
         bank.qr_image = request.form.get('qr_image')
         bank.staff_account = request.form.get('staff_account')
-        amount = request.form.get('amount')
-        bank.amount = float(amount) if amount else None
         bank.display_name = request.form.get('display_name')
+        _adjust_balance('thai', bank)
+        read_cache.bump(read_cache.BANKS)
         db.session.commit()
         flash('Thai bank account updated!', 'success')
         return redirect(url_for('banks.thai_banks'))
@@ -67,6 +90,7 @@ def edit_thai_bank(bank_id):
 def delete_thai_bank(bank_id):
     bank = ThaiBankAccount.query.get_or_404(bank_id)
     db.session.delete(bank)
+    read_cache.bump(read_cache.BANKS)
     db.session.commit()
     flash('Thai bank account deleted!', 'success')
     return redirect(url_for('banks.thai_banks'))
@@ -81,6 +105,7 @@ def myanmar_banks():
         for bank in banks:
             bank_on = request.form.get(f'on_{bank.id}') == 'on'
             bank.on = bank_on
+        read_cache.bump(read_cache.BANKS)
         db.session.commit()
         flash('Bank statuses updated!', 'success')
         return redirect(url_for('banks.myanmar_banks'))
@@ -98,10 +123,14 @@ def create_myanmar_bank():
             account_name=request.form['account_name'],
             qr_image=request.form.get('qr_image'),
             staff_account=request.form.get('staff_account'),
-            amount=float(amount) if amount else None,
             display_name=request.form.get('display_name'),
         )
         db.session.add(bank)
+        db.session.flush()
+        if amount:
+            # Opening balance goes through the ledger like any other change
+            bank_ledger.apply('myanmar', bank.id, float(amount), note='Opening balance')
+        read_cache.bump(read_cache.BANKS)
         db.session.commit()
         flash('Myanmar bank account created!', 'success')
         return redirect(url_for('banks.myanmar_banks'))
@@ -117,9 +146,9 @@ def edit_myanmar_bank(bank_id):
         bank.account_name = request.form['account_name']
         bank.qr_image = request.form.get('qr_image')
         bank.staff_account = request.form.get('staff_account')
-        amount = request.form.get('amount')
-        bank.amount = float(amount) if amount else None
         bank.display_name = request.form.get('display_name')
+        _adjust_balance('myanmar', bank)
+        read_cache.bump(read_cache.BANKS)
         db.session.commit()
         flash('Myanmar bank account updated!', 'success')
         return redirect(url_for('banks.myanmar_banks'))
@@ -130,6 +159,7 @@ def edit_myanmar_bank(bank_id):
 def delete_myanmar_bank(bank_id):
     bank = MyanmarBankAccount.query.get_or_404(bank_id)
     db.session.delete(bank)
+    read_cache.bump(read_cache.BANKS)
     db.session.commit()
     flash('Myanmar bank account deleted!', 'success')
     return redirect(url_for('banks.myanmar_banks'))
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect
-from models import db, User, MaintenanceMode, ExchangeRate, AuthFeature, Order
+from models import db, MaintenanceMode, ExchangeRate, AuthFeature
 from utils import login_required
+import order_counters
+import read_cache
 import datetime
 from sqlalchemy.sql import func
 import requests
@@ -32,13 +34,15 @@ def dashboard():
             auth_feature = False
 
 
-        users_count = User.query.count()
+        # Users and pending orders in one grouped query
+        counters = order_counters.load(include_users=True)
+        users_count = counters.users
 
         # Get the latest exchange rate
         exchange_rate = ExchangeRate.query.order_by(ExchangeRate.updated_at.desc()).first()
         
-        pending_buy_orders = Order.query.filter_by(order_type='buy', status='pending').count()
-        pending_sell_orders = Order.query.filter_by(order_type='sell', status='pending').count()
+        pending_buy_orders = counters.pending('buy')
+        pending_sell_orders = counters.pending('sell')
 
         return render_template(
             'home.html',
@@ -82,5 +86,6 @@ def dashboard():
                 )
                 db.session.add(exchange_rate)
 
+        read_cache.bump(read_cache.SETTINGS)
         db.session.commit()
         return redirect('/dashboard')
@@ -0,0 +1,42 @@
+from flask import Blueprint, redirect, send_file, url_for, abort
+import os
+import thumbnails
+
+media_bp = Blueprint('media', __name__, url_prefix='/media')
+
+# Thumbnails are derived from files that never change under the same path
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+
+@media_bp.app_template_global()
+def thumbnail_url(path):
+    """URL of an uploaded image's thumbnail, for <img src> in templates."""
+    return url_for('media.thumbnail', source=(path or '').strip().lstrip('/'))
+
+
+@media_bp.route('/thumb/<path:source>')
+def thumbnail(source):
+    """
+    Serve the cached thumbnail of an uploaded image.
+
+    Cached thumbnails are sent with an immutable, year-long Cache-Control.
+    On a miss the thumbnail is queued and the client is redirected to the
+    original image without caching the redirect, so the next page load gets
+    the thumbnail.
+    """
+    path = thumbnails.source_path(source)
+    if not path:
+        abort(404)
+    target = thumbnails.thumbnail_path(path)
+    if os.path.exists(target):
+        response = send_file(os.path.abspath(target), mimetype='image/jpeg', max_age=THUMBNAIL_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    if not os.path.isfile(path):
+        abort(404)
+    thumbnails.enqueue(path)
+    response = redirect('/' + path)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -1,35 +1,203 @@
-from flask import Blueprint, render_template, request, jsonify
-from models import db, Message, TelegramID
-from sqlalchemy import desc
-from json import loads, dumps
+from flask import Blueprint, render_template, request, jsonify, url_for, Response, stream_with_context, abort
+from models import db, Message, ArchivedMessage, TelegramID, ConversationSummary
+from sqlalchemy import func
+from json import dumps
 from utils import login_required
+from conditional import conditional_get
+from chat_events import get_chat_event_broker, publish as publish_chat_event
+import conversation_summary
+import exports
+import latest_orders
+import message_archive
+import order_status
+from order_status import StatusConflict
+import search
+from settings import CHAT_STREAM_POLL_SECONDS, CHAT_STREAM_KEEPALIVE_SECONDS, CHAT_STREAM_MAX_SECONDS
+import time
 
 messages_bp = Blueprint('messages_bp', __name__, url_prefix='/messages')
 
+# Maximum number of messages pushed in a single stream event
+STREAM_BATCH_SIZE = 100
+
+# Keyset paging defaults for the chat polling APIs
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Columns of /messages/export, in file order
+MESSAGE_EXPORT_COLUMNS = [
+    'id', 'telegram_id', 'created_at', 'from_bot', 'from_backend',
+    'content', 'chosen_option', 'image',
+]
+
+
+def _serialize_chat_message(m):
+    return {
+        "id": m.id,
+        "content": m.content,
+        "chosen_option": m.chosen_option,
+        "image": m.image.replace('\\', '/') if m.image else None,
+        "from_bot": m.from_bot,
+        "buttons": m.buttons if m.buttons else None,
+        "created_at": m.id,  # You can add timestamp if you add it to the model
+        "seen_by_admin": m.seen_by_admin,
+    }
+
+
+def _serialize_latest_order(order):
+    if not order:
+        return None
+    return {
+        "id": order.id,
+        "order_id": order.order_id,
+        "status": order.status,
+        "version": order.version,
+        "next_statuses": sorted(order_status.next_statuses(order.status)),
+        "amount": order.amount,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+    }
+
+
+def _cursor_args(default_limit=DEFAULT_PAGE_SIZE):
+    """Read the ``after_id``/``before_id``/``limit`` keyset parameters."""
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return after_id, before_id, limit
+
+
+def _fetch_message_page(telegram_id, after_id=None, before_id=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one keyset page of a conversation, oldest message first.
+
+    With ``after_id`` the page holds messages newer than the cursor; with
+    ``before_id`` it holds the newest messages older than the cursor; with
+    neither it holds the newest messages. Backward pages continue into
+    ``messages_archive`` once the hot table runs out.
+    """
+    query = Message.query.filter(Message.telegram_id == telegram_id)
+    if after_id is not None:
+        return query.filter(Message.id > after_id).order_by(Message.id.asc()).limit(limit).all()
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+    rows = query.order_by(Message.id.desc()).limit(limit).all()
+    if len(rows) < limit:
+        cursor = rows[-1].id if rows else before_id
+        rows += message_archive.fetch_before(telegram_id, cursor, limit - len(rows))
+    return list(reversed(rows))
+
+
+def _latest_order(telegram_pk):
+    """Newest order of a conversation, or None."""
+    return latest_orders.by_telegram_pk(telegram_pk)
+
+
+def _latest_message_id(telegram_id):
+    """Highest message id in a conversation (0 when empty)."""
+    return db.session.query(func.max(Message.id)).filter(
+        Message.telegram_id == telegram_id
+    ).scalar() or 0
+
+
+def _mark_seen_by_admin(telegram_id, messages):
+    """
+    Flag messages as seen by admin and update the unread counter.
+
+    Returns:
+        True if anything changed and the session needs a commit
+    """
+    unseen = [m for m in messages if not m.seen_by_admin]
+    if not unseen:
+        return False
+    Message.query.filter(Message.id.in_([m.id for m in unseen])).update(
+        {Message.seen_by_admin: True}, synchronize_session=False
+    )
+    conversation_summary.mark_read(telegram_id, sum(1 for m in unseen if not m.from_backend))
+    return True
+
+
+def _sse(event, data, event_id=None):
+    """Format a single Server-Sent Event frame."""
+    frame = ""
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    frame += f"event: {event}\ndata: {dumps(data)}\n\n"
+    return frame
+
+def _conversation_summaries():
+    """One row per conversation, newest message first (index scan on last_message_id)."""
+    return (
+        ConversationSummary.query
+        .filter(ConversationSummary.last_message_id.isnot(None))
+        .order_by(ConversationSummary.last_message_id.desc())
+        .all()
+    )
+
+
+def _chat_list_version():
+    return tuple(db.session.query(
+        func.count(ConversationSummary.telegram_id), func.max(ConversationSummary.updated_at)
+    ).one())
+
+
+def _chat_detail_version(telegram_id):
+    # The summary row changes on new orders, status edits and read marks
+    summary_updated_at = db.session.query(ConversationSummary.updated_at).filter_by(
+        telegram_id=telegram_id
+    ).scalar()
+    return (_latest_message_id(telegram_id), summary_updated_at)
+
+
 @messages_bp.route('/')
 @login_required
 def chat_list():
-    # List all Telegram IDs that have messages, sorted by latest message on top
-    telegrams = (
-        TelegramID.query
-        .join(Message)
-        .order_by(desc(Message.id))
-        .all()
-    )
+    # List all conversations that have messages, sorted by latest message on top
+    telegrams = _conversation_summaries()
     return render_template('messages/list.html', telegrams=telegrams)
 
 @messages_bp.route('/<telegram_id>')
 @login_required
 def chat_detail(telegram_id):
+    """
+    Conversation page.
+
+    Only the newest DEFAULT_PAGE_SIZE messages are embedded in the page,
+    read with a keyset query; older pages are fetched with ``before_id`` as
+    the admin scrolls up.
+    """
     telegram = TelegramID.query.filter_by(telegram_id=telegram_id).first_or_404()
-    return render_template('messages/chat.html', telegram=telegram, loads=loads)
+    messages = _fetch_message_page(telegram_id, limit=DEFAULT_PAGE_SIZE)
+    initial = {
+        "messages": [_serialize_chat_message(m) for m in messages],
+        "has_more": len(messages) == DEFAULT_PAGE_SIZE,
+        "latest_order": _serialize_latest_order(_latest_order(telegram.id)),
+    }
+    if _mark_seen_by_admin(telegram_id, messages):
+        db.session.commit()
+    return render_template('messages/chat.html', telegram=telegram, initial=initial)
 
 
 @messages_bp.route('/api/<telegram_id>/messages')
 @login_required
 def api_messages(telegram_id):
+    """
+    Conversation messages plus the latest order.
+
+    Without cursors the full live (non-archived) history is returned.
+    ``?after_id=`` returns only messages newer than the cursor and
+    ``?before_id=`` the page just older than it, continuing into the archive
+    (``limit`` caps either, default 100).
+    """
     telegram = TelegramID.query.filter_by(telegram_id=telegram_id).first_or_404()
-    messages = Message.query.filter_by(telegram_id=telegram_id).order_by(Message.id.asc()).all()
+    after_id, before_id, limit = _cursor_args(default_limit=100)
+    latest_id = _latest_message_id(telegram_id)
+    if after_id is None and before_id is None:
+        messages = Message.query.filter_by(telegram_id=telegram_id).order_by(Message.id.asc()).all()
+    elif after_id is not None and after_id >= latest_id:
+        messages = []  # Nothing new; skip the row fetch entirely
+    else:
+        messages = _fetch_message_page(telegram_id, after_id, before_id, limit)
     data = [
         {
             "id": m.id,
@@ -44,9 +212,7 @@ def api_messages(telegram_id):
         for m in messages
     ]
     # Get latest order if exists
-    latest_order = (
-        telegram.orders and sorted(telegram.orders, key=lambda o: o.created_at, reverse=True)[0]
-    )
+    latest_order = latest_orders.get(telegram)
     order_data = None
     if latest_order:
         order_data = {
@@ -60,7 +226,8 @@ def api_messages(telegram_id):
     return jsonify({
         "telegram_id": telegram.telegram_id,
         "messages": data,
-        "latest_order": order_data
+        "latest_order": order_data,
+        "latest_id": latest_id
     })
 
 
@@ -69,77 +236,238 @@ def api_messages(telegram_id):
 def update_order_status(telegram_id):
     """
     Update the latest order status for a given telegram_id.
-    Expects JSON: { "status": "pending" | "approved" | "declined" }
+    Expects JSON: { "status": "pending" | "verified" | "approved" | "declined" | "complain", "version": <int, optional> }
+
+    Returns 409 if the order changed since ``version`` or the move is not allowed.
     """
     telegram = TelegramID.query.filter_by(telegram_id=telegram_id).first_or_404()
-    latest_order = (
-        telegram.orders and sorted(telegram.orders, key=lambda o: o.created_at, reverse=True)[0]
-    )
+    latest_order = latest_orders.get(telegram)
     if not latest_order:
         return jsonify({"error": "No orders found for this user."}), 404
 
     data = request.get_json()
     status = data.get("status")
-    if status not in ("pending", "approved", "declined", "complain"):
+    if status not in order_status.STATUSES:
         return jsonify({"error": "Invalid status."}), 400
+    version = data.get("version")
+    if version is not None and not isinstance(version, int):
+        return jsonify({"error": "version must be an integer."}), 400
 
-    latest_order.status = status
+    try:
+        order_status.transition(latest_order, status, version)
+    except StatusConflict as e:
+        return jsonify(e.to_dict()), 409
     db.session.commit()
+    publish_chat_event(telegram.telegram_id)
     return jsonify({"success": True, "order_id": latest_order.order_id, "new_status": status})
-3
 
 @messages_bp.route('/api/list')
 @login_required
+@conditional_get(_chat_list_version)
 def api_chat_list():
     # API endpoint to get chat list (for polling)
-    telegrams = TelegramID.query.join(Message).order_by(desc(Message.id)).all()
+    telegrams = _conversation_summaries()
     data = [
         {
             "telegram_id": t.telegram_id,
-            "last_message": t.user[-1].content if t.user else "",
-            "last_order_status": t.last_order.status if t.last_order else "",
+            "last_message": t.last_message_preview or "",
+            "last_order_status": t.last_order_status or "",
+            "unread_by_admin": t.unread_by_admin or 0,
             "updated_at": t.updated_at.isoformat() if t.updated_at else ""
         }
         for t in telegrams
     ]
     return jsonify(data)
 
+@messages_bp.route('/search')
+@login_required
+def search_page():
+    return render_template('messages/search.html', q=request.args.get('q', ''))
+
+
+@messages_bp.route('/api/search')
+@login_required
+def api_search():
+    """
+    Ranked full-text search over messages and orders.
+
+    ``?q=`` is the search text, ``?type=`` optionally restricts hits to
+    ``message`` or ``order``, and ``page``/``per_page`` page the results.
+    """
+    q = request.args.get('q', '').strip()
+    kind = request.args.get('type')
+    if kind not in (search.KIND_MESSAGE, search.KIND_ORDER):
+        kind = None
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
+
+    hits, has_more = search.search(q, kind=kind, page=page, per_page=per_page)
+    for hit in hits:
+        if hit['kind'] == search.KIND_ORDER:
+            hit['url'] = url_for('orders.view_order', order_id=hit['ref_id'])
+        elif hit['telegram_id']:
+            hit['url'] = url_for('messages_bp.chat_detail', telegram_id=hit['telegram_id'])
+        else:
+            hit['url'] = None
+    return jsonify({
+        "query": q,
+        "page": page,
+        "per_page": per_page,
+        "has_more": has_more,
+        "results": hits,
+    })
+
+
+def _message_export_query(model, start, end):
+    query = db.session.query(
+        model.id, model.telegram_id, model.created_at, model.from_bot, model.from_backend,
+        model.content, model.chosen_option, model.image,
+    )
+    if request.args.get('telegram_id'):
+        query = query.filter(model.telegram_id == request.args['telegram_id'])
+    sender = request.args.get('type')
+    if sender == 'admin':
+        query = query.filter(model.from_backend.is_(True))
+    elif sender == 'bot':
+        query = query.filter(model.from_bot.is_(True))
+    elif sender == 'user':
+        query = query.filter(model.from_backend.isnot(True), model.from_bot.isnot(True))
+    if start:
+        query = query.filter(model.created_at >= start)
+    if end:
+        query = query.filter(model.created_at < end)
+    return query.order_by(model.id)
+
+
+@messages_bp.route('/export')
+@login_required
+def export_messages():
+    """
+    Stream chat messages, archived ones included, as CSV or JSONL.
+
+    Filters: ``telegram_id``, ``type`` (user/admin/bot) and ``from``/``to``
+    days (YYYY-MM-DD, inclusive). Archived messages are older, so streaming
+    the archive first keeps the file in id order.
+    """
+    if request.args.get('type') not in (None, '', 'user', 'admin', 'bot'):
+        abort(400, "type must be one of: user, admin, bot")
+    start, end = exports.date_range()
+    queries = [
+        _message_export_query(ArchivedMessage, start, end),
+        _message_export_query(Message, start, end),
+    ]
+    return exports.export_response('messages', MESSAGE_EXPORT_COLUMNS, queries)
+
+
 @messages_bp.route('/api/chat/<telegram_id>')
 @login_required
+@conditional_get(_chat_detail_version)
 def api_chat_detail(telegram_id):
-    # API endpoint to get chat details (for polling)
+    """
+    API endpoint to get chat details (for polling).
+
+    Returns the newest 50 messages by default. Pollers pass ``?after_id=`` with
+    the last id they rendered to receive only the delta, and scroll-back
+    passes ``?before_id=`` with the oldest id on screen. ``latest_id`` is the
+    conversation's current high-water mark and ``has_more`` tells whether
+    the page was cut off by ``limit``.
+    """
     telegram = TelegramID.query.filter_by(telegram_id=telegram_id).first_or_404()
-    
-    messages = (
-        Message.query
-        .filter_by(telegram_id=telegram_id)
-        .order_by(Message.id.desc())
-        .limit(50)  # Limit to last 50 messages
-        .all()
-    )
-    
-    messages = list(reversed(messages))
-    data = [
-        {
-            "id": m.id,
-            "content": m.content,
-            "chosen_option": m.chosen_option,
-            "image": m.image.replace('\\', '/') if m.image else None,
-            "from_bot": m.from_bot,
-            "buttons": m.buttons if m.buttons else None,
-            "created_at": m.id,  # You can add timestamp if you add it to the model
-            "seen_by_admin": m.seen_by_admin,
-        }
-        for m in messages
-    ]
-    
-    # Mark all messages as seen by admin
-    for m in messages:
-        if not m.seen_by_admin:
-            m.seen_by_admin = True
-    db.session.commit()
-    
+    after_id, before_id, limit = _cursor_args()
+
+    latest_id = _latest_message_id(telegram_id)
+    if after_id is not None and after_id >= latest_id:
+        # Idle poll: answered from the (telegram_id, id) index alone
+        messages = []
+    else:
+        messages = _fetch_message_page(telegram_id, after_id, before_id, limit)
+    data = [_serialize_chat_message(m) for m in messages]
+
+    # Mark the returned messages as seen by admin
+    if _mark_seen_by_admin(telegram_id, messages):
+        db.session.commit()
+
     return jsonify({
         "telegram_id": telegram.telegram_id,
-        "messages": data
-    })
\ No newline at end of file
+        "messages": data,
+        "latest_id": latest_id,
+        "has_more": len(messages) == limit
+    })
+
+
+@messages_bp.route('/api/chat/<telegram_id>/stream')
+@login_required
+def chat_stream(telegram_id):
+    """
+    Server-Sent Events stream for one conversation.
+
+    Pushes a ``messages`` event with every message newer than the client's
+    cursor and an ``order`` event whenever the latest order or its status
+    changes. The cursor comes from the ``Last-Event-ID`` header on reconnect,
+    or from ``?after_id=`` on the first connection.
+
+    The stream wakes immediately on writes published by this worker and
+    re-checks the database every CHAT_STREAM_POLL_SECONDS for writes handled
+    by other workers. It closes after CHAT_STREAM_MAX_SECONDS; EventSource
+    reconnects on its own and resumes from the last event id.
+    """
+    telegram = TelegramID.query.filter_by(telegram_id=telegram_id).first_or_404()
+    telegram_pk = telegram.id
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('after_id', 0, type=int)
+    # Don't hold a pooled connection between request setup and the first poll
+    db.session.close()
+
+    def generate():
+        broker = get_chat_event_broker()
+        cursor = last_id
+        last_order_state = None
+        deadline = time.monotonic() + CHAT_STREAM_MAX_SECONDS
+        last_sent = time.monotonic()
+
+        yield "retry: 3000\n\n"
+        while time.monotonic() < deadline:
+            # Read the counter before querying so a publish that lands during
+            # the query wakes the following wait() straight away.
+            seen_version = broker.version(telegram_id)
+
+            messages = _fetch_message_page(telegram_id, after_id=cursor, limit=STREAM_BATCH_SIZE)
+            if messages:
+                data = [_serialize_chat_message(m) for m in messages]
+                _mark_seen_by_admin(telegram_id, messages)
+                cursor = messages[-1].id
+                yield _sse('messages', {"messages": data}, event_id=cursor)
+                last_sent = time.monotonic()
+
+            latest_order = _latest_order(telegram_pk)
+            order_state = (latest_order.id, latest_order.status, latest_order.version) if latest_order else None
+            if order_state != last_order_state:
+                last_order_state = order_state
+                yield _sse('order', {"latest_order": _serialize_latest_order(latest_order)}, event_id=cursor)
+                last_sent = time.monotonic()
+
+            # End the transaction and return the connection to the pool while idle
+            db.session.commit()
+            db.session.close()
+
+            if len(messages) == STREAM_BATCH_SIZE:
+                continue  # More backlog to drain
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            broker.wait(telegram_id, seen_version, min(CHAT_STREAM_POLL_SECONDS, remaining))
+
+            if time.monotonic() - last_sent >= CHAT_STREAM_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx)
+        }
+    )
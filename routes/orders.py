@@ -1,8 +1,22 @@
-from flask import Blueprint, render_template, url_for, redirect, request, flash
-from datetime import datetime
-from models import Message, db, Order, User, ThaiBankAccount, MyanmarBankAccount, ExchangeRate
+from flask import Blueprint, render_template, url_for, redirect, request, flash, jsonify, current_app
+from models import Message, db, Order, User, ThaiBankAccount, MyanmarBankAccount, ExchangeRate, TelegramID
 from utils import login_required
-from bot_webhook_client import get_webhook_client
+from conditional import conditional_get
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, undefer_group
+from bot_webhook_client import BotWebhookClient, get_webhook_client
+from chat_events import publish as publish_chat_event
+import conversation_summary
+import exports
+import order_counters
+import latest_orders
+import order_fields
+import order_rollups
+import order_status
+from order_status import StatusConflict
+import search
+import thumbnails
+import upload_store
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/orders')
 
@@ -10,7 +24,20 @@ def get_orders_by_type(order_type):
     return Order.query.filter_by(order_type=order_type).order_by(Order.created_at.desc()).all()
 
 def get_order_by_id(order_id):
-    return Order.query.get(order_id)
+    # Everything the order page and its webhook calls read, in one query
+    return Order.query.options(
+        undefer_group('receipts'),  # Deferred by default
+        joinedload(Order.telegram),
+        joinedload(Order.user),
+        joinedload(Order.thai_bank_account),
+        joinedload(Order.myanmar_bank_account),
+    ).get(order_id)
+
+def _order_list_version():
+    # Count catches deletes, max(id) inserts and max(updated_at) status edits
+    return tuple(db.session.query(
+        func.count(Order.id), func.max(Order.id), func.max(Order.updated_at)
+    ).one())
 
 @orders_bp.route('/')
 @login_required
@@ -22,18 +49,26 @@ def index():
     
     per_page = 10
 
-    buy_orders_query = Order.query.filter_by(order_type="buy").order_by(Order.created_at.desc())
-    sell_orders_query = Order.query.filter_by(order_type="sell").order_by(Order.created_at.desc())
+    # The rows show the customer's phone; load it with the page, not per row
+    with_user = joinedload(Order.user).load_only(User.phone)
+    buy_orders_query = Order.query.options(with_user).filter_by(order_type="buy").order_by(Order.created_at.desc())
+    sell_orders_query = Order.query.options(with_user).filter_by(order_type="sell").order_by(Order.created_at.desc())
     
     if status:
         buy_orders_query = buy_orders_query.filter_by(status=status)
         sell_orders_query = sell_orders_query.filter_by(status=status)
 
-    buy_orders_pagination = buy_orders_query.paginate(page=buy_page, per_page=per_page, error_out=False)
-    sell_orders_pagination = sell_orders_query.paginate(page=sell_page, per_page=per_page, error_out=False)
-    
-    new_buy_orders_count = buy_orders_query.filter_by(status="pending").count()
-    new_sell_orders_count = sell_orders_query.filter_by(status="pending").count()
+    # One grouped COUNT supplies both paginator totals and the pending badges
+    counters = order_counters.load()
+    buy_orders_pagination = order_counters.paginate(
+        buy_orders_query, buy_page, per_page, counters.count('buy', status or None)
+    )
+    sell_orders_pagination = order_counters.paginate(
+        sell_orders_query, sell_page, per_page, counters.count('sell', status or None)
+    )
+
+    new_buy_orders_count = counters.pending('buy')
+    new_sell_orders_count = counters.pending('sell')
 
     return render_template(
         'orders/index.html',
@@ -45,37 +80,65 @@ def index():
         new_sell_orders_count=new_sell_orders_count
     )
     
+# Columns of /orders/export, in file order
+ORDER_EXPORT_COLUMNS = [
+    'id', 'order_id', 'order_type', 'status', 'amount', 'price', 'user_bank',
+    'telegram_id', 'user_id', 'thai_bank_account_id', 'myanmar_bank_account_id',
+    'created_at', 'updated_at',
+]
+
+@orders_bp.route('/export')
+@login_required
+def export_orders():
+    """
+    Stream orders as CSV or JSONL for accounting.
+
+    Filters: ``status``, ``type`` (buy/sell) and ``from``/``to`` creation
+    days (YYYY-MM-DD, inclusive). See exports.export_response for
+    ``format`` and ``gzip``.
+    """
+    start, end = exports.date_range()
+    query = (
+        db.session.query(
+            Order.id, Order.order_id, Order.order_type, Order.status, Order.amount, Order.price,
+            Order.user_bank, TelegramID.telegram_id, Order.user_id, Order.thai_bank_account_id,
+            Order.myanmar_bank_account_id, Order.created_at, Order.updated_at,
+        )
+        .outerjoin(TelegramID, TelegramID.id == Order.telegram_id)
+    )
+    if request.args.get('status'):
+        query = query.filter(Order.status == request.args['status'])
+    if request.args.get('type'):
+        query = query.filter(Order.order_type == request.args['type'])
+    if start:
+        query = query.filter(Order.created_at >= start)
+    if end:
+        query = query.filter(Order.created_at < end)
+    return exports.export_response('orders', ORDER_EXPORT_COLUMNS, [query.order_by(Order.created_at, Order.id)])
+
+
+# Keys returned by /orders/api/list when ?fields= is not given
+ORDER_LIST_FIELDS = (
+    'id', 'order_id', 'order_type', 'amount', 'price', 'created_at', 'status', 'version', 'user_id',
+    'thai_bank_account_id', 'myanmar_bank_account_id', 'receipt', 'confirm_receipt', 'user_bank', 'qr',
+)
+
 @orders_bp.route('/api/list', methods=['GET'])
 @login_required
+@conditional_get(_order_list_version)
 def api_order_list():
     status = request.args.get('status')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    fields = order_fields.requested(ORDER_LIST_FIELDS)
 
-    query = Order.query
+    query = Order.query.options(*order_fields.load_options(fields))
     if status:
         query = query.filter_by(status=status)
     query = query.order_by(Order.created_at.desc())
 
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    orders = []
-    for order in pagination.items:
-        orders.append({
-            'id': order.id,
-            'order_id': order.order_id,
-            'order_type': order.order_type,
-            'amount': order.amount,
-            'price': order.price,
-            'created_at': order.created_at.isoformat() if order.created_at else None,
-            'status': order.status,
-            'user_id': order.user_id,
-            'thai_bank_account_id': order.thai_bank_account_id,
-            'myanmar_bank_account_id': order.myanmar_bank_account_id,
-            'receipt': order.receipt,
-            'confirm_receipt': order.confirm_receipt,
-            'user_bank': order.user_bank,
-            'qr': order.qr,
-        })
+    orders = [order_fields.serialize(order, fields) for order in pagination.items]
 
     return {
         'orders': orders,
@@ -85,6 +148,118 @@ def api_order_list():
         'per_page': pagination.per_page
     }
 
+# Most orders one bulk action may change
+BULK_MAX_ORDERS = 200
+
+
+def _status_notification(order, new_status):
+    """Bot webhook payload for an order's new status, or None if the bot isn't told."""
+    if not order.telegram:
+        return None
+    if new_status == 'verified':
+        return BotWebhookClient.order_verified_payload(
+            order_id=order.order_id,
+            telegram_id=order.telegram.telegram_id,
+            chat_id=int(order.telegram.chat_id),
+            amount=order.amount,
+            order_type=order.order_type,
+            price=order.price,
+            user_bank=order.user_bank,
+            receipt=order.receipt
+        )
+    if new_status in ['approved', 'declined']:
+        return BotWebhookClient.order_status_changed_payload(
+            order_id=order.order_id,
+            status=new_status,
+            telegram_id=order.telegram.telegram_id,
+            chat_id=int(order.telegram.chat_id),
+            amount=order.amount,
+            order_type=order.order_type,
+            admin_receipt=order.confirm_receipt
+        )
+    return None
+
+@orders_bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk_update_status():
+    """
+    Change the status of several orders in one transaction.
+
+    Accepts a form (order_ids, status, version_<id>) from the order list, or
+    JSON {"order_ids": [...], "status": ..., "versions": {id: version}}.
+    Orders that changed since the page was loaded, or can't move to the
+    status, are skipped and reported. Bot notifications for the changed
+    orders are sent concurrently after the commit, in the background.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        raw_ids = data.get('order_ids') or []
+        new_status = data.get('status')
+        versions = {str(k): v for k, v in (data.get('versions') or {}).items()}
+    else:
+        raw_ids = request.form.getlist('order_ids')
+        new_status = request.form.get('status')
+        versions = {
+            key[len('version_'):]: value for key, value in request.form.items() if key.startswith('version_')
+        }
+
+    def fail(message):
+        if request.is_json:
+            return jsonify({'error': message}), 400
+        flash(message, "warning")
+        return redirect(request.referrer or url_for('orders.index'))
+
+    if new_status not in order_status.STATUSES:
+        return fail(f"Invalid status. Must be one of: {', '.join(order_status.STATUSES)}")
+    try:
+        order_ids = list(dict.fromkeys(int(order_id) for order_id in raw_ids))
+        expected = {order_id: int(versions[str(order_id)]) for order_id in order_ids if str(order_id) in versions}
+    except (TypeError, ValueError):
+        return fail("order_ids and versions must be integers")
+    if not order_ids:
+        return fail("Select at least one order.")
+    if len(order_ids) > BULK_MAX_ORDERS:
+        return fail(f"At most {BULK_MAX_ORDERS} orders can be changed at once.")
+
+    orders = Order.query.options(
+        joinedload(Order.telegram), undefer_group('receipts')
+    ).filter(Order.id.in_(order_ids)).all()
+    found = {order.id for order in orders}
+
+    updated = []
+    skipped = [{'id': order_id, 'error': 'Order not found'} for order_id in order_ids if order_id not in found]
+    for order in orders:
+        try:
+            if order_status.transition(order, new_status, expected.get(order.id)):
+                updated.append(order)
+        except StatusConflict as e:
+            skipped.append({'id': order.id, **e.to_dict()})
+
+    # Read everything needed after the commit now, before it expires the orders
+    results = [{'id': order.id, 'order_id': order.order_id, 'version': order.version} for order in updated]
+    telegram_ids = {order.telegram.telegram_id for order in updated if order.telegram}
+    payloads = [payload for payload in (_status_notification(order, new_status) for order in updated) if payload]
+    db.session.commit()
+
+    for telegram_id in telegram_ids:
+        publish_chat_event(telegram_id)
+    get_webhook_client().send_batch_in_background(current_app._get_current_object(), payloads)
+
+    if request.is_json:
+        return jsonify({
+            'status': new_status,
+            'updated': results,
+            'skipped': skipped,
+            'notifications': len(payloads),
+        })
+    if updated:
+        flash(f"{len(updated)} order(s) set to {new_status}.", "success")
+    if skipped:
+        flash(f"{len(skipped)} order(s) skipped: " + "; ".join(
+            f"#{item['id']}: {item['error']}" for item in skipped[:5]
+        ), "warning")
+    return redirect(request.referrer or url_for('orders.index'))
+
 @orders_bp.route('/<int:order_id>', methods=['GET', 'POST'])
 @login_required
 def view_order(order_id):
@@ -103,8 +278,13 @@ def view_order(order_id):
         # Handle "Verify Order" button
         if 'verify_order' in request.form:
             if order.status == 'pending':
-                order.status = 'verified'
+                try:
+                    order_status.transition(order, 'verified', request.form.get('version', type=int))
+                except StatusConflict as e:
+                    flash(e.reason, "warning")
+                    return redirect(url_for('orders.view_order', order_id=order_id))
                 db.session.commit()
+                publish_chat_event(order.telegram.telegram_id if order.telegram else None)
                 flash("Order verified successfully.", "success")
                 
                 # Send webhook notification to bot
@@ -132,7 +312,9 @@ def view_order(order_id):
         
         if 'amount' in request.form:
             print(request.form.get('amount', type=float, default=100))
+            before = order_rollups.contribution(order)
             order.amount = request.form.get('amount', type=float)
+            order_rollups.record_change(before, order)
             db.session.commit()
             flash("Order amount updated.", "success")
             if order.order_type == 'buy':
@@ -153,15 +335,23 @@ def view_order(order_id):
             )
             print(order.telegram.telegram_id)
             db.session.add(message)
+            conversation_summary.record_message(message)
+            search.index_message(message)
             db.session.commit()
+            publish_chat_event(order.telegram.telegram_id)
             return redirect(url_for('orders.view_order', order_id=order_id))
         # Update status
         if 'status' in request.form:
             new_status = request.form.get('status')
-            if new_status in ['pending', 'approved', 'declined']:
+            if new_status in order_status.STATUSES:
                 old_status = order.status
-                order.status = new_status
+                try:
+                    order_status.transition(order, new_status, request.form.get('version', type=int))
+                except StatusConflict as e:
+                    flash(e.reason, "warning")
+                    return redirect(url_for('orders.view_order', order_id=order_id))
                 db.session.commit()
+                publish_chat_event(order.telegram.telegram_id if order.telegram else None)
                 flash("Order status updated.", "success")
                 
                 # Send webhook notification to bot if status changed to approved or declined
@@ -185,11 +375,9 @@ def view_order(order_id):
         if 'upload_confirm_receipt' in request.form and 'confirm_receipt' in request.files:
             file = request.files['confirm_receipt']
             if file and file.filename:
-                # Save file logic here (implement as needed)
-                # Example: save to static/uploads and update order.confirm_receipt
-                filename = f"confirm_receipt_{order_id}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{file.filename}"
-                filepath = f"static/uploads/{filename}"
-                file.save(filepath)
+                # Store the file (deduplicated), then drop the replaced receipt's reference
+                filepath = upload_store.store(file).path
+                upload_store.release(order.confirm_receipt)
                 order.confirm_receipt = f"/{filepath}"
                 
                 # If order is approved, send webhook notification with receipt
@@ -210,22 +398,24 @@ def view_order(order_id):
                         print(f"Error sending webhook notification: {e}")
                 
                 db.session.commit()
+                thumbnails.enqueue(filepath)
                 flash("Confirm_receipt uploaded.", "success")
                 return redirect(url_for('orders.view_order', order_id=order_id))
         if 'upload_receipt' in request.form and 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename:
-                # Save file logic here (implement as needed)
-                # Example: save to static/uploads and update order.receipt
-                filename = f"receipt_{order_id}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{file.filename}"
-                filepath = f"static/uploads/{filename}"
-                file.save(filepath)
+                filepath = upload_store.store(file).path
+                upload_store.release(order.receipt)
                 order.receipt = f"/{filepath}"
                 db.session.commit()
+                thumbnails.enqueue(filepath)
                 flash("Receipt uploaded.", "success")
                 return redirect(url_for('orders.view_order', order_id=order_id))
 
-    return render_template('orders/form.html', order=order, buy_rate=buy_rate, sell_rate=sell_rate)
+    return render_template(
+        'orders/form.html', order=order, buy_rate=buy_rate, sell_rate=sell_rate,
+        next_statuses=order_status.next_statuses(order.status)
+    )
 
 @orders_bp.route('/<int:order_id>/delete', methods=['POST'])    
 @login_required
@@ -234,7 +424,17 @@ def delete_order(order_id):
     if not order:
         flash("Order not found.", "danger")
     else:
+        telegram_pk = order.telegram_id
+        telegram_id = order.telegram.telegram_id if order.telegram else None
+        search.remove_order(order)
+        order_rollups.record_delete(order)
+        for paths in (order.receipt, order.confirm_receipt, order.qr):
+            upload_store.release(paths)
         db.session.delete(order)
+        db.session.flush()
+        latest_orders.refresh(telegram_pk)
+        if telegram_id:
+            conversation_summary.refresh(telegram_id)
         db.session.commit()
         flash("Order deleted.", "success")
     return redirect(url_for('orders.index'))
@@ -0,0 +1,273 @@
+"""
+Full-text search over chat messages and order bank details.
+
+Every message (content, chosen option) and order (order id, user bank) has
+one document in ``search_index``:
+
+- SQLite: an FTS5 virtual table ranked with bm25().
+- PostgreSQL: a regular table with a tsvector column behind a GIN index,
+  ranked with ts_rank_cd().
+
+Documents are keyed by ``ref_id * 2`` for messages and ``ref_id * 2 + 1``
+for orders, so updates and deletes hit a single row by primary key. Write
+paths call ``index_message``/``index_order`` before committing, keeping the
+index in the same transaction as the data. Archived messages keep their
+documents because they keep their ids.
+"""
+import logging
+import re
+
+from sqlalchemy import text, inspect
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'search_index'
+
+KIND_MESSAGE = 'message'
+KIND_ORDER = 'order'
+
+# Characters of the indexed body returned with each hit
+PREVIEW_LENGTH = 200
+
+# Query syntax characters stripped from user input
+_TERM = re.compile(r'[^\s"\'()*:^&|!<>+\-]+')
+
+_SQLITE_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        body, kind UNINDEXED, ref_id UNINDEXED, telegram_id UNINDEXED,
+        tokenize = 'unicode61', prefix = '2 3'
+    )""",
+]
+
+_POSTGRES_SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS {TABLE} (
+        id BIGINT PRIMARY KEY,
+        kind VARCHAR(16) NOT NULL,
+        ref_id INTEGER NOT NULL,
+        telegram_id VARCHAR(255),
+        body TEXT NOT NULL,
+        document TSVECTOR NOT NULL
+    )""",
+    f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_document ON {TABLE} USING GIN (document)",
+]
+
+# Bodies as SQL expressions, shared by the backfill statements
+_MESSAGE_BODY = "TRIM(COALESCE(content, '') || ' ' || COALESCE(chosen_option, ''))"
+_ORDER_BODY = "TRIM(COALESCE(o.order_id, '') || ' ' || COALESCE(o.user_bank, ''))"
+
+_ready = None
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _doc_id(kind, ref_id):
+    return ref_id * 2 + (1 if kind == KIND_ORDER else 0)
+
+
+def ensure_schema():
+    """Create the search table for the current database if it is missing."""
+    global _ready
+    statements = _POSTGRES_SCHEMA if _dialect() == 'postgresql' else _SQLITE_SCHEMA
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+    _ready = True
+
+
+def _is_ready():
+    """Whether the search table exists; checked once per process."""
+    global _ready
+    if _ready is None:
+        _ready = inspect(db.engine).has_table(TABLE)
+        if not _ready:
+            logger.warning(f"{TABLE} table is missing; run init_db.py or flask db upgrade to enable search")
+    return _ready
+
+
+def _upsert(kind, ref_id, telegram_id, body):
+    if not _is_ready():
+        return
+    params = {
+        'id': _doc_id(kind, ref_id), 'kind': kind, 'ref_id': ref_id,
+        'telegram_id': telegram_id, 'body': body,
+    }
+    if _dialect() == 'postgresql':
+        db.session.execute(text(
+            f"INSERT INTO {TABLE} (id, kind, ref_id, telegram_id, body, document) "
+            f"VALUES (:id, :kind, :ref_id, :telegram_id, :body, to_tsvector('simple', :body)) "
+            f"ON CONFLICT (id) DO UPDATE SET telegram_id = EXCLUDED.telegram_id, "
+            f"body = EXCLUDED.body, document = EXCLUDED.document"
+        ), params)
+    else:
+        db.session.execute(text(f"DELETE FROM {TABLE} WHERE rowid = :id"), params)
+        db.session.execute(text(
+            f"INSERT INTO {TABLE} (rowid, body, kind, ref_id, telegram_id) "
+            f"VALUES (:id, :body, :kind, :ref_id, :telegram_id)"
+        ), params)
+
+
+def _remove(kind, ref_id):
+    if not _is_ready():
+        return
+    key = 'id' if _dialect() == 'postgresql' else 'rowid'
+    db.session.execute(text(f"DELETE FROM {TABLE} WHERE {key} = :id"), {'id': _doc_id(kind, ref_id)})
+
+
+def index_message(message):
+    """
+    Add or refresh a message's search document.
+
+    Must be called after ``db.session.add(message)`` and before the commit.
+    """
+    if message.id is None:
+        db.session.flush()
+    body = f"{message.content or ''} {message.chosen_option or ''}".strip()
+    _upsert(KIND_MESSAGE, message.id, message.telegram_id, body)
+
+
+def index_order(order):
+    """
+    Add or refresh an order's search document (order id and user bank).
+
+    Must be called after ``db.session.add(order)`` and before the commit.
+    """
+    if order.id is None:
+        db.session.flush()
+    telegram_id = order.telegram.telegram_id if order.telegram else None
+    body = f"{order.order_id or ''} {order.user_bank or ''}".strip()
+    _upsert(KIND_ORDER, order.id, telegram_id, body)
+
+
+def remove_order(order):
+    """Drop a deleted order's search document."""
+    _remove(KIND_ORDER, order.id)
+
+
+def clear(kind=None):
+    """Delete all search documents, or only those of one kind."""
+    if not _is_ready():
+        return
+    if kind:
+        db.session.execute(text(f"DELETE FROM {TABLE} WHERE kind = :kind"), {'kind': kind})
+    else:
+        db.session.execute(text(f"DELETE FROM {TABLE}"))
+
+
+def _terms(query):
+    return _TERM.findall(query or '')[:16]
+
+
+def _fts5_query(terms):
+    # Quote every term so user input is never parsed as FTS5 syntax; the
+    # last one is a prefix match for search-as-you-type
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _tsquery(terms):
+    quoted = ["'" + term.replace("'", "''") + "'" for term in terms]
+    quoted[-1] += ':*'
+    return ' & '.join(quoted)
+
+
+def search(query, kind=None, page=1, per_page=20):
+    """
+    Ranked full-text search.
+
+    Args:
+        query: Free text typed by the admin
+        kind: Restrict to KIND_MESSAGE or KIND_ORDER (None for both)
+        page: 1-based page number
+        per_page: Hits per page
+
+    Returns:
+        (hits, has_more) where each hit is a dict with kind, ref_id,
+        telegram_id, preview and rank
+    """
+    terms = _terms(query)
+    if not terms or not _is_ready():
+        return [], False
+
+    params = {'limit': per_page + 1, 'offset': (page - 1) * per_page, 'kind': kind}
+    kind_filter = "AND kind = :kind" if kind else ""
+    if _dialect() == 'postgresql':
+        params['q'] = _tsquery(terms)
+        sql = (
+            f"SELECT kind, ref_id, telegram_id, body, ts_rank_cd(document, q) AS rank "
+            f"FROM {TABLE}, to_tsquery('simple', :q) AS q "
+            f"WHERE document @@ q {kind_filter} "
+            f"ORDER BY rank DESC, id DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params['q'] = _fts5_query(terms)
+        # FTS5's hidden rank column is bm25(), lower for better matches
+        sql = (
+            f"SELECT kind, ref_id, telegram_id, body, rank "
+            f"FROM {TABLE} WHERE {TABLE} MATCH :q {kind_filter} "
+            f"ORDER BY rank, rowid DESC LIMIT :limit OFFSET :offset"
+        )
+
+    rows = db.session.execute(text(sql), params).fetchall()
+    hits = [
+        {
+            'kind': row.kind,
+            'ref_id': row.ref_id,
+            'telegram_id': row.telegram_id,
+            'preview': (row.body or '')[:PREVIEW_LENGTH],
+            'rank': float(row.rank),
+        }
+        for row in rows[:per_page]
+    ]
+    return hits, len(rows) > per_page
+
+
+def rebuild():
+    """
+    Re-index every message (hot and archived) and order.
+
+    Returns:
+        Number of documents written
+    """
+    if not _is_ready():
+        ensure_schema()
+    clear()
+    if _dialect() == 'postgresql':
+        columns = "id, kind, ref_id, telegram_id, body, document"
+        message_select = (
+            f"SELECT id * 2, 'message', id, telegram_id, b, to_tsvector('simple', b) "
+            f"FROM (SELECT id, telegram_id, {_MESSAGE_BODY} AS b FROM {{table}}) s"
+        )
+        order_select = (
+            f"SELECT o.id * 2 + 1, 'order', o.id, t.telegram_id, {_ORDER_BODY}, "
+            f"to_tsvector('simple', {_ORDER_BODY}) "
+            f"FROM orders o LEFT JOIN telegram_ids t ON t.id = o.telegram_id"
+        )
+    else:
+        columns = "rowid, kind, ref_id, telegram_id, body"
+        message_select = f"SELECT id * 2, 'message', id, telegram_id, {_MESSAGE_BODY} FROM {{table}}"
+        order_select = (
+            f"SELECT o.id * 2 + 1, 'order', o.id, t.telegram_id, {_ORDER_BODY} "
+            f"FROM orders o LEFT JOIN telegram_ids t ON t.id = o.telegram_id"
+        )
+
+    total = 0
+    for select in (message_select.format(table='messages'),
+                   message_select.format(table='messages_archive'),
+                   order_select):
+        total += db.session.execute(text(f"INSERT INTO {TABLE} ({columns}) {select}")).rowcount
+    db.session.commit()
+    return total
+
+
+def needs_rebuild():
+    """True when messages exist but nothing has been indexed yet."""
+    if not _is_ready():
+        return True
+    has_messages = db.session.execute(text("SELECT 1 FROM messages LIMIT 1")).first() is not None
+    has_documents = db.session.execute(text(f"SELECT 1 FROM {TABLE} LIMIT 1")).first() is not None
+    return has_messages and not has_documents
@@ -16,3 +16,35 @@ ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "password")
 # Bot Webhook Configuration
 BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL", "")
 BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET", "")
+BOT_WEBHOOK_BATCH_WORKERS = int(os.getenv("BOT_WEBHOOK_BATCH_WORKERS", "8"))  # Concurrent deliveries for bulk order actions
+
+# Admin chat Server-Sent Events
+CHAT_STREAM_POLL_SECONDS = float(os.getenv("CHAT_STREAM_POLL_SECONDS", "3"))  # Re-check interval for changes from other workers
+CHAT_STREAM_KEEPALIVE_SECONDS = float(os.getenv("CHAT_STREAM_KEEPALIVE_SECONDS", "15"))
+CHAT_STREAM_MAX_SECONDS = float(os.getenv("CHAT_STREAM_MAX_SECONDS", "300"))  # Browser reconnects with Last-Event-ID
+
+# Chat message archival (see archive_messages.py)
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", "90"))
+MESSAGE_ARCHIVE_BATCH_SIZE = int(os.getenv("MESSAGE_ARCHIVE_BATCH_SIZE", "1000"))
+
+# Bot message claiming (/api/message/claim)
+MESSAGE_CLAIM_MAX_WAIT_SECONDS = float(os.getenv("MESSAGE_CLAIM_MAX_WAIT_SECONDS", "30"))  # Long-poll cap
+
+# Content-addressed upload store (see upload_store.py)
+UPLOAD_BLOB_DIR = os.getenv("UPLOAD_BLOB_DIR", "static/uploads/blobs")
+
+# Receipt/chat image thumbnails (see thumbnails.py)
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "static/uploads/thumbs")
+THUMBNAIL_MAX_SIZE = int(os.getenv("THUMBNAIL_MAX_SIZE", "320"))  # Longest edge in pixels
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))  # JPEG quality
+
+# Idempotency-Key replay window for bot submit endpoints (see idempotency.py)
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+
+# In-process cache for bot reads of settings and banks (see read_cache.py)
+READ_CACHE_TTL_SECONDS = float(os.getenv("READ_CACHE_TTL_SECONDS", "300"))
+READ_CACHE_CHECK_SECONDS = float(os.getenv("READ_CACHE_CHECK_SECONDS", "1"))  # Re-read cache_versions at most this often
+
+# Per-request SQL query counting (see query_counter.py)
+QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "0") == "1"  # Add X-Query-Count to responses
+QUERY_COUNT_WARN_THRESHOLD = int(os.getenv("QUERY_COUNT_WARN_THRESHOLD", "50"))  # Log requests above this; 0 disables
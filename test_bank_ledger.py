@@ -0,0 +1,131 @@
+"""
+Concurrency test for the bank balance ledger.
+
+Fires hundreds of parallel /api/banks/update-balance requests, each one
+sent twice, against a scratch SQLite database. Checks that every order moved
+each balance exactly once, that no increment was lost, and that the ledger's
+running balances chain up to the final amount.
+"""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Point the app at a scratch database before it is imported
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'bank_ledger_test.db')
+
+from app import app
+from models import db, BankTransaction, MyanmarBankAccount, ThaiBankAccount
+import bank_ledger
+
+PARALLEL_ORDERS = 200
+WORKERS = 32
+THAI_OPENING = 10000.0
+MYANMAR_OPENING = 5000000.0
+
+
+def setup_database():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        thai = ThaiBankAccount(bank_name='KBank', account_number='111', account_name='Thai')
+        myanmar = MyanmarBankAccount(bank_name='KBZ', account_number='222', account_name='Myanmar')
+        db.session.add_all([thai, myanmar])
+        db.session.flush()
+        bank_ledger.apply('thai', thai.id, THAI_OPENING, note='Opening balance')
+        bank_ledger.apply('myanmar', myanmar.id, MYANMAR_OPENING, note='Opening balance')
+        db.session.commit()
+        return thai.id, myanmar.id
+
+
+def order_change(number):
+    """Deterministic per-order deltas: buys add baht and pay out kyat, sells the reverse."""
+    sign = 1 if number % 2 else -1
+    return f"ORDER{number:04d}", sign * (10 + number % 7), -sign * (1250 + number % 11)
+
+
+def update_balance(args):
+    thai_id, myanmar_id, number = args
+    order_id, thai_change, myanmar_change = order_change(number)
+    response = app.test_client().post('/api/banks/update-balance', json={
+        'order_id': order_id,
+        'order_type': 'buy' if thai_change > 0 else 'sell',
+        'thai_bank_id': thai_id,
+        'thai_amount_change': thai_change,
+        'myanmar_bank_id': myanmar_id,
+        'myanmar_amount_change': myanmar_change,
+    })
+    return response.status_code, response.get_json()
+
+
+def assert_chain(bank_type, bank_id, expected_balance):
+    entries = (
+        BankTransaction.query
+        .filter_by(bank_type=bank_type, bank_account_id=bank_id)
+        .order_by(BankTransaction.id)
+        .all()
+    )
+    running = 0.0
+    for entry in entries:
+        running += entry.delta
+        assert abs(entry.balance_after - running) < 1e-6, f"Entry {entry.id} breaks the running balance"
+    assert abs(running - expected_balance) < 1e-6
+    assert abs(bank_ledger.drift(bank_type, bank_id)) < 1e-6
+    return len(entries)
+
+
+def test_parallel_updates_do_not_drift():
+    """Concurrent and repeated updates leave balance == opening + sum of order deltas."""
+    print("\n" + "=" * 80)
+    print(f"TEST: {PARALLEL_ORDERS} orders x 2 parallel balance updates")
+    print("=" * 80)
+    thai_id, myanmar_id = setup_database()
+
+    # Every order twice, the copies interleaved with other orders
+    jobs = [(thai_id, myanmar_id, number) for number in range(PARALLEL_ORDERS)] * 2
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(update_balance, jobs))
+
+    failed = [r for r in results if r[0] != 200]
+    print(f"✅ Successful requests: {len(results) - len(failed)}")
+    assert not failed, f"Failed requests: {failed[:5]}"
+    # Each order and side is applied by exactly one of its two requests
+    replays = sum(1 for _, body in results for bank in body['updated_banks'] if bank['replayed'])
+    print(f"🔁 Replayed bank updates: {replays}")
+    assert replays == 2 * PARALLEL_ORDERS
+
+    expected_thai = THAI_OPENING + sum(order_change(n)[1] for n in range(PARALLEL_ORDERS))
+    expected_myanmar = MYANMAR_OPENING + sum(order_change(n)[2] for n in range(PARALLEL_ORDERS))
+    with app.app_context():
+        thai_amount = db.session.get(ThaiBankAccount, thai_id).amount
+        myanmar_amount = db.session.get(MyanmarBankAccount, myanmar_id).amount
+        print(f"💰 Thai balance {thai_amount:.2f} (expected {expected_thai:.2f})")
+        print(f"💰 Myanmar balance {myanmar_amount:.2f} (expected {expected_myanmar:.2f})")
+        assert abs(thai_amount - expected_thai) < 1e-6
+        assert abs(myanmar_amount - expected_myanmar) < 1e-6
+
+        assert assert_chain('thai', thai_id, expected_thai) == PARALLEL_ORDERS + 1
+        assert assert_chain('myanmar', myanmar_id, expected_myanmar) == PARALLEL_ORDERS + 1
+    print("✅ One ledger entry per order and side, running balances consistent, no drift")
+
+
+def test_replay_returns_original_entry():
+    """A retried update reports the first request's balances and changes nothing."""
+    print("\n" + "=" * 80)
+    print("TEST: Retried balance update")
+    print("=" * 80)
+    thai_id, myanmar_id = setup_database()
+
+    first = update_balance((thai_id, myanmar_id, 1))[1]
+    second = update_balance((thai_id, myanmar_id, 1))[1]
+    assert not first['replayed'] and second['replayed']
+    assert [b['new_balance'] for b in first['updated_banks']] == [b['new_balance'] for b in second['updated_banks']]
+    with app.app_context():
+        assert BankTransaction.query.filter_by(order_id='ORDER0001').count() == 2
+    print("✅ Retry returned the original entries")
+
+
+if __name__ == "__main__":
+    test_parallel_updates_do_not_drift()
+    test_replay_returns_original_entry()
+    print("\n✅ All bank ledger tests passed")
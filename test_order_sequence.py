@@ -0,0 +1,100 @@
+"""
+Concurrency test for the per-day order number sequence.
+
+Fires hundreds of parallel /api/orders/submit requests against a scratch
+SQLite database and checks that every order got a distinct, gap-free
+DDMMYYA####B/S number, and that numbers already taken by older orders are
+skipped transparently.
+"""
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Point the app at a scratch database before it is imported
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'order_sequence_test.db')
+
+from app import app
+from models import db, Order, OrderSequence, TelegramID
+
+CHAT_ID = '2060245779'
+PARALLEL_SUBMITS = 300
+WORKERS = 32
+
+
+def setup_database():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(TelegramID(telegram_id='test_user', chat_id=CHAT_ID))
+        db.session.commit()
+
+
+def submit_order(order_type='buy'):
+    client = app.test_client()
+    response = client.post('/api/orders/submit', data={
+        'order_type': order_type,
+        'amount': '100',
+        'price': '0.5',
+        'chat_id': CHAT_ID,
+    })
+    return response.status_code, response.get_json()
+
+
+def test_parallel_submits_get_unique_numbers():
+    """Parallel submits never share an order number."""
+    print("\n" + "=" * 80)
+    print(f"TEST: {PARALLEL_SUBMITS} parallel order submissions")
+    print("=" * 80)
+    setup_database()
+
+    order_types = ['buy' if i % 2 else 'sell' for i in range(PARALLEL_SUBMITS)]
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(submit_order, order_types))
+
+    failed = [r for r in results if r[0] != 201]
+    print(f"✅ Successful submits: {len(results) - len(failed)}")
+    assert not failed, f"Failed submits: {failed[:5]}"
+
+    order_ids = [body['order_id'] for _, body in results]
+    assert len(set(order_ids)) == PARALLEL_SUBMITS, "Duplicate order_id handed out"
+
+    date_str = datetime.now().strftime("%d%m%y")
+    numbers = sorted(int(re.match(rf'^{date_str}A(\d{{4}})[BS]$', oid).group(1)) for oid in order_ids)
+    assert numbers == list(range(1, PARALLEL_SUBMITS + 1)), "Numbers are not 1..N"
+    print(f"✅ {PARALLEL_SUBMITS} distinct order IDs, numbered 1..{PARALLEL_SUBMITS}")
+
+    with app.app_context():
+        assert Order.query.count() == PARALLEL_SUBMITS
+        sequence = OrderSequence.query.get(datetime.now().date())
+        assert sequence.last_value == PARALLEL_SUBMITS
+    print("✅ Sequence row matches the number of orders")
+
+
+def test_collision_with_existing_order_is_retried():
+    """Numbers taken before the sequence existed are skipped."""
+    print("\n" + "=" * 80)
+    print("TEST: Collision with a pre-existing order number")
+    print("=" * 80)
+    setup_database()
+
+    date_str = datetime.now().strftime("%d%m%y")
+    with app.app_context():
+        # Orders numbered by the old COUNT()-based scheme, no sequence row yet
+        for number in (1, 2):
+            db.session.add(Order(order_type='buy', amount=1, price=1, order_id=f"{date_str}A{number:04d}B"))
+        db.session.commit()
+
+    status, body = submit_order('buy')
+    print(f"📝 Got order_id {body.get('order_id')}")
+    assert status == 201
+    assert body['order_id'] == f"{date_str}A0003B"
+    print("✅ Taken numbers skipped transparently")
+
+
+if __name__ == "__main__":
+    test_parallel_submits_get_unique_numbers()
+    test_collision_with_existing_order_is_retried()
+    print("\n✅ All order sequence tests passed")
@@ -0,0 +1,88 @@
+"""
+Query-count tests for the admin list and detail pages.
+
+Renders each page against a scratch SQLite database with one customer's
+worth of data, then again with many, and checks the X-Query-Count header
+(query_counter.py) stays the same: related rows are eager-loaded with the
+page instead of lazily per row.
+"""
+import os
+import tempfile
+
+# Point the app at a scratch database before it is imported
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'query_counts_test.db')
+
+from app import app
+from models import (
+    db, ExchangeRate, MyanmarBankAccount, Order, TelegramID, ThaiBankAccount, User,
+)
+
+
+def setup_database(customers):
+    """Create ``customers`` customers, each with one buy and one sell order."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(ExchangeRate(buy=1.0, sell=1.0))
+        thai = ThaiBankAccount(bank_name='KBank', account_number='111', account_name='Thai')
+        myanmar = MyanmarBankAccount(bank_name='KBZ', account_number='222', account_name='Myanmar')
+        db.session.add_all([thai, myanmar])
+        for i in range(customers):
+            user = User(name=f'user{i}', phone=f'0900{i:04d}', password='x')
+            telegram = TelegramID(telegram_id=f'tg{i}', chat_id=str(1000 + i))
+            db.session.add_all([user, telegram])
+            db.session.flush()
+            for order_type in ('buy', 'sell'):
+                db.session.add(Order(
+                    order_id=f'{i:04d}{order_type[0].upper()}', order_type=order_type, amount=100, price=0.5,
+                    status='pending', user_id=user.id, telegram_id=telegram.id,
+                    thai_bank_account_id=thai.id, myanmar_bank_account_id=myanmar.id,
+                ))
+        db.session.commit()
+        return Order.query.order_by(Order.id.desc()).first().id
+
+
+def query_count(url):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    response = client.get(url)
+    assert response.status_code == 200, f"{url} returned {response.status_code}"
+    return int(response.headers['X-Query-Count'])
+
+
+def counts_for(customers):
+    order_pk = setup_database(customers)
+    return {
+        'orders list': query_count('/orders/'),
+        'order detail': query_count(f'/orders/{order_pk}'),
+        'users list': query_count('/users'),
+        'chat list': query_count('/messages/'),
+        'order list api': query_count('/orders/api/list'),
+    }
+
+
+def test_list_pages_cost_constant_queries():
+    """A full page of orders costs as many queries as a single order."""
+    print("\n" + "=" * 80)
+    print("TEST: Query counts with 1 vs 15 customers")
+    print("=" * 80)
+    app.config['QUERY_COUNT_HEADER'] = True
+    try:
+        single = counts_for(1)
+        many = counts_for(15)
+    finally:
+        app.config['QUERY_COUNT_HEADER'] = False
+
+    for page in single:
+        print(f"📊 {page}: {single[page]} queries with 1 customer, {many[page]} with 15")
+    assert many == single, "Query count grows with the number of rows"
+    assert single['orders list'] <= 3
+    assert single['order detail'] <= 2
+    print("✅ Query counts do not depend on the number of rows")
+
+
+if __name__ == "__main__":
+    test_list_pages_cost_constant_queries()
+    print("\n✅ All query count tests passed")
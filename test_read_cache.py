@@ -0,0 +1,183 @@
+"""
+Tests for the bot read cache (read_cache.py) and /api/bot/context.
+
+Repeated /api/settings/ and /api/banks/ reads must be served from memory,
+and admin writes must be visible on the next read.
+"""
+import os
+import tempfile
+import threading
+
+# Point the app at a scratch database before it is imported
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'read_cache_test.db')
+
+from app import app
+from models import db, AuthFeature, CacheVersion, ExchangeRate, MaintenanceMode, Order, TelegramID, ThaiBankAccount
+import latest_orders
+import read_cache
+
+
+def setup_database():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            MaintenanceMode(on=False),
+            AuthFeature(on=False),
+            ExchangeRate(buy=1.0, sell=2.0),
+            ThaiBankAccount(bank_name='KBank', account_number='111', account_name='Thai', on=True, amount=100.0),
+        ])
+        db.session.commit()
+    # Start every test with an empty cache
+    read_cache.forget(read_cache.SETTINGS)
+    read_cache.forget(read_cache.BANKS)
+
+
+def admin_client():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+    return client
+
+
+def query_count(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, f"{url} returned {response.status_code}"
+    return int(response.headers['X-Query-Count']), response.get_json()
+
+
+def test_repeated_reads_skip_the_database():
+    """Second and later reads of settings and banks run no queries."""
+    print("\n" + "=" * 80)
+    print("TEST: Cached reads")
+    print("=" * 80)
+    setup_database()
+    client = admin_client()
+    app.config['QUERY_COUNT_HEADER'] = True
+    try:
+        for url in ('/api/settings/', '/api/banks/thai', '/api/banks/balances'):
+            first, body = query_count(client, url)
+            second, cached = query_count(client, url)
+            print(f"📊 {url}: {first} queries, then {second}")
+            assert cached == body
+            assert second == 0, f"{url} hit the database on a cached read"
+    finally:
+        app.config['QUERY_COUNT_HEADER'] = False
+
+    stats = client.get('/api/settings/cache-stats').get_json()
+    print(f"📊 Stats: {stats}")
+    assert stats['settings']['hits'] >= 1 and stats['banks']['hits'] >= 2
+    assert app.test_client().get('/api/settings/cache-stats').status_code == 302
+    print("✅ Repeated reads are served from the cache")
+
+
+def test_admin_writes_invalidate():
+    """Dashboard saves and balance updates show up on the next read."""
+    print("\n" + "=" * 80)
+    print("TEST: Invalidation on write")
+    print("=" * 80)
+    setup_database()
+    client = admin_client()
+    assert client.get('/api/settings/').get_json()['buy'] == 1.0
+    assert client.get('/api/banks/balances').get_json() == {'KBank': 100.0}
+
+    client.post('/dashboard', data={
+        'maintenance_status': 'true', 'auth_feature_status': 'false', 'buy': '3.5', 'sell': '4.5',
+    })
+    settings = client.get('/api/settings/').get_json()
+    print(f"⚙️  After dashboard save: {settings}")
+    assert settings['buy'] == 3.5 and settings['maintenance_mode'] is True
+
+    client.post('/api/banks/update-balance', json={
+        'order_id': 'T0001', 'order_type': 'buy', 'thai_bank_id': 1, 'thai_amount_change': 25.0,
+    })
+    balances = client.get('/api/banks/balances').get_json()
+    print(f"🏦 After order: {balances}")
+    assert balances == {'KBank': 125.0}
+
+    with app.app_context():
+        versions = dict(db.session.query(CacheVersion.name, CacheVersion.version))
+    print(f"🔢 Versions: {versions}")
+    assert versions['settings'] >= 1 and versions['banks'] >= 1
+    print("✅ Writes invalidate the cache")
+
+
+def test_no_stale_reload_before_commit():
+    """A read racing an uncommitted write must not keep the old rows afterwards."""
+    print("\n" + "=" * 80)
+    print("TEST: Read between bump and commit")
+    print("=" * 80)
+    setup_database()
+    with app.app_context():
+        assert read_cache.settings()['buy'] == 1.0
+        ExchangeRate.query.first().buy = 7.0
+        read_cache.bump(read_cache.SETTINGS)
+        db.session.flush()
+
+        # Another request in this worker reads before the writer commits
+        seen = []
+
+        def concurrent_read():
+            with app.app_context():
+                seen.append(read_cache.settings()['buy'])
+
+        reader = threading.Thread(target=concurrent_read)
+        reader.start()
+        reader.join()
+        db.session.commit()
+        after = read_cache.settings()['buy']
+    print(f"⚙️  Concurrent read saw {seen[0]}, read after commit saw {after}")
+    assert seen == [1.0]
+    assert after == 7.0, "Writer's own worker served the pre-write rows after commit"
+    print("✅ Entries are dropped after the commit, not before")
+
+
+def test_bot_context():
+    """One call returns settings, banks and the pending order; warm calls cost one query."""
+    print("\n" + "=" * 80)
+    print("TEST: /api/bot/context")
+    print("=" * 80)
+    setup_database()
+    with app.app_context():
+        pending = TelegramID(telegram_id='tg1', chat_id='100')
+        done = TelegramID(telegram_id='tg2', chat_id='200')
+        db.session.add_all([pending, done])
+        db.session.flush()
+        for telegram, status in ((pending, 'pending'), (done, 'approved')):
+            order = Order(
+                order_id=f'C{telegram.id:04d}', order_type='buy', amount=100, price=0.5,
+                status=status, telegram_id=telegram.id,
+            )
+            db.session.add(order)
+            db.session.flush()
+            latest_orders.record_order(order)
+        db.session.commit()
+
+    client = app.test_client()
+    app.config['QUERY_COUNT_HEADER'] = True
+    try:
+        query_count(client, '/api/bot/context?chat_id=100')
+        queries, context = query_count(client, '/api/bot/context?chat_id=100')
+    finally:
+        app.config['QUERY_COUNT_HEADER'] = False
+    print(f"📊 Warm call: {queries} queries")
+    assert queries == 1
+    assert context['settings'] == client.get('/api/settings/').get_json()
+    assert context['banks']['thai'] == client.get('/api/banks/thai').get_json()
+    assert context['has_pending'] and context['order']['order_id'] == 'C0001'
+
+    context = client.get('/api/bot/context?chat_id=200&fields=order_id').get_json()
+    assert context['known_chat'] and not context['has_pending'] and context['order'] is None
+    context = client.get('/api/bot/context?chat_id=999').get_json()
+    assert not context['known_chat'] and context['order'] is None
+    assert client.get('/api/bot/context').status_code == 400
+    print("✅ Bot context matches the individual endpoints")
+
+
+if __name__ == "__main__":
+    test_repeated_reads_skip_the_database()
+    test_admin_writes_invalidate()
+    test_no_stale_reload_before_commit()
+    test_bot_context()
+    print("\n✅ All read cache tests passed")
@@ -0,0 +1,114 @@
+"""
+Tests for "confirmed" receipt messages approving the latest order.
+
+A receipt sent through /api/message/submit approves a verified order. An
+order that may not move to approved (e.g. still pending) gets a 409 with
+the allowed moves, and nothing is written: no message, no receipt and no
+stray image references.
+"""
+import io
+import os
+import tempfile
+
+# Point the app at a scratch database before it is imported
+_db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'receipt_approval_test.db')
+
+from app import app
+from models import db, Message, Order, TelegramID, UploadBlob
+import latest_orders
+
+
+def setup_database(status):
+    """One customer whose latest order has ``status``."""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        telegram = TelegramID(telegram_id='tg1', chat_id='100')
+        db.session.add(telegram)
+        db.session.flush()
+        order = Order(
+            order_id='R0001', order_type='buy', amount=100, price=0.5, status=status, telegram_id=telegram.id,
+        )
+        db.session.add(order)
+        db.session.flush()
+        latest_orders.record_order(order)
+        db.session.commit()
+
+
+def remove_blobs():
+    """Delete the receipt files the test stored."""
+    with app.app_context():
+        for (path,) in db.session.query(UploadBlob.path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def submit_receipt(content=b'receipt-image'):
+    return app.test_client().post('/api/message/submit', data={
+        'telegram_id': 'tg1',
+        'chat_id': '100',
+        'content': 'confirmed',
+        'from_bot': 'true',
+        'receipt': (io.BytesIO(content), 'receipt.jpg'),
+    }, content_type='multipart/form-data')
+
+
+def order_state():
+    with app.app_context():
+        order = Order.query.filter_by(order_id='R0001').one()
+        return order.status, order.confirm_receipt
+
+
+def test_receipt_approves_verified_order():
+    """verified -> approved: 201, and the order carries the receipt."""
+    print("\n" + "=" * 80)
+    print("TEST: Receipt for a verified order")
+    print("=" * 80)
+    setup_database('verified')
+    try:
+        response = submit_receipt()
+        status, receipt = order_state()
+        with app.app_context():
+            messages = Message.query.count()
+            references = db.session.query(UploadBlob.ref_count).scalar()
+    finally:
+        remove_blobs()
+    print(f"📨 {response.status_code}, order now {status}, receipt {receipt}")
+    assert response.status_code == 201
+    assert status == 'approved'
+    assert receipt and receipt.startswith('/')
+    assert messages == 1
+    assert references == 2, "Receipt should be referenced by the message and the order"
+    print("✅ Verified order approved with its receipt")
+
+
+def test_receipt_for_pending_order_conflicts():
+    """pending -> approved is not allowed: 409, and nothing is written."""
+    print("\n" + "=" * 80)
+    print("TEST: Receipt for a pending order")
+    print("=" * 80)
+    setup_database('pending')
+    try:
+        response = submit_receipt(b'another-receipt')
+        body = response.get_json()
+        status, receipt = order_state()
+        with app.app_context():
+            messages = Message.query.count()
+            references = db.session.query(UploadBlob.ref_count).scalar()
+    finally:
+        remove_blobs()
+    print(f"📨 {response.status_code} {body}")
+    assert response.status_code == 409
+    assert body['status'] == 'pending' and body['requested_status'] == 'approved'
+    assert 'verified' in body['allowed']
+    assert status == 'pending' and receipt is None
+    assert messages == 0
+    assert references == 0, "Stored upload should be given back"
+    print("✅ Pending order left untouched, upload reference given back")
+
+
+if __name__ == "__main__":
+    test_receipt_approves_verified_order()
+    test_receipt_for_pending_order_conflicts()
+    print("\n✅ All receipt approval tests passed")
@@ -0,0 +1,155 @@
+"""
+Background thumbnail generation for receipt and chat images.
+
+Upload routes call ``enqueue(paths)`` after storing files. A single daemon
+worker thread per process then writes a resized, re-encoded JPEG for each
+image to::
+
+    static/uploads/thumbs/<THUMBNAIL_MAX_SIZE>/<path below static/uploads>.jpg
+
+Uploaded files are never rewritten in place (content-addressed blobs and
+uuid names), so a thumbnail never goes stale and can be cached forever.
+Pillow is optional: without it nothing is generated and the thumbnail route
+falls back to the original image.
+"""
+import logging
+import os
+import queue
+import threading
+
+from settings import THUMBNAIL_DIR, THUMBNAIL_MAX_SIZE, THUMBNAIL_QUALITY
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = 'static/uploads/'
+
+# Extensions Pillow is asked to decode
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.heic'}
+
+
+def source_path(path):
+    """
+    Normalize a stored upload path ('/static/uploads/...' or 'static/uploads/...').
+
+    Returns:
+        Relative path below static/uploads, or None if the path points
+        anywhere else (including '..' tricks)
+    """
+    path = os.path.normpath((path or '').strip().lstrip('/')).replace('\\', '/')
+    if not path.startswith(UPLOAD_ROOT) or path.startswith(THUMBNAIL_DIR.rstrip('/') + '/'):
+        return None
+    if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS:
+        return None
+    return path
+
+
+def thumbnail_path(source):
+    """Where the thumbnail of a normalized source path is cached."""
+    relative = source[len(UPLOAD_ROOT):]
+    return os.path.join(THUMBNAIL_DIR, str(THUMBNAIL_MAX_SIZE), relative + '.jpg').replace('\\', '/')
+
+
+def available():
+    """Whether thumbnails can be generated in this process."""
+    return Image is not None
+
+
+def generate(source):
+    """
+    Write the thumbnail for one normalized source path.
+
+    Returns:
+        Thumbnail path, or None if the source is missing or not an image
+    """
+    target = thumbnail_path(source)
+    if os.path.exists(target):
+        return target
+    if not available() or not os.path.isfile(source):
+        return None
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)  # Phone photos carry rotation in EXIF
+            image.thumbnail((THUMBNAIL_MAX_SIZE, THUMBNAIL_MAX_SIZE))
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp = f"{target}.{threading.get_ident()}.part"
+            image.save(temp, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+        os.replace(temp, target)
+        return target
+    except Exception as e:
+        logger.warning(f"Could not create thumbnail for {source}: {e}")
+        return None
+
+
+class ThumbnailWorker:
+    """Daemon thread draining a queue of source paths."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='thumbnail-worker', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, source):
+        with self._lock:
+            if source in self._pending:
+                return
+            self._pending.add(source)
+        self._queue.put(source)
+
+    def join(self):
+        """Block until everything queued so far is processed."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            source = self._queue.get()
+            try:
+                generate(source)
+            finally:
+                with self._lock:
+                    self._pending.discard(source)
+                self._queue.task_done()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_thumbnail_worker() -> ThumbnailWorker:
+    """
+    Get the process-wide thumbnail worker, starting it on first use.
+
+    Returns:
+        ThumbnailWorker singleton
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = ThumbnailWorker()
+        return _worker
+
+
+def enqueue(paths):
+    """
+    Queue thumbnails for uploaded images.
+
+    Args:
+        paths: A path, a comma-separated path list as stored on orders and
+            messages, or an iterable of paths
+    """
+    if not available() or not paths:
+        return
+    if isinstance(paths, str):
+        paths = paths.split(',')
+    for path in paths:
+        source = source_path(path)
+        if source and not os.path.exists(thumbnail_path(source)):
+            get_thumbnail_worker().enqueue(source)
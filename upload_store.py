@@ -0,0 +1,251 @@
+"""
+Content-addressed store for uploaded receipts, QR codes and chat images.
+
+``store(file)`` streams an upload to disk in chunks while hashing it, and
+keeps one copy per distinct content under a sharded path::
+
+    static/uploads/blobs/ab/cd/abcd...<sha256>.jpg
+
+Every reference to a blob is counted in ``upload_blobs.ref_count``.
+``release(path)`` drops a reference, inside the caller's transaction, when
+an order stops pointing at the file, and ``collect_garbage()`` deletes
+blobs left without references. Paths stay under ``static/`` so existing
+``/static/...`` URLs and templates keep working.
+"""
+import hashlib
+import os
+import tempfile
+
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from models import db, now_mmt, UploadBlob
+from settings import UPLOAD_BLOB_DIR
+
+# Bytes read per chunk while streaming an upload to disk
+CHUNK_SIZE = 64 * 1024
+
+
+class StoredUpload:
+    """Handle for one counted reference to a stored blob."""
+
+    def __init__(self, sha256, path, size, created):
+        self.sha256 = sha256
+        self.path = path
+        self.size = size
+        self.created = created  # False when identical bytes were already stored
+
+    def __repr__(self):
+        return f"<StoredUpload {self.path} ({self.size} bytes)>"
+
+
+def _extension(filename):
+    ext = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    return ext if len(ext) <= 10 else ''
+
+
+def blob_path(sha256, ext=''):
+    """Sharded location of a blob: <root>/ab/cd/<sha256><ext>."""
+    return os.path.join(UPLOAD_BLOB_DIR, sha256[:2], sha256[2:4], sha256 + ext).replace('\\', '/')
+
+
+def _stream_to_temp(stream):
+    """Copy a stream into a temp file next to the blobs, hashing as it goes."""
+    os.makedirs(UPLOAD_BLOB_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_BLOB_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+
+def _add_reference(conn, sha256, path, size):
+    """Count one more reference, creating the blob row on first use. Returns True if created."""
+    table = UploadBlob.__table__
+    increment = update(table).where(table.c.sha256 == sha256).values(ref_count=table.c.ref_count + 1)
+    if conn.execute(increment).rowcount:
+        return False
+    try:
+        with conn.begin_nested():
+            conn.execute(insert(table).values(
+                sha256=sha256, path=path, size=size, ref_count=1, created_at=now_mmt()
+            ))
+    except IntegrityError:
+        # Stored concurrently by another request
+        conn.execute(increment)
+        return False
+    return True
+
+
+def _place(temp_path, sha256, size, ext):
+    """Move a hashed temp file to its blob path, or drop it if already stored."""
+    table = UploadBlob.__table__
+    # The reference is committed on its own, before the file is touched, so
+    # a concurrent collect_garbage() never deletes a blob being stored and
+    # the caller's session never holds a lock on upload_blobs. A request
+    # that fails later leaves one extra reference, which only delays
+    # garbage collection of that blob.
+    with db.engine.begin() as conn:
+        path = conn.execute(select(table.c.path).where(table.c.sha256 == sha256)).scalar()
+        path = path or blob_path(sha256, ext)
+        row_created = _add_reference(conn, sha256, path, size)
+    # A new row always gets our copy: a file still on disk may belong to a
+    # blob collect_garbage() just deleted and is about to unlink
+    created = row_created or not os.path.exists(path)
+    if created:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    else:
+        os.remove(temp_path)
+    return StoredUpload(sha256, path, size, created)
+
+
+def store(file):
+    """
+    Store an uploaded file and take a reference to it.
+
+    Call it before the request writes anything else: the reference is
+    committed on a separate connection, which would wait on the request's
+    own write lock on SQLite.
+
+    Args:
+        file: werkzeug FileStorage (or any object with ``stream`` and ``filename``)
+
+    Returns:
+        StoredUpload
+    """
+    temp_path, sha256, size = _stream_to_temp(getattr(file, 'stream', file))
+    return _place(temp_path, sha256, size, _extension(getattr(file, 'filename', '')))
+
+
+def adopt(path):
+    """
+    Move an existing file into the store without counting a reference.
+
+    Used by dedupe_uploads.py for files saved before the store existed; an
+    identical file already in the store replaces it.
+
+    Returns:
+        Blob path now holding the file's content
+    """
+    with open(path, 'rb') as source:
+        temp_path, sha256, size = _stream_to_temp(source)
+    existing = db.session.query(UploadBlob).get(sha256)
+    if existing is None:
+        existing = UploadBlob(sha256=sha256, path=blob_path(sha256, _extension(path)), size=size, ref_count=0)
+        db.session.add(existing)
+    if os.path.exists(existing.path):
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(existing.path), exist_ok=True)
+        os.replace(temp_path, existing.path)
+    if os.path.abspath(path) != os.path.abspath(existing.path):
+        os.remove(path)
+    return existing.path
+
+
+def _normalize(path):
+    return (path or '').strip().lstrip('/')
+
+
+def is_blob_path(path):
+    """Whether a stored path (with or without a leading slash) points into the store."""
+    root = UPLOAD_BLOB_DIR.rstrip('/') + '/'
+    return _normalize(path).startswith(root)
+
+
+def _paths(paths):
+    for path in (paths or '').split(','):
+        path = _normalize(path)
+        if path and is_blob_path(path):
+            yield path
+
+
+def retain(paths):
+    """
+    Take one more reference to each blob in ``paths``, in the caller's transaction.
+
+    For rows that start pointing at files another row already stored, e.g.
+    an order adopting a chat message's receipt images. Accepts the same
+    comma-separated lists as ``release``.
+    """
+    for path in _paths(paths):
+        db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.path == path)
+            .values(ref_count=UploadBlob.ref_count + 1)
+        )
+
+
+def release(paths):
+    """
+    Drop one reference to each blob in ``paths``.
+
+    Accepts a single path or a comma-separated list as stored on orders and
+    messages; paths outside the store are ignored. Files are not deleted
+    here: ``collect_garbage`` removes blobs left without references.
+    """
+    for path in _paths(paths):
+        db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.path == path, UploadBlob.ref_count > 0)
+            .values(ref_count=UploadBlob.ref_count - 1)
+        )
+
+
+def discard(paths):
+    """
+    Give back references ``store()`` took for a request that is not going ahead.
+
+    Committed on its own connection, like the references themselves, so
+    call it after the request's session has rolled back (or before it
+    writes). Accepts a path list or a comma-separated string.
+    """
+    if not isinstance(paths, str):
+        paths = ','.join(paths or ())
+    paths = list(_paths(paths))
+    if not paths:
+        return
+    table = UploadBlob.__table__
+    with db.engine.begin() as conn:
+        for path in paths:
+            conn.execute(
+                update(table)
+                .where(table.c.path == path, table.c.ref_count > 0)
+                .values(ref_count=table.c.ref_count - 1)
+            )
+
+
+def collect_garbage():
+    """
+    Delete blobs that no row references any more, files included.
+
+    Returns:
+        Number of blobs deleted
+    """
+    deleted = 0
+    for sha256, path in db.session.query(UploadBlob.sha256, UploadBlob.path).filter(UploadBlob.ref_count <= 0).all():
+        # Conditional delete: a concurrent store() may have re-referenced it
+        removed = db.session.execute(
+            delete(UploadBlob).where(UploadBlob.sha256 == sha256, UploadBlob.ref_count <= 0)
+        ).rowcount
+        if removed:
+            # Unlink while the delete still holds the row: a store() of the
+            # same bytes waits for the commit, then writes a fresh file
+            if os.path.exists(path):
+                os.remove(path)
+            deleted += 1
+        db.session.commit()
+    return deleted